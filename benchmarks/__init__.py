@@ -0,0 +1 @@
+# Performance benchmarks for PromptEngine; run with `python -m benchmarks.bench`.
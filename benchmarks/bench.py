@@ -0,0 +1,218 @@
+"""Benchmark the hot paths and compare against a stored baseline.
+
+Run from the repository root::
+
+    python -m benchmarks.bench                    # run, compare, write report
+    python -m benchmarks.bench --save-baseline    # accept the results as the new baseline
+    python -m benchmarks.bench --only vault       # benchmarks whose name contains "vault"
+
+Each benchmark reports its best time per item over ``--repeat`` runs;
+the minimum is the least noisy estimate on a shared machine.
+A benchmark regresses when that time exceeds the baseline by more than
+``--threshold`` (a fraction; default 0.5, i.e. 50% slower). The command
+exits with status 1 when any benchmark regresses. Everything runs in a
+temporary directory against synthetic vocabulary banks, so the repo's
+logs and outputs are not touched. Baselines are machine specific:
+re-record them on the machine that runs the comparison.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from core.memory_vault import PromptMemoryVault  # noqa: E402
+from core.output import save_prompt_hash, save_prompts  # noqa: E402
+from core.prompt_engine import PromptEngine  # noqa: E402
+from core.recursive_loop import RecursivePromptDaemon  # noqa: E402
+from core.vocab_store import CACHE_ENV  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+REPORT = Path(__file__).resolve().parent / "report.json"
+
+BENCHMARKS = []
+
+
+def benchmark(func):
+    BENCHMARKS.append(func)
+    return func
+
+
+def synthetic_vocab(path: Path, categories: int, terms: int, weighted: bool = False) -> Path:
+    """Write a vocabulary bank of ``categories`` x ``terms`` made-up words, optionally weighted."""
+    rng = random.Random(terms)
+    vocab = {
+        f"cat{c}": [f"term{c}_{t}_{rng.randrange(10**6)}" for t in range(terms)] for c in range(categories)
+    }
+    if weighted:
+        vocab = {cat: {word: rng.randint(1, 100) for word in words} for cat, words in vocab.items()}
+    path.write_text(json.dumps(vocab), encoding="utf-8")
+    return path
+
+
+def timed(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return min(samples)
+
+
+@benchmark
+def engine_benchmarks(ctx):
+    for terms in (8, 1_000, 100_000):
+        engine = PromptEngine(synthetic_vocab(ctx.tmp / f"vocab_{terms}.json", 4, terms))
+        for diff in (1, 5):
+            n = ctx.scale(20_000)
+            yield f"generate_prompt[terms={terms},diff={diff}]", n, lambda: [
+                engine.generate_prompt(diff) for _ in range(n)
+            ]
+            n = ctx.scale(100_000)
+            yield f"generate_batch[terms={terms},diff={diff}]", n, lambda: engine.generate_batch(n, diff)
+    # Weighted categories should sample as fast as uniform ones.
+    engine = PromptEngine(synthetic_vocab(ctx.tmp / "vocab_weighted.json", 4, 100_000, weighted=True))
+    for diff in (1, 5):
+        n = ctx.scale(100_000)
+        yield f"generate_batch[weighted,terms=100000,diff={diff}]", n, lambda: engine.generate_batch(n, diff)
+
+
+@benchmark
+def output_benchmarks(ctx):
+    engine = PromptEngine(synthetic_vocab(ctx.tmp / "vocab_out.json", 4, 100))
+    n = ctx.scale(100_000)
+    prompts = engine.generate_batch(n, 3)
+    for fmt in ("json", "txt", "csv", "gpt"):
+        yield f"save_prompts[{fmt}]", n, lambda: save_prompts(
+            prompts, fmt, out_dir=ctx.tmp / "out", tag="bench", model="m", hash_log=ctx.tmp / "hashes.txt"
+        )
+    m = ctx.scale(20_000)
+    yield "save_prompt_hash", m, lambda: [save_prompt_hash(p, ctx.tmp / "hashes.txt") for p in prompts[:m]]
+
+
+@benchmark
+def vault_benchmarks(ctx):
+    engine = PromptEngine(synthetic_vocab(ctx.tmp / "vocab_vault.json", 4, 100))
+    for size in (1_000, 10_000, 100_000):
+        size = ctx.scale(size)
+        vault = PromptMemoryVault(ctx.tmp / f"vault_{size}.db", legacy_path=None)
+        vault.add_entries(engine.generate_batch(size, 3), tags=["seed"])
+        m = ctx.scale(2_000)
+        prompts = engine.generate_batch(m, 3)
+        # Per-entry cost should stay flat as the vault grows.
+        yield f"vault.add_entry[size={size}]", m, lambda: [vault.add_entry(p, tags=["bench"]) for p in prompts]
+        vault.close()
+
+
+@benchmark
+def recursive_benchmarks(ctx):
+    vocab = synthetic_vocab(ctx.tmp / "vocab_rec.json", 4, 100)
+    daemon = RecursivePromptDaemon(vocab, history_path=ctx.tmp / "history.jsonl")
+    n = ctx.scale(20_000)
+    yield "run_recursive_loop", n, lambda: daemon.run_recursive_loop(n, diff=3)
+
+
+class Context:
+    def __init__(self, tmp: Path, quick: bool):
+        self.tmp = tmp
+        self.quick = quick
+
+    def scale(self, n: int) -> int:
+        return max(1, n // 10) if self.quick else n
+
+
+def run(only: str | None, repeat: int, quick: bool) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="promptbench-") as tmp:
+        cwd, cache = os.getcwd(), os.environ.get(CACHE_ENV)
+        os.chdir(tmp)
+        os.environ[CACHE_ENV] = os.path.join(tmp, ".cache")
+        try:
+            ctx = Context(Path(tmp), quick)
+            for bench in BENCHMARKS:
+                for name, items, func in bench(ctx):
+                    if only and only not in name:
+                        continue
+                    seconds = timed(func, repeat)
+                    results[name] = {"items": items, "seconds": round(seconds, 6), "us_per_item": round(seconds / items * 1e6, 3)}
+                    print(f"{name:45s} {results[name]['us_per_item']:12.3f} us/item  ({items} items, {seconds:.3f}s)")
+        finally:
+            os.chdir(cwd)
+            if cache is None:
+                os.environ.pop(CACHE_ENV, None)
+            else:
+                os.environ[CACHE_ENV] = cache
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return a description of every benchmark slower than baseline by more than ``threshold``."""
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        limit = base["us_per_item"] * (1 + base.get("threshold", threshold))
+        result["baseline_us_per_item"] = base["us_per_item"]
+        result["ratio"] = round(result["us_per_item"] / base["us_per_item"], 3) if base["us_per_item"] else None
+        if result["us_per_item"] > limit:
+            regressions.append(f"{name}: {result['us_per_item']} us/item vs baseline {base['us_per_item']} (x{result['ratio']})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PromptEngine benchmarks")
+    parser.add_argument("--only", type=str, help="Run only benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the fastest is reported")
+    parser.add_argument("--quick", action="store_true", help="Use one tenth of the default sizes")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Allowed slowdown before a regression (0.5 = 50%%)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--report", type=Path, default=REPORT, help="Where to write this run's JSON report")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    args = parser.parse_args(argv)
+
+    report = run(args.only, args.repeat, args.quick)
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = []
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline["meta"].get("quick") != args.quick:
+            print("⚠️ Baseline was recorded with a different --quick setting; skipping comparison")
+        else:
+            regressions = compare(report, baseline, args.threshold)
+    else:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+    report["regressions"] = regressions
+    args.report.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Report written to {args.report}")
+    for line in regressions:
+        print(f"❌ {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Stress the shared ``logs/`` files with many concurrent writer processes.
+
+Run from the repository root::
+
+    python -m benchmarks.stress                         # 1, 4 and 16 writers
+    python -m benchmarks.stress --writers 32 --batches 50
+
+Every writer process appends ``--batches`` batches of uniquely named
+prompts to a JSON vault, a SQLite vault, the hash log and an evolution
+history, all in one shared temporary directory, starting together.
+Afterwards every file is read back: each prompt must appear exactly
+once and every line must be intact. The command prints throughput per
+writer count and exits with status 1 if anything was lost, duplicated
+or torn.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from core.memory_vault import PromptMemoryVault  # noqa: E402
+from core.output import save_prompt_hashes  # noqa: E402
+from core.recursive_loop import RecursivePromptDaemon  # noqa: E402
+from core.vocab_store import CACHE_ENV  # noqa: E402
+
+TARGETS = ("vault.json", "vault.db", "hashes.txt", "history.jsonl")
+
+
+def synthetic_vocab(path: Path) -> Path:
+    path.write_text(json.dumps({"cat": [f"term{i}" for i in range(10)]}), encoding="utf-8")
+    return path
+
+
+def _writer(tmp: str, writer: int, batches: int, size: int, start) -> None:
+    tmp = Path(tmp)
+    json_vault = PromptMemoryVault(tmp / "vault.json", legacy_path=None)
+    sqlite_vault = PromptMemoryVault(tmp / "vault.db", legacy_path=None)
+    daemon = RecursivePromptDaemon(tmp / "vocab.json", history_path=tmp / "history.jsonl")
+    start.wait()
+    for b in range(batches):
+        prompts = [f"writer {writer} batch {b} prompt {i}" for i in range(size)]
+        json_vault.add_entries(prompts, tags=["stress"])
+        sqlite_vault.add_entries(prompts, tags=["stress"])
+        save_prompt_hashes(prompts, tmp / "hashes.txt")
+        daemon._append_history([{"generation": b, "prompt": p} for p in prompts])
+    sqlite_vault.close()
+
+
+def check(tmp: Path, expected: set[str]) -> list[str]:
+    """Describe every prompt lost, duplicated or torn in the shared files."""
+    found = {}
+    with open(tmp / "vault.json", "r", encoding="utf-8") as f:
+        found["vault.json"] = [e["prompt"] for e in json.load(f)]
+    vault = PromptMemoryVault(tmp / "vault.db", legacy_path=None)
+    found["vault.db"] = [e["prompt"] for e in vault.entries()]
+    vault.close()
+    found["hashes.txt"] = []
+    found["history.jsonl"] = []
+    problems = []
+    with open(tmp / "hashes.txt", "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split(" | ", 2)
+            if len(parts) != 3 or len(parts[1]) != 64:
+                problems.append(f"hashes.txt: torn line {line[:60]!r}")
+                continue
+            found["hashes.txt"].append(parts[2])
+    with open(tmp / "history.jsonl", "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                found["history.jsonl"].append(json.loads(line)["prompt"])
+            except (json.JSONDecodeError, KeyError):
+                problems.append(f"history.jsonl: torn line {line[:60]!r}")
+    for target in TARGETS:
+        counts = Counter(found[target])
+        lost = len(expected - counts.keys())
+        duplicated = sum(1 for n in counts.values() if n > 1)
+        if lost or duplicated or counts.keys() - expected:
+            problems.append(f"{target}: {lost} lost, {duplicated} duplicated, {len(counts.keys() - expected)} unexpected")
+    return problems
+
+
+def run(writers: int, batches: int, size: int) -> tuple[float, list[str]]:
+    with tempfile.TemporaryDirectory(prefix="promptstress-") as tmp:
+        cwd, cache = os.getcwd(), os.environ.get(CACHE_ENV)
+        os.chdir(tmp)
+        os.environ[CACHE_ENV] = os.path.join(tmp, ".cache")  # inherited by the writers
+        try:
+            return _run(Path(tmp), writers, batches, size)
+        finally:
+            os.chdir(cwd)
+            if cache is None:
+                os.environ.pop(CACHE_ENV, None)
+            else:
+                os.environ[CACHE_ENV] = cache
+
+
+def _run(tmp: Path, writers: int, batches: int, size: int) -> tuple[float, list[str]]:
+    synthetic_vocab(tmp / "vocab.json")
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    procs = [ctx.Process(target=_writer, args=(str(tmp), w, batches, size, start)) for w in range(writers)]
+    for p in procs:
+        p.start()
+    time.sleep(0.5)  # let every writer open its files
+    began = time.perf_counter()
+    start.set()
+    for p in procs:
+        p.join()
+    seconds = time.perf_counter() - began
+    problems = [f"writer exited with {p.exitcode}" for p in procs if p.exitcode]
+    expected = {f"writer {w} batch {b} prompt {i}" for w in range(writers) for b in range(batches) for i in range(size)}
+    problems += check(tmp, expected)
+    pending = tmp / "vault.json.pending"
+    if pending.exists() and os.listdir(pending):
+        problems.append(f"vault.json: {len(os.listdir(pending))} batches left uncommitted")
+    return seconds, problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent writer stress test for the logs/ files")
+    parser.add_argument("--writers", type=str, default="1,4,16", help="Comma-separated writer process counts")
+    parser.add_argument("--batches", type=int, default=20, help="Batches per writer")
+    parser.add_argument("--size", type=int, default=50, help="Prompts per batch")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for writers in (int(w) for w in args.writers.split(",")):
+        seconds, problems = run(writers, args.batches, args.size)
+        total = writers * args.batches * args.size
+        status = "ok" if not problems else "FAILED"
+        print(f"writers={writers:<4d} {total:8d} prompts x {len(TARGETS)} files  {seconds:7.3f}s  {total / seconds:10,.0f} prompts/s  {status}")
+        for line in problems:
+            print(f"❌ {line}")
+        failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
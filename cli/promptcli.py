@@ -1,57 +1,525 @@
 import argparse
-from core.prompt_engine import PromptEngine, templates
-from core.output import save_prompts
-from core.memory_vault import PromptMemoryVault
-from core.recursive_loop import RecursivePromptDaemon
-from core.prompt_profiles import load_profile
+import json
+import random
+
+from core.client import DEFAULT_ADDRESS
+
+# Everything else in core is imported where it is used, so a client call
+# or a plain batch only pays for the modules it needs.
 
 
 def main():
     parser = argparse.ArgumentParser(description="PromptCrafter-X Command Line")
-    parser.add_argument("--profile", type=str, required=True, help="Profile name (e.g. text_generation)")
+    parser.add_argument("--profile", type=str, help="Profile name (e.g. text_generation), or a comma-separated list of NAME, NAME=COUNT or NAME:WEIGHT entries, or all")
     parser.add_argument("--num", type=int, default=1, help="Number of prompts to generate")
     parser.add_argument("--diff", type=int, help="Differentiation level override")
     parser.add_argument("--category", type=str, help="Restrict generation to a vocabulary category")
     parser.add_argument("--baseline", type=str, default="", help="Baseline text to prepend")
     parser.add_argument("--recursive", action="store_true", help="Use recursive remix engine")
+    parser.add_argument("--generations", type=int, default=0, help="With --recursive, evolve --num prompts for this many generations")
+    parser.add_argument("--range", type=_range, metavar="START:STOP", help="Enumerate prompts START:STOP of the combination space instead of sampling")
+    parser.add_argument("--order-seed", type=int, help="With --range, walk the space in this seed's permuted order")
+    parser.add_argument("--unique", action="store_true", help="Never emit a prompt produced by any earlier run")
+    parser.add_argument("--diverse", type=int, nargs="?", const=4, metavar="FACTOR", help="Generate FACTOR times --num candidates (default 4) and keep the --num most mutually dissimilar")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible output")
+    parser.add_argument("--shard", type=str, default="0/1", help="Generate only shard i of N (as i/N) of the --num prompts")
+    parser.add_argument("--workers", type=int, help="Worker processes for parallel stages (default: all cores)")
+    parser.add_argument("--interleave", action="store_true", help="With several profiles, write one mixed output instead of one per profile")
     parser.add_argument("--tag", type=str, default="cli_batch", help="Output tag")
-    parser.add_argument("--format", type=str, choices=["json", "txt", "csv", "gpt"], help="Output format override")
+    parser.add_argument("--format", type=str, choices=["json", "txt", "csv", "gpt", "gpt-jsonl", "compact"], help="Output format override")
     parser.add_argument("--model", type=str, help="Model identifier to annotate outputs")
     parser.add_argument("--gpt-model", type=str, help=argparse.SUPPRESS)  # backward compatibility
-    parser.add_argument("--template", type=str, default="plain", choices=templates(), help="Prompt template to apply")
+    parser.add_argument("--template", type=str, default="plain", help="Prompt template to apply")
+    parser.add_argument("--max-tokens", type=int, help="Keep every prompt within this many estimated tokens and record per-prompt counts in the output")
+    parser.add_argument("--templates", type=str, help="JSON file of extra templates (overrides the profile's)")
     parser.add_argument("--out-dir", type=str, default="outputs", help="Output directory")
+    parser.add_argument("--compress", type=str, choices=["gzip", "lzma"], help="Compress the output file while writing")
+    export = parser.add_argument_group("gpt-jsonl batch export")
+    export.add_argument("--part-lines", type=int, help="Maximum requests per part file (default 50000)")
+    export.add_argument("--part-bytes", type=_size, help="Maximum uncompressed bytes per part file, e.g. 100MB (default 200MB)")
+    export.add_argument("--custom-id", choices=["index", "hash"], default="index", help="Request ids: <tag>-<n>, or the prompt's hash")
+    compact = parser.add_argument_group("compact batches")
+    compact.add_argument("--convert", type=str, metavar="FILE", help="Decode a compact .pcb batch into --format (default json) instead of generating")
+    compact.add_argument("--vocab", type=str, help="With --convert, the vocabulary bank to decode against if it has moved")
+    server = parser.add_argument_group("generation server")
+    server.add_argument("--serve", nargs="?", const=DEFAULT_ADDRESS, metavar="ADDRESS", help=f"Run a generation server on a socket path or host:port (default {DEFAULT_ADDRESS})")
+    server.add_argument("--connect", nargs="?", const=DEFAULT_ADDRESS, metavar="ADDRESS", help="Send this generation or query to a running server")
+    server.add_argument("--allow-remote", action="store_true", help="Let --serve listen on a host other than loopback (the server has no authentication)")
+    batch = parser.add_argument_group("batch jobs")
+    batch.add_argument("--jobs", type=str, help="Run every job in a JSONL file (one set of generation options per line)")
+    batch.add_argument("--status", type=str, help="Status JSONL for --jobs; finished jobs listed there are skipped (default: <jobs>.status.jsonl)")
+    query = parser.add_argument_group("memory vault queries")
+    query.add_argument("--query", action="store_true", help="Query the memory vault instead of generating")
+    query.add_argument("--tags", type=str, help="Comma-separated tags to match")
+    query.add_argument("--all-tags", action="store_true", help="Require every tag instead of any")
+    query.add_argument("--categories", type=str, help="Comma-separated categories to match")
+    query.add_argument("--since", type=str, help="Earliest ISO timestamp (inclusive)")
+    query.add_argument("--until", type=str, help="Latest ISO timestamp (exclusive)")
+    query.add_argument("--text", type=str, help="Words that must all appear in the prompt")
+    query.add_argument("--similar", type=str, metavar="PROMPT", help="Instead of filtering, list entries sharing most of PROMPT's terms, most similar first")
+    query.add_argument("--threshold", type=float, default=0.5, help="With --similar, the minimum share of terms in common (Jaccard index, 0-1)")
+    query.add_argument("--limit", type=int, default=20, help="Maximum results to print")
+    query.add_argument("--offset", type=int, default=0, help="Results to skip, for paging")
+    diagnostics = parser.add_argument_group("diagnostics")
+    diagnostics.add_argument("--stats", nargs="?", const="human", choices=["human", "json"], help="Print per-stage timings and counters after the run")
+    diagnostics.add_argument("--profile-out", type=str, metavar="FILE", help="Write a cProfile dump of the run to FILE")
     args = parser.parse_args()
 
-    profile = load_profile(args.profile)
+    if args.stats:
+        from core import instrument
+
+        instrument.enable()
+    profiler = None
+    if args.profile_out:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run(parser, args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_out)
+        if args.stats:
+            print(instrument.to_json() if args.stats == "json" else instrument.summary())
+
+
+def run(parser, args):
+    if args.serve:
+        from core.server import bind_target, run_server
+
+        try:
+            bind_target(args.serve, args.allow_remote)
+        except ValueError as exc:
+            parser.error(f"{exc} (--allow-remote)")
+        print(f"Serving on {args.serve}")
+        run_server(args.serve, workers=args.workers, out_dir=args.out_dir, allow_remote=args.allow_remote)
+        return
+    if args.connect:
+        run_client(parser, args)
+        return
+    if args.jobs:
+        run_batch_jobs(parser, args)
+        return
+    if args.query:
+        run_query(args)
+        return
+    if args.convert:
+        run_convert(parser, args)
+        return
+    if not args.profile:
+        parser.error("--profile is required unless --query is given")
+    if _is_profile_list(args.profile):
+        run_profiles(parser, args)
+        return
+    if args.interleave:
+        parser.error("--interleave needs several profiles")
+
+    from core.parallel import parse_shard
+    from core.pipeline import PersistencePipeline
+    from core.prompt_profiles import default_registry
+
+    try:
+        shard, shards = parse_shard(args.shard)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if shards > 1 and (args.recursive or args.range or args.unique):
+        parser.error("--shard is not supported with --recursive, --range or --unique")
+    if args.unique and args.workers and not args.recursive:
+        parser.error("--workers is not supported with --unique (it runs in one process)")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    registry = default_registry()
+    profile = registry.profile(args.profile)
     vocab_path = profile["vocab_bank"]
     diff_level = args.diff if args.diff else profile["default_diff"]
     output_format = args.format if args.format else profile["format"]
     model = args.model or args.gpt_model or profile.get("default_model")
+    templates_path = args.templates or profile.get("templates")
 
+    try:
+        engine = registry.engine(args.profile, args.templates)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.template not in engine.templates():
+        parser.error(f"Unknown template '{args.template}' (choose from {', '.join(engine.templates())})")
+    if args.max_tokens is not None:
+        if args.recursive or args.range:
+            parser.error("--max-tokens is not supported with --recursive or --range")
+        try:
+            plan = engine.budget_plan(args.max_tokens, diff_level, args.baseline, args.category, args.template)
+        except ValueError as exc:
+            parser.error(str(exc))
+        trimmed = [cat for cat, k in plan if k < min(diff_level, len(engine.vocab[cat]))]
+        if trimmed:
+            print(f"⚠️ --max-tokens {args.max_tokens} leaves fewer than {diff_level} terms for: {', '.join(trimmed)}")
+    if args.diverse is not None:
+        if args.recursive or args.range or args.unique:
+            parser.error("--diverse is not supported with --recursive, --range or --unique")
+        if args.diverse < 1:
+            parser.error("--diverse FACTOR must be at least 1")
+    if output_format == "compact":
+        if args.recursive or args.range or args.unique or args.diverse:
+            parser.error("--format compact is not supported with --recursive, --range, --unique or --diverse")
+        if args.compress:
+            parser.error("--format compact is not supported with --compress")
+
+    dedup = None
     if args.recursive:
-        daemon = RecursivePromptDaemon(vocab_path)
-        prompts = daemon.run_recursive_loop(args.num, diff=diff_level, template=args.template)
-    else:
-        engine = PromptEngine(vocab_path)
-        prompts = engine.generate_batch(
+        from core.dedup import PromptDeduplicator
+        from core.output import iter_chunks
+        from core.recursive_loop import RecursivePromptDaemon
+
+        daemon = RecursivePromptDaemon(vocab_path, templates_path=templates_path)
+        if args.generations:
+            prompts = daemon.evolve(
+                args.num,
+                args.generations,
+                diff=diff_level,
+                template=args.template,
+                workers=args.workers,
+                seed=args.seed,
+            )
+        else:
+            prompts = daemon.run_recursive_loop(args.num, diff=diff_level, template=args.template)
+        if args.unique:
+            with PromptDeduplicator() as unique:
+                prompts = unique.filter_new(prompts)
+        chunks = iter_chunks(prompts)
+    elif args.range:
+        from core.output import iter_chunks
+
+        space = engine.space(diff_level, args.category, args.baseline, [args.template])
+        start, stop = args.range
+        chunks = iter_chunks(space.iter_range(start, stop, seed=args.order_seed))
+    elif args.unique:
+        from core.dedup import PromptDeduplicator, iter_unique_batches
+
+        dedup = PromptDeduplicator()
+        chunks = iter_unique_batches(
+            engine,
             args.num,
+            dedup,
             diff_level,
             baseline=args.baseline,
             category=args.category,
             template=args.template,
+            rng=random.Random(args.seed),
+            max_tokens=args.max_tokens,
         )
+    else:
+        from core.parallel import generate_parallel
 
-    save_prompts(
-        prompts,
+        chunks = generate_parallel(
+            vocab_path,
+            args.num * (args.diverse or 1),
+            diff_level,
+            baseline=args.baseline,
+            category=args.category,
+            template=args.template,
+            seed=args.seed,
+            workers=args.workers,
+            shard=shard,
+            shards=shards,
+            templates_path=templates_path,
+            max_tokens=args.max_tokens,
+            ranks=output_format == "compact",
+        )
+        if args.diverse:
+            from core.output import iter_chunks
+            from core.parallel import shard_chunks
+            from core.similarity import select_diverse
+
+            candidates = [prompt for chunk in chunks for prompt in chunk]
+            chunks = iter_chunks(select_diverse(candidates, sum(count for _, count in shard_chunks(args.num, shard, shards))))
+
+    output = dict(
         format=output_format,
         tag=args.tag,
         model=model,
         out_dir=args.out_dir,
+        compress=args.compress,
+        token_counts=args.max_tokens is not None,
+    )
+    if output_format == "gpt-jsonl":
+        output.update(part_lines=args.part_lines, part_bytes=args.part_bytes, custom_id=args.custom_id)
+    from core.dedup import PromptSpaceExhausted
+    from core.memory_vault import PromptMemoryVault
+
+    compact = None
+    if output_format == "compact":
+        from core.compact import CompactWriter
+
+        if args.max_tokens is None:
+            plan = engine.compiled.plan(diff_level, args.category)
+        compact = CompactWriter(engine, plan, args.baseline, args.template, args.out_dir, args.tag, model, args.max_tokens)
+        output = None
+    with PersistencePipeline(
+        output=output,
+        vault=PromptMemoryVault(),
+        vault_category=args.category or args.profile,
+        vault_tags=[args.tag],
+    ) as pipeline:
+        try:
+            for chunk in chunks:
+                if compact is not None:
+                    ranks, chunk = chunk
+                    compact.write(ranks)
+                pipeline.submit(chunk)
+        except PromptSpaceExhausted as exc:
+            print(f"⚠️ {exc}")
+        finally:
+            if compact is not None:
+                compact.close()
+            if dedup is not None:
+                dedup.close()
+    print(f"✅ Generated {pipeline.count} prompts under profile '{args.profile}'")
+
+
+def _is_profile_list(value: str) -> bool:
+    return value == "all" or any(c in value for c in ",=:")
+
+
+def run_profiles(parser, args):
+    """Generate for several profiles at once on one worker pool."""
+    from core.output import CHUNK_SIZE
+    from core.parallel import INTERLEAVE_CHUNK, generate_profiles, parse_profile_mix, parse_shard
+    from core.pipeline import PersistencePipeline
+    from core.prompt_profiles import default_registry
+
+    if args.recursive or args.range or args.unique or args.diverse or args.category:
+        parser.error("--recursive, --range, --unique, --diverse and --category are not supported with several profiles")
+    if args.format == "compact":
+        parser.error("--format compact is not supported with several profiles")
+    registry = default_registry()
+    try:
+        shard, shards = parse_shard(args.shard)
+        mix = parse_profile_mix(args.profile, registry.names(), args.num)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    runs, outputs = [], {}
+    for name, count in mix:
+        profile = registry.profile(name)
+        diff_level = args.diff if args.diff else profile["default_diff"]
+        try:
+            engine = registry.engine(name, args.templates)
+            if args.template not in engine.templates():
+                raise ValueError(f"Unknown template '{args.template}' (choose from {', '.join(engine.templates())})")
+            if args.max_tokens is not None:
+                engine.budget_plan(args.max_tokens, diff_level, args.baseline, None, args.template)
+        except ValueError as exc:
+            parser.error(f"{name}: {exc}")
+        runs.append((name, profile["vocab_bank"], args.templates or profile.get("templates"), count, diff_level))
+        outputs[name] = dict(
+            format=args.format or profile["format"],
+            tag=f"{args.tag}_{name}",
+            model=args.model or args.gpt_model or profile.get("default_model"),
+            out_dir=args.out_dir,
+            compress=args.compress,
+            token_counts=args.max_tokens is not None,
+            profiles=name,
+        )
+    output = None
+    if args.interleave:
+        # One stream: --format (default json) and --model apply to every record.
+        output = dict(
+            format=args.format or "json",
+            tag=args.tag,
+            model=args.model or args.gpt_model,
+            out_dir=args.out_dir,
+            compress=args.compress,
+            token_counts=args.max_tokens is not None,
+            profiles=True,
+        )
+        outputs = {}
+    for options in [output] if output else outputs.values():
+        if options["format"] == "compact":
+            parser.error("--format compact is not supported with several profiles")
+        if options["format"] == "gpt-jsonl":
+            options.update(part_lines=args.part_lines, part_bytes=args.part_bytes, custom_id=args.custom_id)
+
+    from core.memory_vault import PromptMemoryVault
+
+    chunks = generate_profiles(
+        runs,
+        baseline=args.baseline,
+        template=args.template,
+        seed=args.seed,
+        workers=args.workers,
+        shard=shard,
+        shards=shards,
+        chunk_size=INTERLEAVE_CHUNK if args.interleave else CHUNK_SIZE,
+        max_tokens=args.max_tokens,
+    )
+    counts = dict.fromkeys((name for name, _ in mix), 0)
+    with PersistencePipeline(
+        output=output,
+        outputs=outputs,
+        vault=PromptMemoryVault(),
+        vault_tags=[args.tag],
+    ) as pipeline:
+        for name, chunk in chunks:
+            counts[name] += len(chunk)
+            pipeline.submit(chunk, name)
+    for name, count in counts.items():
+        print(f"✅ Generated {count} prompts under profile '{name}'")
+    if args.interleave:
+        print(f"✅ Wrote {pipeline.count} prompts from {len(counts)} profiles to {pipeline.path}")
+
+
+def _size(value: str) -> int:
+    """Parse a byte count such as ``500000``, ``64KB``, ``100MB`` or ``1GB``."""
+    units = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30}
+    text = value.strip().upper()
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            return int(float(text[: -len(unit)]) * factor)
+    return int(text)
+
+
+def _range(value: str) -> tuple[int, int | None]:
+    """Parse ``START:STOP`` (either side may be left out) for ``--range``."""
+    start, sep, stop = value.partition(":")
+    try:
+        bounds = int(start or 0), int(stop) if stop else None
+    except ValueError:
+        bounds = None
+    if not sep or bounds is None or bounds[0] < 0 or bounds[1] is not None and bounds[1] < bounds[0]:
+        raise argparse.ArgumentTypeError(f"invalid range '{value}': expected START:STOP with 0 <= START <= STOP")
+    return bounds
+
+
+def _split(value: str | None) -> list[str] | None:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+
+def _query_filters(args) -> dict:
+    return dict(
+        tags=_split(args.tags),
+        match_all_tags=args.all_tags,
+        categories=_split(args.categories),
+        since=args.since,
+        until=args.until,
+        text=args.text,
+        limit=args.limit,
+        offset=args.offset,
     )
+
+
+def run_query(args):
+    """Print matching vault entries as JSON lines, newest (or most similar) first."""
+    from core.memory_vault import PromptMemoryVault
+
     vault = PromptMemoryVault()
-    for p in prompts:
-        vault.add_entry(p, category=args.category or args.profile, tags=[args.tag])
-    print(f"✅ Generated {len(prompts)} prompts under profile '{args.profile}'")
+    if args.similar:
+        entries = vault.near_duplicates(args.similar, args.threshold, args.limit)
+    else:
+        entries = vault.query(**_query_filters(args))
+    for entry in entries:
+        print(json.dumps(entry, ensure_ascii=False))
+
+
+def run_convert(parser, args):
+    """Decode the compact batch at ``args.convert`` into ``args.format``."""
+    from core.compact import convert
+
+    output_format = args.format or "json"
+    if output_format == "compact":
+        parser.error("--convert needs a --format other than compact")
+    options = {}
+    if output_format == "gpt-jsonl":
+        options.update(part_lines=args.part_lines, part_bytes=args.part_bytes, custom_id=args.custom_id)
+    try:
+        path = convert(
+            args.convert,
+            output_format,
+            out_dir=args.out_dir,
+            tag=args.tag if args.tag != parser.get_default("tag") else None,
+            model=args.model or args.gpt_model,
+            compress=args.compress,
+            vocab_path=args.vocab,
+            **options,
+        )
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    print(f"✅ Wrote {path}")
+
+
+def run_batch_jobs(parser, args):
+    """Run a jobs file, printing one line per job as it finishes."""
+    from core.jobs import run_jobs
+
+    totals = {"done": 0, "failed": 0, "skipped": 0}
+    try:
+        for record in run_jobs(args.jobs, args.status, concurrency=args.workers, out_dir=args.out_dir):
+            totals[record["status"]] += 1
+            if record["status"] == "done":
+                print(f"✅ {record['id']}: {record['count']} prompts -> {record['path']} ({record['seconds']}s)")
+            elif record["status"] == "failed":
+                print(f"❌ {record['id']}: {record['error']}")
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    print(f"Jobs: {totals['done']} done, {totals['failed']} failed, {totals['skipped']} already complete")
+    if totals["failed"]:
+        raise SystemExit(1)
+
+
+def run_client(parser, args):
+    """Run a generation or query on the server at ``args.connect``."""
+    from core.client import request
+
+    if args.query:
+        if args.similar:
+            parser.error("--similar is not supported with --connect")
+        payload = {"op": "query", **_query_filters(args)}
+    elif not args.profile:
+        parser.error("--profile is required unless --query is given")
+    elif _is_profile_list(args.profile):
+        parser.error("Several profiles are not supported with --connect")
+    elif args.recursive or args.generations or args.range or args.unique or args.diverse is not None or args.shard != "0/1":
+        parser.error("--recursive, --generations, --range, --unique, --diverse and --shard are not supported with --connect")
+    elif args.format == "compact":
+        parser.error("--format compact is not supported with --connect")
+    elif (
+        args.templates
+        or args.part_lines
+        or args.part_bytes
+        or args.custom_id != "index"
+        or args.out_dir != parser.get_default("out_dir")
+    ):
+        parser.error(
+            "--templates, --part-lines, --part-bytes, --custom-id and --out-dir are not supported with --connect "
+            "(the server uses its profiles and writes to its own --out-dir)"
+        )
+    else:
+        payload = {
+            "op": "generate",
+            "profile": args.profile,
+            "num": args.num,
+            "diff": args.diff,
+            "category": args.category,
+            "baseline": args.baseline,
+            "template": args.template,
+            "seed": args.seed,
+            "save": True,
+            "format": args.format,
+            "tag": args.tag,
+            "model": args.model or args.gpt_model,
+            "compress": args.compress,
+            "max_tokens": args.max_tokens,
+        }
+    try:
+        response = request(payload, args.connect)
+    except (OSError, RuntimeError) as exc:
+        raise SystemExit(f"❌ {exc}")
+    if args.query:
+        for entry in response["entries"]:
+            print(json.dumps(entry, ensure_ascii=False))
+    else:
+        print(f"✅ Generated {response['count']} prompts under profile '{args.profile}'")
 
 
 if __name__ == "__main__":
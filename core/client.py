@@ -0,0 +1,48 @@
+"""Thin client for the generation server (see :mod:`core.server`).
+
+Deliberately imports nothing beyond the standard library, so a client
+call starts in a few milliseconds.
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+from pathlib import Path
+
+DEFAULT_ADDRESS = "logs/promptcrafter.sock"
+
+
+def parse_address(address: str):
+    """Return ``(host, port)`` for ``"host:port"`` or ``":port"``, else a socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return str(Path(address))
+
+
+def connect(address: str = DEFAULT_ADDRESS, timeout: float | None = None) -> socket.socket:
+    target = parse_address(address)
+    if isinstance(target, tuple):
+        return socket.create_connection(target, timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(target)
+    return sock
+
+
+def request(payload: dict, address: str = DEFAULT_ADDRESS, timeout: float | None = None) -> dict:
+    """Send one request and return the decoded response.
+
+    Raises ``RuntimeError`` with the server's message when it reports an error.
+    """
+    with connect(address, timeout) as sock, sock.makefile("rwb") as stream:
+        stream.write(json.dumps(payload, ensure_ascii=False).encode() + b"\n")
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        raise RuntimeError(f"Server at {address} closed the connection")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error", "request failed"))
+    return response
@@ -0,0 +1,277 @@
+"""Dictionary-encoded prompt batches.
+
+Every prompt of a batch comes from one vocabulary bank, template and
+baseline, so a ``.pcb`` file stores those once and each prompt as one
+integer per category: the rank of its ordered term sample (see
+:func:`core.sampler.rank_sample`). A category with ``n`` terms and ``k``
+picks takes ``ceil(log2(perm(n, k)) / 8)`` bytes, typically a few bytes
+per prompt instead of a hundred or more of text. Banks with constraints
+reserve extra ranks for prompts that got fewer terms in a category.
+
+Layout: a 12-byte preamble (magic, version, header length), a JSON
+header, then records in blocks of ``block`` prompts (the last block may
+be shorter). Within a block each category's ranks are stored together
+as little-endian integers of that category's width, so any prompt sits
+at a computable offset and is decoded on its own.
+
+The header records the bank's SHA-256; :class:`CompactBatch` refuses to
+decode against a bank whose content has changed.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from datetime import datetime
+from pathlib import Path
+
+from . import instrument
+from .output import CHUNK_SIZE, _create_output, save_prompts
+from .prompt_engine import PromptEngine
+from .vocab_store import VocabStore
+
+SUFFIX = ".pcb"
+_MAGIC = b"PCXB"
+_VERSION = 1
+_PREAMBLE = struct.Struct("<4sII")  # magic, version, header length
+# Rank widths with an array typecode are packed in bulk.
+_TYPECODES = {array(code).itemsize: code for code in "QIHB"}
+
+
+def _width(space: int) -> int:
+    """Bytes per rank for ``space`` distinct ranks."""
+    return max(1, ((space - 1).bit_length() + 7) // 8)
+
+
+def _pack(ranks, width: int) -> bytes:
+    code = _TYPECODES.get(width)
+    if code is None:
+        return b"".join(r.to_bytes(width, "little") for r in ranks)
+    packed = array(code, ranks)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(data, width: int) -> list[int]:
+    code = _TYPECODES.get(width)
+    if code is None:
+        return [int.from_bytes(data[i:i + width], "little") for i in range(0, len(data), width)]
+    unpacked = array(code)
+    unpacked.frombytes(data)
+    if sys.byteorder != "little":
+        unpacked.byteswap()
+    return unpacked.tolist()
+
+
+class CompactWriter:
+    """Write rank columns from :meth:`PromptEngine.generate_ranks` to a new ``.pcb`` file.
+
+    The file is created as ``batch_<timestamp>_<tag>.pcb`` in ``out_dir``
+    (numbered if taken). Chunks of any size may be written; they are
+    regrouped into blocks of ``block`` prompts.
+    """
+
+    def __init__(
+        self,
+        engine: PromptEngine,
+        plan,
+        baseline: str = "",
+        template: str = "plain",
+        out_dir: str = "outputs",
+        tag: str = "default",
+        model: str | None = None,
+        max_tokens: int | None = None,
+        block: int = CHUNK_SIZE,
+    ):
+        self.plan = [(cat, k) for cat, k in plan]
+        self.widths = [_width(engine.compiled.rank_space(cat, k)) for cat, k in self.plan]
+        self.block = block
+        self.count = 0
+        self._pending = [[] for _ in self.plan]
+        compiled = engine.template_renderer.compile(template)
+        header = {
+            "format": "promptcrafter-compact",
+            "vocab": str(engine.vocab_path),
+            "vocab_sha256": engine.vocab.sha256.hex(),
+            "template": compiled.name,
+            "pattern": compiled.pattern,
+            "baseline": baseline,
+            "plan": self.plan,
+            "widths": self.widths,
+            "block": block,
+            "model": model,
+            "tag": tag,
+            "max_tokens": max_tokens,
+            "created": datetime.now().isoformat(),
+        }
+        out_path = Path(out_dir)
+        out_path.mkdir(parents=True, exist_ok=True)
+        stem = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{tag}"
+        self.path, self._file = _create_output(out_path, stem, SUFFIX)
+        encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        self._file.write(_PREAMBLE.pack(_MAGIC, _VERSION, len(encoded)) + encoded)
+        instrument.count("write", opens=1)
+
+    def write(self, ranks) -> None:
+        """Append one chunk: a column of ranks per planned category."""
+        with instrument.stage("write") as st:
+            n = len(ranks[0]) if ranks else 0
+            for pending, column in zip(self._pending, ranks):
+                pending.extend(column)
+            self.count += n
+            st.add(items=n)
+            while self._pending and len(self._pending[0]) >= self.block:
+                st.add(bytes=self._flush(self.block))
+
+    def _flush(self, n: int) -> int:
+        data = b"".join(_pack(pending[:n], width) for pending, width in zip(self._pending, self.widths))
+        for pending in self._pending:
+            del pending[:n]
+        self._file.write(data)
+        return len(data)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        with instrument.stage("write") as st:
+            if self._pending and self._pending[0]:
+                st.add(bytes=self._flush(len(self._pending[0])))
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CompactBatch(Sequence):
+    """Lazily decoded, randomly accessible view of a ``.pcb`` file.
+
+    ``batch[i]`` decodes one prompt; slices and iteration decode a block
+    at a time. The vocabulary bank is opened from the path in the header
+    unless ``vocab_path`` points elsewhere (e.g. after moving the file);
+    its content must match the recorded fingerprint.
+    """
+
+    def __init__(self, path, vocab_path: str | None = None, store: VocabStore | None = None):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, length = _PREAMBLE.unpack_from(self._mm)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{self.path} is not a compact prompt batch (version {_VERSION})")
+            self.header = json.loads(self._mm[_PREAMBLE.size:_PREAMBLE.size + length].decode("utf-8"))
+            self._start = _PREAMBLE.size + length
+            self.plan = [(cat, k) for cat, k in self.header["plan"]]
+            self.widths = self.header["widths"]
+            self.block = self.header["block"]
+            self._record = sum(self.widths)
+            size, extra = divmod(len(self._mm) - self._start, self._record)
+            if extra:
+                raise ValueError(f"{self.path} is truncated")
+            self._count = size
+            self.engine = PromptEngine(vocab_path or self.header["vocab"], store=store)
+            if self.engine.vocab.sha256.hex() != self.header["vocab_sha256"]:
+                raise ValueError(
+                    f"{self.path} was written against a different version of {self.engine.vocab_path}"
+                )
+        except BaseException:
+            self._mm.close()
+            raise
+        self.template = self.header["template"]
+        self.baseline = self.header["baseline"]
+        self.engine.template_renderer.add(self.template, self.header["pattern"])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._decode(start, stop)
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._decode(index, index + 1)[0]
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+    def iter_chunks(self):
+        """Yield the prompts one block at a time."""
+        for start in range(0, self._count, self.block):
+            yield self._decode(start, min(start + self.block, self._count))
+
+    def ranks(self, start: int, stop: int) -> list[list[int]]:
+        """Rank columns of prompts ``start`` to ``stop``, as ``generate_ranks`` returned them."""
+        columns = [[] for _ in self.plan]
+        while start < stop:
+            first = start - start % self.block
+            size = min(self.block, self._count - first)
+            end = min(stop, first + size)
+            offset = self._start + first * self._record
+            for column, width in zip(columns, self.widths):
+                lo = offset + (start - first) * width
+                column.extend(_unpack(self._mm[lo:lo + (end - start) * width], width))
+                offset += size * width
+            start = end
+        return columns
+
+    def _decode(self, start: int, stop: int) -> list[str]:
+        if start >= stop:
+            return []
+        return self.engine.render_ranks(self.plan, self.ranks(start, stop), self.baseline, self.template)
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert(
+    path,
+    format: str = "json",
+    out_dir: str = "outputs",
+    tag: str | None = None,
+    model: str | None = None,
+    compress: str | None = None,
+    hash_log: Path | None = None,
+    vocab_path: str | None = None,
+    **batch_options,
+) -> Path:
+    """Decode a ``.pcb`` file into any :func:`~core.output.save_prompts` format.
+
+    ``tag`` and ``model`` default to the ones recorded at generation, and
+    token counts are included when the batch was generated under a
+    budget. The prompts were hash-logged when they were generated, so
+    nothing is logged unless ``hash_log`` is given.
+    """
+    with CompactBatch(path, vocab_path) as batch:
+        header = batch.header
+        return save_prompts(
+            batch,
+            format,
+            out_dir=out_dir,
+            tag=tag or header["tag"],
+            model=model or header["model"],
+            compress=compress,
+            hash_log=hash_log,
+            token_counts=header["max_tokens"] is not None,
+            **batch_options,
+        )
+
@@ -0,0 +1,301 @@
+"""Declarative term constraints for vocabulary banks.
+
+A bank may hold a ``_constraints`` object next to its categories::
+
+    "_constraints": {
+        "exclude": [["humorous", "melancholic"]],
+        "require": {"NumPy": ["Python"], "React": ["JavaScript"]},
+        "together": [["noir", "rain-soaked streets"]]
+    }
+
+- ``exclude``: groups of terms of which a prompt holds at most one.
+- ``require``: a term appears only in prompts holding at least one of
+  the listed terms. Listing a term several times (e.g. under different
+  categories) adds one such clause per listing.
+- ``together``: groups of terms that appear all together or not at all.
+
+A term is named as it appears in the bank, which matches it in every
+category that has it, or as ``category:term`` for one category only.
+
+:class:`ConstraintSet` compiles the rules against a bank's terms. Only
+constrained terms get a compact id within their category; exclusions,
+requirements and groups become bitmasks over those ids, so checking a
+draw costs a dictionary lookup for an unconstrained term and a few
+integer operations for a constrained one. Categories are sampled in an
+order where required terms are drawn before the terms that need them,
+and the first category of a ``together`` group leads it: drawing a
+leader forces the other members into their categories, which are never
+drawn on their own.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Mapping, Sequence
+
+CONSTRAINTS_KEY = "_constraints"
+RULES = ("exclude", "require", "together")
+# Verdicts of :meth:`ConstraintSet.allows` kept per combination of
+# constrained terms before the memo starts over.
+MAX_VERDICTS = 4096
+
+
+class ConstraintSet:
+    """Compiled constraints over the categories of one vocabulary bank."""
+
+    def __init__(self, rules: Mapping, terms: Mapping[str, Sequence[str]], source: str = "constraints"):
+        if not isinstance(rules, Mapping) or set(rules) - set(RULES):
+            raise ValueError(f"{source}: {CONSTRAINTS_KEY} must be an object with keys {', '.join(RULES)}")
+        self.source = source
+        self.categories = list(terms)
+        self._terms = terms
+        self._positions: dict[str, dict[str, int]] = {}
+        self.local: dict[str, dict[int, int]] = {}
+        self.ids: dict[str, list[int]] = {}
+        refs = []  # every (cat, index) named by a rule, so ids follow rule order
+        exclude = [self._resolve_group(group, "exclude") for group in rules.get("exclude", [])]
+        require = []
+        requirements = rules.get("require", {})
+        if not isinstance(requirements, Mapping):
+            raise ValueError(f"{source}: 'require' must map terms to lists of terms")
+        for name, needed in requirements.items():
+            targets = self._resolve_group(needed, "require", minimum=1)
+            require.extend((ref, targets) for ref in self._resolve(name))
+        together = [self._resolve_group(group, "together") for group in rules.get("together", [])]
+        for group in exclude + together:
+            refs.extend(group)
+        for ref, targets in require:
+            refs.append(ref)
+            refs.extend(targets)
+        for cat, i in refs:
+            ids = self.local.setdefault(cat, {})
+            if i not in ids:
+                ids[i] = len(ids)
+                self.ids.setdefault(cat, []).append(i)
+
+        self.order = self._sample_order(require)
+        rank = {cat: r for r, cat in enumerate(self.order)}
+        # Per constrained term: exclusion masks, requirement clauses, forced terms.
+        self._bans: dict[tuple[str, int], dict[str, int]] = {}
+        self._clauses: dict[tuple[str, int], list[dict[str, int]]] = {}
+        self._forces: dict[tuple[str, int], list[tuple[str, int]]] = {}
+        self.followers: dict[str, int] = {}
+        self._plan_followers: dict[frozenset, dict[str, int]] = {}
+        self._verdicts: dict[tuple, bool] = {}
+        for group in exclude:
+            for ref in group:
+                bans = self._bans.setdefault(ref, {})
+                for cat, i in group:
+                    if (cat, i) != ref:
+                        bans[cat] = bans.get(cat, 0) | 1 << self.local[cat][i]
+        for ref, targets in require:
+            clause = {}
+            for cat, i in targets:
+                clause[cat] = clause.get(cat, 0) | 1 << self.local[cat][i]
+            self._clauses.setdefault(ref, []).append(clause)
+        for group in together:
+            lead = min(rank[cat] for cat, _ in group)
+            for ref in group:
+                if rank[ref[0]] == lead:
+                    self._forces.setdefault(ref, []).extend(other for other in group if other != ref)
+                else:
+                    cat, i = ref
+                    self.followers[cat] = self.followers.get(cat, 0) | 1 << self.local[cat][i]
+
+    def _position(self, cat: str, term: str) -> int | None:
+        positions = self._positions.get(cat)
+        if positions is None:
+            positions = self._positions[cat] = {t: i for i, t in enumerate(self._terms[cat])}
+        return positions.get(term)
+
+    def _resolve(self, name) -> list[tuple[str, int]]:
+        """``(category, index)`` of every term ``name`` refers to."""
+        if not isinstance(name, str):
+            raise ValueError(f"{self.source}: constraint terms must be strings, not {name!r}")
+        cat, sep, term = name.partition(":")
+        if sep and cat in self._terms:
+            i = self._position(cat, term)
+            if i is not None:
+                return [(cat, i)]
+        found = [(cat, i) for cat in self.categories if (i := self._position(cat, name)) is not None]
+        if not found:
+            raise ValueError(f"{self.source}: constraint names unknown term '{name}'")
+        return found
+
+    def _resolve_group(self, names, rule: str, minimum: int = 2) -> list[tuple[str, int]]:
+        if isinstance(names, str) or not isinstance(names, Sequence) or len(names) < minimum:
+            raise ValueError(f"{self.source}: each '{rule}' entry must be a list of at least {minimum} terms")
+        return list(dict.fromkeys(ref for name in names for ref in self._resolve(name)))
+
+    def _sample_order(self, require) -> list[str]:
+        """Categories in vocabulary order, moved so required terms' categories come first."""
+        before = {cat: set() for cat in self.categories}
+        for (cat, _), targets in require:
+            before[cat].update(t for t, _ in targets if t != cat)
+        order, done = [], set()
+        while len(order) < len(self.categories):
+            ready = [cat for cat in self.categories if cat not in done and before[cat] <= done]
+            if not ready:
+                cycle = ", ".join(cat for cat in self.categories if cat not in done)
+                raise ValueError(f"{self.source}: requirements between categories {cycle} form a cycle")
+            order.append(ready[0])
+            done.add(ready[0])
+        return order
+
+    @property
+    def constrained(self) -> set[str]:
+        """Categories holding at least one constrained term."""
+        return set(self.local)
+
+    def selection(self, cats: Iterable[str]) -> Selection:
+        """Fresh per-prompt state for drawing the categories ``cats``."""
+        return Selection(self, cats)
+
+    def followers_in(self, cats: Iterable[str]) -> dict[str, int]:
+        """:attr:`followers` of the groups whose leader's category is among ``cats``.
+
+        A group led from a category that is not drawn cannot be placed,
+        so its other members are drawn on their own.
+        """
+        key = frozenset(cats)
+        masks = self._plan_followers.get(key)
+        if masks is None:
+            masks = {}
+            for (lead, _), forced in self._forces.items():
+                if lead in key:
+                    for cat, i in forced:
+                        masks[cat] = masks.get(cat, 0) | 1 << self.local[cat][i]
+            self._plan_followers[key] = masks
+        return masks
+
+    def allows(self, picks: Mapping[str, Iterable[int]]) -> bool:
+        """Whether a prompt holding the term indices ``picks`` (per category) obeys every rule.
+
+        Only the categories in ``picks`` are drawn: a requirement that
+        one of them cannot meet, or a ``together`` member outside them,
+        does not count against the prompt.
+        """
+        masks = {cat: 0 for cat in picks}
+        for cat, indices in picks.items():
+            local = self.local.get(cat, {})
+            for i in indices:
+                cid = local.get(i)
+                if cid is not None:
+                    masks[cat] |= 1 << cid
+        key = tuple(masks.items())
+        verdict = self._verdicts.get(key)
+        if verdict is None:
+            if len(self._verdicts) >= MAX_VERDICTS:
+                self._verdicts.clear()
+            verdict = self._verdicts[key] = self._allows(masks)
+        return verdict
+
+    def _allows(self, masks: dict[str, int]) -> bool:
+        for cat, mask in masks.items():
+            for cid, i in enumerate(self.ids.get(cat, ())):
+                if not mask >> cid & 1:
+                    continue
+                ref = (cat, i)
+                for other, bans in self._bans.get(ref, {}).items():
+                    if masks.get(other, 0) & bans:
+                        return False
+                for clause in self._clauses.get(ref, ()):
+                    if not any(c not in masks or masks[c] & m for c, m in clause.items()):
+                        return False
+                for other, j in self._forces.get(ref, ()):
+                    if other in masks and not masks[other] >> self.local[other][j] & 1:
+                        return False
+                if self.followers.get(cat, 0) >> cid & 1 and not self._led(masks, cat, i):
+                    return False
+        return True
+
+    def _led(self, masks, cat: str, i: int) -> bool:
+        return any(
+            (cat, i) in forced and (lead not in masks or masks[lead] >> self.local[lead][j] & 1)
+            for (lead, j), forced in self._forces.items()
+        )
+
+
+class Selection:
+    """The constrained terms drawn so far for one prompt.
+
+    :meth:`allowed` tells whether a term may be drawn next, :meth:`add`
+    records a draw, :meth:`forced` hands out the terms a category must
+    take because a ``together`` group's leader was drawn, and
+    :meth:`place` records those. Call :meth:`finish` once a category's
+    draws are complete.
+    """
+
+    __slots__ = ("rules", "local", "banned", "followers", "picked", "pending", "done")
+
+    def __init__(self, rules: ConstraintSet, cats: Iterable[str]):
+        self.rules = rules
+        self.local = rules.local
+        self.banned = {cat: 0 for cat in cats}
+        self.followers = rules.followers_in(self.banned)
+        self.picked = dict.fromkeys(self.banned, 0)
+        self.pending: dict[str, list[int]] = {}
+        self.done: set[str] = set()
+
+    def allowed(self, cat: str, i: int) -> bool:
+        local = self.local.get(cat)
+        cid = None if local is None else local.get(i)
+        if cid is None:
+            return True
+        if (self.banned[cat] | self.followers.get(cat, 0)) >> cid & 1:
+            return False
+        ref = (cat, i)
+        rules = self.rules
+        if ref in rules._clauses and not self._satisfied(ref):
+            return False
+        forces = rules._forces.get(ref)
+        return forces is None or all(self._can_force(other, j) for other, j in forces)
+
+    def _satisfied(self, ref) -> bool:
+        # A clause naming a category this prompt does not draw cannot be met here; it is not held against it.
+        picked = self.picked
+        return all(
+            any(c not in picked or picked[c] & m for c, m in clause.items())
+            for clause in self.rules._clauses.get(ref, ())
+        )
+
+    def _can_force(self, cat: str, i: int) -> bool:
+        if cat not in self.banned:
+            return True  # not drawn in this plan: nothing to place
+        bit = 1 << self.local[cat][i]
+        if self.picked[cat] & bit:
+            return True
+        return cat not in self.done and not self.banned[cat] & bit
+
+    def add(self, cat: str, i: int) -> None:
+        local = self.local.get(cat)
+        cid = None if local is None else local.get(i)
+        if cid is None:
+            return
+        self.picked[cat] |= 1 << cid
+        ref = (cat, i)
+        banned = self.banned
+        bans = self.rules._bans.get(ref)
+        if bans:
+            for other, mask in bans.items():
+                if other in banned:
+                    banned[other] |= mask
+        for other, j in self.rules._forces.get(ref, ()):
+            if other in banned and not self.picked[other] >> self.local[other][j] & 1:
+                self.pending.setdefault(other, []).append(j)
+
+    def forced(self, cat: str) -> list[int]:
+        """Term indices ``cat`` must still take; empties the list."""
+        return self.pending.pop(cat, [])
+
+    def place(self, cat: str, i: int) -> bool:
+        """Record a forced term; ``False`` if earlier draws rule it out."""
+        cid = self.local[cat][i]
+        if self.picked[cat] >> cid & 1:
+            return True
+        if self.banned[cat] >> cid & 1 or not self._satisfied((cat, i)):
+            return False
+        self.add(cat, i)
+        return True
+
+    def finish(self, cat: str) -> None:
+        self.done.add(cat)
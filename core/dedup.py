@@ -0,0 +1,245 @@
+"""Global prompt deduplication across batches and runs.
+
+Every accepted prompt's SHA-256 digest is stored in a persistent SQLite
+index. An in-memory Bloom filter answers the common "never seen" case
+without touching disk; only Bloom hits are confirmed against the index.
+The filter's bits are saved next to the index (``prompt_index.bloom``)
+with the number of digests they cover, so the next run loads them
+instead of rehashing every digest; the filter is rebuilt from the index
+only when it no longer matches, e.g. after another process added to it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import sqlite3
+import struct
+import threading
+from pathlib import Path
+
+from .filelock import BUSY_TIMEOUT, atomic_write
+
+DEFAULT_INDEX = Path("logs/prompt_index.db")
+
+_MAGIC = b"PCXF"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIQQQd")  # magic, version, capacity, count, digests covered, error rate
+
+
+class PromptSpaceExhausted(RuntimeError):
+    """Raised when almost every generated candidate has been seen before."""
+
+    def __init__(self, generated: int, requested: int, space: int):
+        self.generated = generated
+        self.requested = requested
+        self.space = space
+        super().__init__(
+            f"Prompt space nearly exhausted: produced {generated} of {requested} unique prompts "
+            f"(about {space} distinct prompts exist for these settings)"
+        )
+
+
+def digest(prompt: str) -> bytes:
+    return hashlib.sha256(prompt.encode()).digest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter keyed by SHA-256 digests."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.error_rate = error_rate
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: bytes):
+        # Double hashing over two independent 64-bit slices of the digest.
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        size = self.size
+        return ((h1 + i * h2) % size for i in range(self.hashes))
+
+    def add(self, key: bytes) -> None:
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] >> (pos & 7) & 1 for pos in self._positions(key))
+
+    def save(self, path: Path, covered: int) -> None:
+        """Write the filter to ``path``, noting that it holds ``covered`` stored digests."""
+        header = _HEADER.pack(_MAGIC, _VERSION, self.capacity, self.count, covered, self.error_rate)
+        atomic_write(path, header + self.bits, fsync=False)
+
+    @classmethod
+    def load(cls, path: Path, error_rate: float) -> tuple[BloomFilter, int] | None:
+        """Read a filter saved by :meth:`save` and the digests it covers, or ``None``."""
+        try:
+            data = Path(path).read_bytes()
+            magic, version, capacity, count, covered, rate = _HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        if magic != _MAGIC or version != _VERSION or rate != error_rate:
+            return None
+        bloom = cls(capacity, error_rate)
+        if len(data) - _HEADER.size != len(bloom.bits):
+            return None
+        bloom.bits[:] = data[_HEADER.size:]
+        bloom.count = count
+        return bloom, covered
+
+
+class PromptDeduplicator:
+    """Reject prompts already produced by this or any earlier run.
+
+    Accepted digests are buffered and written to the index by
+    :meth:`commit`; the Bloom filter grows by rebuilding from the index
+    when it passes its capacity, and is saved by :meth:`close`. Use it as
+    a context manager to close it however the run ends.
+    """
+
+    def __init__(self, index_path: Path = DEFAULT_INDEX, capacity: int = 1_000_000, error_rate: float = 0.001):
+        self.index_path = Path(index_path)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.index_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen_count (n INTEGER NOT NULL)")
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            if self.conn.execute("SELECT n FROM seen_count").fetchone() is None:
+                self.conn.execute("INSERT INTO seen_count (n) SELECT COUNT(*) FROM seen")
+        self.bloom_path = self.index_path.with_suffix(".bloom")
+        self._pending: set[bytes] = set()
+        # Stored digests the Bloom filter is known to hold, or None once
+        # another process has added digests this filter lacks.
+        self._covered: int | None = None
+        loaded = BloomFilter.load(self.bloom_path, error_rate)
+        if loaded is not None and loaded[1] == self._stored():
+            self.bloom, self._covered = loaded
+        else:
+            self._rebuild(capacity)
+
+    def __enter__(self) -> PromptDeduplicator:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _stored(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT n FROM seen_count").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._stored() + len(self._pending)
+
+    def seen(self, prompt: str) -> bool:
+        return self._seen_key(digest(prompt))
+
+    def _seen_key(self, key: bytes) -> bool:
+        if key not in self.bloom:
+            return False
+        if key in self._pending:
+            return True
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM seen WHERE digest = ?", (key,)).fetchone() is not None
+
+    def add(self, prompt: str) -> bool:
+        """Record ``prompt``; returns ``False`` if it was already seen."""
+        key = digest(prompt)
+        if self._seen_key(key):
+            return False
+        self._pending.add(key)
+        self.bloom.add(key)
+        if self.bloom.count > self.bloom.capacity:
+            self._grow()
+        return True
+
+    def filter_new(self, prompts) -> list[str]:
+        """Return the prompts not seen before, recording them as seen.
+
+        Duplicates inside ``prompts`` are dropped as well.
+        """
+        return [p for p in prompts if self.add(p)]
+
+    def commit(self) -> None:
+        """Write buffered digests to the persistent index."""
+        if not self._pending:
+            return
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            before = self.conn.execute("SELECT n FROM seen_count").fetchone()[0]
+            added = self.conn.executemany(
+                "INSERT OR IGNORE INTO seen (digest) VALUES (?)", ((k,) for k in self._pending)
+            ).rowcount
+            self.conn.execute("UPDATE seen_count SET n = n + ?", (added,))
+        self._covered = before + added if self._covered == before else None
+        self._pending.clear()
+
+    def _grow(self) -> None:
+        self.commit()
+        self._rebuild(self.bloom.capacity * 2)
+
+    def _rebuild(self, capacity: int) -> None:
+        """Refill the Bloom filter from the index, at one consistent snapshot."""
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            stored = self.conn.execute("SELECT n FROM seen_count").fetchone()[0]
+            bloom = BloomFilter(max(capacity, stored * 2), self.error_rate)
+            for (key,) in self.conn.execute("SELECT digest FROM seen"):
+                bloom.add(key)
+        self.bloom, self._covered = bloom, stored
+
+    def close(self) -> None:
+        self.commit()
+        if self._covered is not None:
+            self.bloom.save(self.bloom_path, self._covered)
+        with self._lock:
+            self.conn.close()
+
+
+def iter_unique_batches(
+    engine,
+    n: int,
+    dedup: PromptDeduplicator,
+    diff_level: int = 5,
+    baseline: str = "",
+    category: str | None = None,
+    template: str = "plain",
+    chunk_size: int = 10_000,
+    min_yield: float = 0.01,
+    rng=None,
+    max_tokens: int | None = None,
+):
+    """Yield chunks of never-before-seen prompts until ``n`` are produced.
+
+    Rejected candidates are simply redrawn. When a round of candidates
+    yields fewer than ``min_yield`` new prompts the remaining space is
+    considered exhausted and :class:`PromptSpaceExhausted` is raised after
+    the prompts found so far have been yielded and committed.
+    """
+    produced = 0
+    while produced < n:
+        want = min(chunk_size, n - produced)
+        draw = max(want, 1000)
+        fresh = []
+        for prompt in engine.generate_batch(draw, diff_level, baseline, category, template, rng=rng, max_tokens=max_tokens):
+            if dedup.add(prompt):
+                fresh.append(prompt)
+                if len(fresh) == want:
+                    break
+        if fresh:
+            produced += len(fresh)
+            dedup.commit()
+            yield fresh
+        if len(fresh) < want and len(fresh) < draw * min_yield:
+            raise PromptSpaceExhausted(produced, n, engine.combination_space(diff_level, category))
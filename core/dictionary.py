@@ -4,7 +4,8 @@ import json
 from pathlib import Path
 from typing import Dict
 
-_DEF_PATH = Path('data/vocab_defs.json')
+# Resolved from the package, so lookups work from any working directory.
+_DEF_PATH = Path(__file__).resolve().parent.parent / 'data' / 'vocab_defs.json'
 
 
 def load_definitions(path: Path = _DEF_PATH) -> Dict[str, str]:
@@ -14,21 +15,30 @@ def load_definitions(path: Path = _DEF_PATH) -> Dict[str, str]:
     return {}
 
 
-_DEFINITIONS = load_definitions()
+_DEFINITIONS: Dict[str, str] | None = None
+
+
+def _definitions() -> Dict[str, str]:
+    """Load the definitions on first use rather than at import."""
+    global _DEFINITIONS
+    if _DEFINITIONS is None:
+        _DEFINITIONS = load_definitions()
+    return _DEFINITIONS
 
 
 def describe(category: str) -> str | None:
     """Return a human readable description for a vocabulary category."""
-    return _DEFINITIONS.get(category)
+    return _definitions().get(category)
 
 
 def definitions() -> Dict[str, str]:
     """Return a copy of all loaded definitions."""
-    return dict(_DEFINITIONS)
+    return dict(_definitions())
 
 
 def add_definition(category: str, text: str) -> None:
     """Add or update a category definition and persist it."""
-    _DEFINITIONS[category] = text
+    defs = _definitions()
+    defs[category] = text
     with open(_DEF_PATH, 'w', encoding='utf-8') as f:
-        json.dump(_DEFINITIONS, f, indent=2)
+        json.dump(defs, f, indent=2)
@@ -0,0 +1,242 @@
+"""Indexable enumeration of the prompt combination space.
+
+A :class:`PromptSpace` numbers every prompt a configuration can produce:
+one k-subset of terms per category, crossed with the templates. Any
+index can be turned into its prompt (and back) without materialising
+the space, so disjoint index ranges can be generated on different
+machines without coordination or duplicates.
+
+When the vocabulary bank has constraints, indices still number the
+unconstrained space, but indices whose prompt breaks a rule are not
+prompts: :meth:`PromptSpace.prompt_at` and :meth:`PromptSpace.index_of`
+refuse them, :meth:`PromptSpace.iter_range` skips them and
+:attr:`PromptSpace.valid_size` counts the rest.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import math
+import re
+
+
+def unrank_subset(rank: int, n: int, k: int) -> list[int]:
+    """Return the ``rank``-th k-subset of ``range(n)`` in colexicographic order."""
+    subset = []
+    for i in range(k, 0, -1):
+        # Largest c with comb(c, i) <= rank, found by binary search.
+        lo, hi = i - 1, n - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if math.comb(mid, i) <= rank:
+                lo = mid
+            else:
+                hi = mid - 1
+        rank -= math.comb(lo, i)
+        subset.append(lo)
+        n = lo
+    return subset[::-1]
+
+
+def rank_subset(subset) -> int:
+    """Inverse of :func:`unrank_subset` for a sorted list of indices."""
+    return sum(math.comb(c, i) for i, c in enumerate(subset, start=1))
+
+
+# Combinations of constrained terms PromptSpace.valid_size will check.
+_MAX_COUNTED = 1 << 20
+
+
+class FeistelPermutation:
+    """Keyed pseudo-random bijection on ``range(size)``.
+
+    A balanced Feistel network over the next even power of two, with cycle
+    walking to stay inside the domain; O(1) memory for any size.
+    """
+
+    def __init__(self, size: int, seed: int, rounds: int = 4):
+        self.size = size
+        self.half_bits = max(1, (max(1, size - 1).bit_length() + 1) // 2)
+        self.mask = (1 << self.half_bits) - 1
+        self.key = hashlib.sha256(str(seed).encode()).digest()[:16]
+        self.rounds = rounds
+
+    def _round(self, value: int, r: int) -> int:
+        data = r.to_bytes(1, "little") + value.to_bytes((self.half_bits + 7) // 8 or 1, "little")
+        h = hashlib.blake2b(data, key=self.key, digest_size=8).digest()
+        return int.from_bytes(h, "little") & self.mask
+
+    def _encrypt(self, x: int) -> int:
+        left, right = x >> self.half_bits, x & self.mask
+        for r in range(self.rounds):
+            left, right = right, left ^ self._round(right, r)
+        return (left << self.half_bits) | right
+
+    def __call__(self, i: int) -> int:
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        x = self._encrypt(i)
+        while x >= self.size:
+            x = self._encrypt(x)
+        return x
+
+
+class PromptSpace:
+    """Every prompt for one engine configuration, addressable by index.
+
+    Within a category the chosen terms keep their vocabulary order, so
+    each term set appears exactly once.
+    """
+
+    def __init__(self, engine, diff_level: int = 5, category: str | None = None, baseline: str = "", templates=None):
+        self.engine = engine
+        self.baseline = baseline
+        self.templates = list(templates or engine.templates())
+        compiled = engine.compiled
+        self.plan = compiled.plan(diff_level, category)
+        self.terms = [compiled.terms[cat] for cat, _ in self.plan]
+        self._positions = [{term: i for i, term in enumerate(words)} for words in self.terms]
+        self.radices = [math.comb(len(words), k) for words, (_, k) in zip(self.terms, self.plan)]
+        self.radices.append(len(self.templates))
+        self.size = math.prod(self.radices)
+        self._valid_size = None
+
+    def __len__(self) -> int:
+        """Number of indices, including any that break the bank's constraints; see :attr:`valid_size`."""
+        return self.size
+
+    @property
+    def valid_size(self) -> int:
+        """Number of indices whose prompt obeys the bank's constraints.
+
+        Counted per combination of constrained terms, so the cost grows
+        with the number of constrained terms the plan can draw, not with
+        the size of the space. Raises ``ValueError`` when there are too
+        many of them to count.
+        """
+        if self._valid_size is None:
+            self._valid_size = self._count_valid()
+        return self._valid_size
+
+    def _count_valid(self) -> int:
+        rules = self.engine.compiled.constraints
+        if rules is None:
+            return self.size
+        choices = []  # per category: {constrained term indices drawn: ways to fill the rest}
+        for words, (cat, k) in zip(self.terms, self.plan):
+            ids = rules.ids.get(cat, [])
+            free = len(words) - len(ids)
+            ways = {}
+            for r in range(min(k, len(ids)) + 1):
+                if math.comb(free, k - r):
+                    ways.update(dict.fromkeys(itertools.combinations(ids, r), math.comb(free, k - r)))
+            choices.append(ways)
+        if math.prod(map(len, choices)) > _MAX_COUNTED:
+            raise ValueError("Too many constrained terms to count the valid prompts")
+        cats = [cat for cat, _ in self.plan]
+        total = 0
+        for combo in itertools.product(*(ways.items() for ways in choices)):
+            if rules.allows({cat: chosen for cat, (chosen, _) in zip(cats, combo)}):
+                total += math.prod(n for _, n in combo)
+        return total * len(self.templates)
+
+    def prompt_at(self, index: int) -> str:
+        """Decode ``index`` into its prompt.
+
+        Raises ``IndexError`` outside the space and ``ValueError`` when the
+        prompt breaks the bank's constraints.
+        """
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        if not self.allows(index):
+            raise ValueError(f"Prompt {index} breaks the constraints of {self.engine.vocab_path}")
+        return self._render(self._digits(index))
+
+    def _render(self, digits: list[int]) -> str:
+        parts, terms = [], {}
+        for words, (cat, k), rank in zip(self.terms, self.plan, digits):
+            chosen = [words[i] for i in unrank_subset(rank, len(words), k)]
+            parts.extend(chosen)
+            terms[cat] = ", ".join(chosen)
+        template = self.templates[digits[-1]]
+        return self.engine.template_renderer.render(
+            ", ".join(parts), baseline=self.baseline, template=template, terms=terms
+        )
+
+    def _digits(self, index: int) -> list[int]:
+        digits = []
+        for radix in self.radices:
+            index, digit = divmod(index, radix)
+            digits.append(digit)
+        return digits
+
+    def allows(self, index: int) -> bool:
+        """Whether the prompt at ``index`` obeys the vocabulary bank's constraints."""
+        rules = self.engine.compiled.constraints
+        if rules is None:
+            return True
+        picks = {
+            cat: unrank_subset(rank, len(words), k)
+            for words, (cat, k), rank in zip(self.terms, self.plan, self._digits(index))
+        }
+        return rules.allows(picks)
+
+    def index_of(self, prompt: str) -> int:
+        """Return the index of ``prompt``; term order within a category is ignored.
+
+        Only templates whose sole per-prompt field is ``{content}`` can be
+        inverted; prompts from per-category templates are not matched.
+        Raises ``ValueError`` when the prompt is not part of this space,
+        including prompts that break the bank's constraints.
+        """
+        for t, template in enumerate(self.templates):
+            framed = self.engine.template_renderer.frame(self.baseline, template)
+            if framed is None:
+                continue
+            prefix, suffix = framed
+            match = re.fullmatch(re.escape(prefix.lstrip()) + "(.*)" + re.escape(suffix.rstrip()), prompt, re.S)
+            if not match:
+                continue
+            digits = self._parse_content(match.group(1))
+            if digits is None:
+                continue
+            index = t
+            for radix, digit in zip(reversed(self.radices[:-1]), reversed(digits)):
+                index = index * radix + digit
+            if not self.allows(index):
+                raise ValueError("Prompt breaks the vocabulary bank's constraints")
+            return index
+        raise ValueError("Prompt is not part of this prompt space")
+
+    def _parse_content(self, content: str) -> list[int] | None:
+        parts = content.split(", ") if content else []
+        if len(parts) != sum(k for _, k in self.plan):
+            return None
+        digits, pos = [], 0
+        for positions, (_, k) in zip(self._positions, self.plan):
+            chosen = parts[pos:pos + k]
+            pos += k
+            idx = sorted(positions.get(term, -1) for term in chosen)
+            if (idx and idx[0] < 0) or len(set(idx)) != k:
+                return None
+            digits.append(rank_subset(idx))
+        return digits
+
+    def iter_range(self, start: int = 0, stop: int | None = None, seed: int | None = None):
+        """Yield prompts at positions ``start``..``stop`` of the enumeration.
+
+        With ``seed`` the positions follow a keyed pseudo-random permutation
+        of the space, so any contiguous slice is a well-mixed sample and
+        slices handed to different nodes never overlap. Positions whose
+        prompt breaks the bank's constraints are skipped, so a slice may
+        yield fewer prompts than it spans.
+        """
+        stop = self.size if stop is None else min(stop, self.size)
+        order = FeistelPermutation(self.size, seed) if seed is not None else None
+        check = self.engine.compiled.constraints is not None
+        for pos in range(start, stop):
+            index = order(pos) if order else pos
+            if check and not self.allows(index):
+                continue
+            yield self._render(self._digits(index))
@@ -0,0 +1,185 @@
+"""Per-stage timings and counters for the generation pipeline.
+
+Instrumentation is off by default. While it is off, :func:`stage`
+returns a shared no-op context and :func:`count` returns immediately,
+so the hooks cost one function call. Hooks sit at batch and chunk
+boundaries, never inside per-prompt loops.
+
+Each stage accumulates ``calls``, wall-clock ``seconds``, ``items``,
+``bytes`` written and file ``opens``. ``seconds`` is the stage's own
+time: time spent in stages nested inside it on the same thread, or
+producing an iterable passed through :meth:`_Stage.exclude`, is charged
+to those stages instead. :func:`snapshot` returns plain
+dicts for a metrics pipeline, and :func:`summary` formats them for
+people.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+FIELDS = ("calls", "seconds", "items", "bytes", "opens")
+
+_enabled = False
+_lock = threading.Lock()
+_stats: dict[str, dict] = {}
+_local = threading.local()
+
+
+def enable(reset: bool = True) -> None:
+    global _enabled
+    if reset:
+        with _lock:
+            _stats.clear()
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _record(name: str, seconds: float = 0.0, calls: int = 0, items: int = 0, bytes: int = 0, opens: int = 0) -> None:
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = dict.fromkeys(FIELDS, 0)
+            entry["seconds"] = 0.0
+        entry["calls"] += calls
+        entry["seconds"] += seconds
+        entry["items"] += items
+        entry["bytes"] += bytes
+        entry["opens"] += opens
+
+
+def count(name: str, items: int = 0, bytes: int = 0, opens: int = 0) -> None:
+    """Add to a stage's counters without timing anything."""
+    if _enabled:
+        _record(name, items=items, bytes=bytes, opens=opens)
+
+
+def _stack() -> list:
+    """Stages open on this thread; ``None`` marks time charged to no one."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class _Stage:
+    __slots__ = ("name", "items", "bytes", "opens", "_start", "_excluded")
+
+    def __init__(self, name: str, items: int):
+        self.name = name
+        self.items = items
+        self.bytes = 0
+        self.opens = 0
+        self._excluded = 0.0
+
+    def add(self, items: int = 0, bytes: int = 0, opens: int = 0) -> None:
+        self.items += items
+        self.bytes += bytes
+        self.opens += opens
+
+    def exclude(self, iterable):
+        """Iterate ``iterable`` without charging the time spent producing it to this stage.
+
+        Lets a consumer such as a file writer report its own cost even
+        when it is fed by a generator or a queue.
+        """
+        it = iter(iterable)
+        stack = _stack()
+        while True:
+            stack.append(None)
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self._excluded += time.perf_counter() - start
+                stack.pop()
+            yield item
+
+    def __enter__(self):
+        _stack().append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        stack = _stack()
+        stack.pop()
+        if stack and stack[-1] is not None:
+            stack[-1]._excluded += elapsed
+        _record(self.name, elapsed - self._excluded, 1, self.items, self.bytes, self.opens)
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def add(self, items: int = 0, bytes: int = 0, opens: int = 0) -> None:
+        pass
+
+    def exclude(self, iterable):
+        return iterable
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str, items: int = 0):
+    """Context manager timing one pass through a stage."""
+    return _Stage(name, items) if _enabled else _NO_STAGE
+
+
+def snapshot() -> dict[str, dict]:
+    """Copy of every stage's counters, keyed by stage name."""
+    with _lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+
+def merge(stats: dict[str, dict]) -> None:
+    """Fold counters recorded elsewhere (e.g. in a worker process) into this process."""
+    for name, entry in stats.items():
+        _record(name, **entry)
+
+
+def summary(stats: dict[str, dict] | None = None) -> str:
+    """One line per stage, slowest first."""
+    stats = snapshot() if stats is None else stats
+    lines = []
+    for name, s in sorted(stats.items(), key=lambda item: item[1]["seconds"], reverse=True):
+        line = f"{name:<16} {s['seconds']:9.3f}s  {s['calls']:>7} calls"
+        if s["items"]:
+            rate = s["items"] / s["seconds"] if s["seconds"] else 0
+            line += f"  {s['items']:>10} items ({rate:,.0f}/s)"
+        if s["bytes"]:
+            line += f"  {s['bytes'] / 1e6:,.1f} MB"
+        if s["opens"]:
+            line += f"  {s['opens']} opens"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def short_summary(stats: dict[str, dict] | None = None) -> str:
+    """Stage times on one line, for a status bar."""
+    stats = snapshot() if stats is None else stats
+    ordered = sorted(stats.items(), key=lambda item: item[1]["seconds"], reverse=True)
+    return " · ".join(f"{name} {s['seconds']:.2f}s" for name, s in ordered)
+
+
+def to_json(stats: dict[str, dict] | None = None) -> str:
+    return json.dumps({"stages": snapshot() if stats is None else stats}, sort_keys=True)
@@ -0,0 +1,143 @@
+"""Run a JSONL file of generation jobs on a worker pool.
+
+Each line is one job with the CLI's generation options::
+
+    {"profile": "text_generation", "num": 1000, "diff": 3, "tag": "stories", "format": "json"}
+
+Recognised keys are listed in :data:`JOB_FIELDS`. ``profile`` is
+required, and ``id`` names the job (default: a hash of its options).
+Jobs are sorted by profile, so each worker process loads a vocabulary
+once and reuses its warm engine for the rest of that profile's jobs.
+
+Every finished job is appended to a status JSONL file as soon as it
+completes. Re-running with the same status file skips jobs already
+recorded as ``done``. A job interrupted by a crash is simply run again;
+its partial output file and vault entries are not rolled back.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from .filelock import LockedAppender
+
+JOB_FIELDS = (
+    "id", "profile", "num", "diff", "category", "baseline", "template",
+    "format", "tag", "seed", "model", "compress", "max_tokens",
+)
+
+_SERVICE = None
+
+
+def read_jobs(path) -> list[dict]:
+    """Parse and validate a jobs file; raises ``ValueError`` naming the bad line."""
+    jobs, seen = [], {}
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"{path}:{lineno}: {exc}") from None
+            if not isinstance(job, dict) or not job.get("profile"):
+                raise ValueError(f"{path}:{lineno}: a job must be an object with a 'profile'")
+            unknown = set(job) - set(JOB_FIELDS)
+            if unknown:
+                raise ValueError(f"{path}:{lineno}: unknown job fields {', '.join(sorted(unknown))}")
+            if "id" not in job:
+                key = hashlib.sha1(json.dumps(job, sort_keys=True).encode()).hexdigest()[:12]
+                seen[key] = seen.get(key, 0) + 1
+                job["id"] = key if seen[key] == 1 else f"{key}-{seen[key]}"
+            jobs.append(job)
+    return jobs
+
+
+def completed_jobs(status_path) -> set[str]:
+    """Ids recorded as done in a status file (missing file: none)."""
+    done = set()
+    path = Path(status_path)
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line torn by a crash
+                if record.get("status") == "done":
+                    done.add(record["id"])
+    return done
+
+
+def _init_worker(profile_path: str, out_dir: str) -> None:
+    global _SERVICE
+    from .server import GenerationService
+
+    _SERVICE = GenerationService(profile_path, out_dir=out_dir)
+
+
+def _run_job(job: dict) -> dict:
+    options = {k: v for k, v in job.items() if k != "id"}
+    options.setdefault("tag", "jobs")
+    start = time.perf_counter()
+    result = _SERVICE.generate(save=True, **options)
+    return {"count": result["count"], "path": result["path"], "seconds": round(time.perf_counter() - start, 3)}
+
+
+def run_jobs(
+    jobs_path,
+    status_path=None,
+    concurrency: int | None = None,
+    out_dir: str = "outputs",
+    profile_path: str = "prompt_profiles.json",
+):
+    """Run every job not yet done and yield one status record per job.
+
+    Records are yielded (and appended to ``status_path``, by default
+    ``<jobs>.status.jsonl``) in completion order. At most ``concurrency``
+    jobs run at once (all cores by default); 1 runs them inline.
+    """
+    jobs = read_jobs(jobs_path)
+    status_path = Path(status_path or Path(jobs_path).with_suffix(".status.jsonl"))
+    done = completed_jobs(status_path)
+    pending = sorted((job for job in jobs if job["id"] not in done), key=lambda job: job["profile"])
+    for job in jobs:
+        if job["id"] in done:
+            yield {"id": job["id"], "status": "skipped"}
+    if not pending:
+        return
+    concurrency = min(concurrency or os.cpu_count() or 1, len(pending))
+
+    with LockedAppender(status_path) as status:
+
+        def record(job, result=None, error=None):
+            entry = {"id": job["id"], "profile": job["profile"]}
+            if error is None:
+                entry.update(status="done", **result)
+            else:
+                entry.update(status="failed", error=f"{type(error).__name__}: {error}")
+            status.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            return entry
+
+        if concurrency <= 1:
+            _init_worker(profile_path, out_dir)
+            for job in pending:
+                try:
+                    yield record(job, _run_job(job))
+                except Exception as exc:
+                    yield record(job, error=exc)
+            return
+
+        with ProcessPoolExecutor(concurrency, initializer=_init_worker, initargs=(profile_path, out_dir)) as pool:
+            futures = {pool.submit(_run_job, job): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    yield record(job, future.result())
+                except Exception as exc:
+                    yield record(job, error=exc)
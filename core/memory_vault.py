@@ -1,39 +1,77 @@
-import json
 from datetime import datetime
 from pathlib import Path
 
+from . import instrument
+from .similarity import THRESHOLD
+from .vault_store import VaultBackend, migrate_json_vault, open_backend
+
+LEGACY_VAULT = Path("logs/prompt_memory.json")
+
 
 class PromptMemoryVault:
-    """Simple JSON-backed store for generated prompts."""
+    """Persistent store for generated prompts.
 
-    def __init__(self, vault_path: str = "logs/prompt_memory.json"):
+    Entries live in an append-only SQLite database by default; a path
+    ending in ``.json`` keeps the original single-file format. A legacy
+    ``logs/prompt_memory.json`` is imported the first time the default
+    vault is opened.
+    """
+
+    def __init__(
+        self,
+        vault_path: str = "logs/prompt_memory.db",
+        backend: VaultBackend | None = None,
+        legacy_path: str | None = str(LEGACY_VAULT),
+    ):
         self.vault_path = Path(vault_path)
-        self.vault = self._load_vault()
+        self.backend = backend or open_backend(self.vault_path)
+        if legacy_path and Path(legacy_path) != self.vault_path and Path(legacy_path).exists():
+            migrate_json_vault(Path(legacy_path), self.backend)
+
+    @property
+    def vault(self):
+        """All entries as a list; loads the full history, prefer ``entries()``."""
+        return list(self.entries())
 
-    def _load_vault(self):
-        if self.vault_path.exists():
-            with open(self.vault_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return []
+    def entries(self):
+        """Iterate over stored entries in insertion order."""
+        return self.backend.iter_entries()
 
-    def _save_vault(self):
-        self.vault_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.vault_path, "w", encoding="utf-8") as f:
-            json.dump(self.vault, f, indent=2)
+    def __len__(self):
+        return self.backend.count()
 
     def add_entry(self, prompt: str, category: str = "general", tags=None):
-        entry = {
-            "prompt": prompt,
-            "timestamp": datetime.now().isoformat(),
-            "category": category,
-            "tags": tags or []
-        }
-        self.vault.append(entry)
-        self._save_vault()
-        return entry
+        return self.add_entries([prompt], category=category, tags=tags)[0]
+
+    def add_entries(self, prompts, category: str = "general", tags=None):
+        """Add many prompts sharing a category and tags in one write."""
+        timestamp = datetime.now().isoformat()
+        entries = [
+            {
+                "prompt": prompt,
+                "timestamp": timestamp,
+                "category": category,
+                "tags": list(tags or [])
+            }
+            for prompt in prompts
+        ]
+        with instrument.stage("vault", len(entries)):
+            self.backend.append(entries)
+        return entries
 
     def search_by_tag(self, tag: str):
-        return [p for p in self.vault if tag in p.get("tags", [])]
+        return self.backend.by_tag(tag)
 
     def filter_by_category(self, category: str):
-        return [p for p in self.vault if p.get("category") == category]
+        return self.backend.by_category(category)
+
+    def query(self, **filters):
+        """Combined indexed lookup; see :meth:`SQLiteVaultBackend.query`."""
+        return self.backend.query(**filters)
+
+    def near_duplicates(self, prompt: str, threshold: float = THRESHOLD, limit: int | None = None):
+        """Entries sharing most of their terms with ``prompt``; see :meth:`SQLiteVaultBackend.near_duplicates`."""
+        return self.backend.near_duplicates(prompt, threshold, limit)
+
+    def close(self):
+        self.backend.close()
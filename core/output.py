@@ -1,15 +1,82 @@
-import json
+import csv
+import gzip
 import hashlib
+import io
+import json
+import lzma
+import shutil
+import tempfile
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
 
+from . import instrument
+from .filelock import LockedAppender, append_text
+from .tokens import estimate_tokens
+
+HASH_LOG = Path("logs/prompt_hashes.txt")
+# Prompts buffered per write; bounds memory regardless of the batch size.
+CHUNK_SIZE = 10_000
+COMPRESSIONS = {"gzip": ".gz", "lzma": ".xz"}
+# Batch inference request files; OpenAI's Batch API takes at most
+# 50,000 requests and 200 MB per input file.
+BATCH_ENDPOINT = "/v1/chat/completions"
+PART_LINES = 50_000
+PART_BYTES = 200 * 1024 * 1024
+
 
-def save_prompt_hash(prompt: str, log_path: Path = Path("logs/prompt_hashes.txt")) -> None:
+def save_prompt_hash(prompt: str, log_path: Path = HASH_LOG) -> None:
     """Persist a hash of the prompt for traceability."""
-    hash_val = hashlib.sha256(prompt.encode()).hexdigest()
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(f"{datetime.now().isoformat()} | {hash_val} | {prompt}\n")
+    save_prompt_hashes([prompt], log_path)
+
+
+def save_prompt_hashes(prompts, log_path: Path = HASH_LOG) -> None:
+    """Append hash lines for many prompts with a single file open.
+
+    The lines land contiguously even when other processes append to the
+    same log (see :class:`~core.filelock.LockedAppender`).
+    """
+    with instrument.stage("hash_log") as st:
+        lines = _hash_lines(prompts)
+        written = append_text(log_path, lines)
+        st.add(items=lines.count("\n"), bytes=written, opens=1)
+
+
+def _hash_lines(prompts) -> str:
+    stamp = datetime.now().isoformat()
+    return "".join(
+        f"{stamp} | {hashlib.sha256(p.encode()).hexdigest()} | {p}\n" for p in prompts
+    )
+
+
+def iter_chunks(iterable, size: int = CHUNK_SIZE):
+    """Yield lists of at most ``size`` items from any iterable."""
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def _create_output(out_path: Path, stem: str, suffix: str):
+    """Exclusively create ``stem + suffix``, numbering it ``_2``, ``_3``... if taken.
+
+    Names only have one-second resolution, so concurrent runs with the
+    same tag would otherwise overwrite each other's file.
+    """
+    n = 1
+    while True:
+        path = out_path / (f"{stem}{suffix}" if n == 1 else f"{stem}_{n}{suffix}")
+        try:
+            return path, open(path, "xb")
+        except FileExistsError:
+            n += 1
+
+
+def _open_output(raw, compress: str | None):
+    if compress == "gzip":
+        return gzip.open(raw, "wt", encoding="utf-8", newline="")
+    if compress == "lzma":
+        return lzma.open(raw, "wt", encoding="utf-8", newline="")
+    return io.TextIOWrapper(raw, encoding="utf-8", newline="")
 
 
 def save_prompts(
@@ -18,45 +85,382 @@ def save_prompts(
     out_dir: str = "outputs",
     tag: str = "default",
     model: str | None = None,
+    compress: str | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    hash_log: Path | None = HASH_LOG,
+    token_counts: bool = False,
+    profiles=None,
+    **batch_options,
 ) -> Path:
-    """Save prompts in various formats with optional model metadata."""
+    """Save prompts in various formats with optional model metadata.
+
+    ``prompts`` may be any iterable, including a generator; it is consumed
+    once and written in chunks of ``chunk_size`` so memory stays bounded.
+    ``compress`` may be ``"gzip"`` or ``"lzma"`` to compress while writing.
+    Hash lines go to ``hash_log`` unless it is ``None``. With
+    ``token_counts`` each prompt's estimated token count is recorded too
+    (a ``tokens`` list in json, a column in csv, item metadata in gpt and
+    gpt-jsonl; txt lines stay bare prompts). ``profiles`` records the
+    profile behind the prompts: one name for all of them (a top-level
+    ``profile`` in json) or an iterable with one name per prompt (a
+    ``profiles`` list in json). csv gets a ``profile`` column and gpt and
+    gpt-jsonl item metadata; txt lines stay bare.
+
+    ``"gpt-jsonl"`` is handled by :func:`save_batch_requests`, which takes
+    ``batch_options`` and returns the manifest path.
+    """
+    if format == "gpt-jsonl":
+        return save_batch_requests(
+            prompts, out_dir, tag, model, compress, chunk_size, hash_log, token_counts, profiles, **batch_options
+        )
+    writer = _WRITERS.get(format)
+    if writer is None:
+        raise ValueError("Unsupported format")
+    if compress is not None and compress not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compress}'")
     out_path = Path(out_dir)
     out_path.mkdir(parents=True, exist_ok=True)
-    filename = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{tag}.{format}"
-    filepath = out_path / filename
+    stem = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{tag}"
+    filepath, raw = _create_output(out_path, stem, f".{format}" + COMPRESSIONS.get(compress, ""))
 
-    if format == "json":
-        payload = {"prompts": prompts}
-        if model:
-            payload["model"] = model
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(payload, f, indent=2)
-    elif format == "txt":
-        with open(filepath, "w", encoding="utf-8") as f:
-            if model:
-                f.write(f"# model: {model}\n")
-            for p in prompts:
-                f.write(p + "\n")
-    elif format == "csv":
-        with open(filepath, "w", encoding="utf-8") as f:
-            if model:
-                f.write("model,prompt\n")
-                for p in prompts:
-                    f.write(f"{model},\"{p}\"\n")
+    with instrument.stage("write") as st:
+        with raw, _open_output(raw, compress) as f:
+            chunks = st.exclude(iter_chunks(prompts, chunk_size))
+            _drain(writer(f, chunks, model, token_counts, _label_source(profiles)), st, hash_log)
+        if instrument.enabled():
+            st.add(bytes=filepath.stat().st_size, opens=1)
+    return filepath
+
+
+def _label_source(profiles):
+    """A profile name for every prompt, or an iterator of per-prompt names; ``None`` stays ``None``."""
+    if profiles is None or isinstance(profiles, str):
+        return profiles
+    return iter(profiles)
+
+
+def _labels(profiles, n: int) -> list[str] | None:
+    """The next ``n`` profile names from :func:`_label_source`."""
+    if profiles is None:
+        return None
+    if isinstance(profiles, str):
+        return [profiles] * n
+    return list(islice(profiles, n))
+
+
+def _drain(chunks, st, hash_log: Path | None) -> None:
+    """Run a writer to completion, counting its chunks and logging their hashes."""
+    if hash_log is None:
+        for chunk in chunks:
+            st.add(items=len(chunk))
+        return
+    with LockedAppender(hash_log) as log:
+        for chunk in chunks:
+            st.add(items=len(chunk))
+            with instrument.stage("hash_log", len(chunk)) as hs:
+                hs.add(bytes=log.write(_hash_lines(chunk)))
+    instrument.count("hash_log", opens=1)
+
+
+class _HashingSink:
+    """Binary file wrapper that tracks the size and SHA-256 of what reaches disk."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+    def flush(self) -> None:
+        self.raw.flush()
+
+
+def _create_dir(out_path: Path, stem: str) -> Path:
+    """Exclusively create directory ``stem``, numbering it like :func:`_create_output`."""
+    n = 1
+    while True:
+        path = out_path / (stem if n == 1 else f"{stem}_{n}")
+        try:
+            path.mkdir(parents=True)
+            return path
+        except FileExistsError:
+            n += 1
+
+
+def save_batch_requests(
+    prompts,
+    out_dir: str = "outputs",
+    tag: str = "default",
+    model: str | None = None,
+    compress: str | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    hash_log: Path | None = HASH_LOG,
+    token_counts: bool = False,
+    profiles=None,
+    part_lines: int | None = None,
+    part_bytes: int | None = None,
+    custom_id: str = "index",
+) -> Path:
+    """Stream prompts into batch-inference JSONL files and return the manifest path.
+
+    Each line is one ``POST`` to :data:`BATCH_ENDPOINT`. ``custom_id`` is
+    ``"index"`` (``<tag>-<n>``, unique within the run) or ``"hash"`` (the
+    prompt's SHA-256 prefix, shared by duplicate prompts). Files go to a
+    new ``batch_<timestamp>_<tag>`` directory as ``part-00001.jsonl`` and
+    so on. A new part starts before it would exceed ``part_lines`` lines
+    or ``part_bytes`` bytes, both measured before compression. Only the
+    current chunk and part are held in memory. ``manifest.json`` lists
+    every part with its line count, size, SHA-256 and id range.
+    ``profiles`` goes to each request's ``body.metadata.profile``; see
+    :func:`save_prompts`.
+    """
+    if custom_id not in ("index", "hash"):
+        raise ValueError(f"Unsupported custom_id '{custom_id}'")
+    if compress is not None and compress not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compress}'")
+    part_lines = part_lines or PART_LINES
+    part_bytes = part_bytes or PART_BYTES
+    if part_lines < 1 or part_bytes < 1:
+        raise ValueError("Part caps must be positive")
+    now = datetime.now()
+    directory = _create_dir(Path(out_dir), f"batch_{now.strftime('%Y%m%d_%H%M%S')}_{tag}")
+    model = model or "gpt-4o"
+    parts = []
+    with instrument.stage("write") as st:
+        chunks = _write_batch_parts(
+            directory, st.exclude(iter_chunks(prompts, chunk_size)), parts,
+            model, tag, compress, token_counts, _label_source(profiles), part_lines, part_bytes, custom_id,
+        )
+        _drain(chunks, st, hash_log)
+        manifest = {
+            "format": "gpt-jsonl",
+            "endpoint": BATCH_ENDPOINT,
+            "model": model,
+            "created": now.isoformat(),
+            "custom_id": custom_id,
+            "compress": compress,
+            "count": sum(part["lines"] for part in parts),
+            "parts": parts,
+        }
+        path = directory / "manifest.json"
+        path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+        st.add(bytes=sum(part["size"] for part in parts), opens=len(parts) + 1)
+    return path
+
+
+def _write_batch_parts(directory, chunks, parts, model, tag, compress, token_counts, profiles, part_lines, part_bytes, custom_id):
+    body = {"model": model, "messages": [{"role": "user", "content": "\x01"}]}
+    metadata = {}
+    if token_counts:
+        metadata["estimated_tokens"] = "\x02"
+    if profiles is not None:
+        metadata["profile"] = "\x03"
+    if metadata:
+        body["metadata"] = metadata
+    line = json.dumps({"custom_id": "\x00", "method": "POST", "url": BATCH_ENDPOINT, "body": body}, separators=(",", ":"))
+    head, rest = line.split('"\\u0000"')
+    middle, tail = rest.split('"\\u0001"')
+    if token_counts:
+        counts, tail = tail.split("\\u0002")
+    if profiles is not None:
+        named, tail = tail.split('"\\u0003"')
+    tail += "\n"
+    # json.dumps(s) for a str, without the dispatch overhead.
+    quote = json.encoder.encode_basestring_ascii
+    id_prefix = quote(f"{tag}-")[:-1]
+    suffix = ".jsonl" + COMPRESSIONS.get(compress, "")
+    part = raw = sink = stream = None
+
+    def open_part(cid):
+        nonlocal part, raw, sink, stream
+        name = f"part-{len(parts) + 1:05d}{suffix}"
+        raw = open(directory / name, "xb")
+        sink = _HashingSink(raw)
+        stream = _open_binary(sink, compress)
+        part = {"file": name, "lines": 0, "bytes": 0, "first_id": json.loads(cid)}
+        parts.append(part)
+
+    def close_part():
+        nonlocal part
+        if stream is not sink:
+            stream.close()
+        raw.close()
+        part.update(size=sink.size, sha256=sink.sha256.hexdigest())
+        part = None
+
+    index = 0
+    try:
+        for chunk in chunks:
+            if custom_id == "index":
+                ids = [f'{id_prefix}{i}"' for i in range(index, index + len(chunk))]
             else:
-                f.write("prompt\n")
-                for p in prompts:
-                    f.write(f"\"{p}\"\n")
-    elif format == "gpt":
-        payload = [
-            {"model": model or "gpt-4o", "messages": [{"role": "user", "content": p}]}
-            for p in prompts
-        ]
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(payload, f, indent=2)
-    else:
-        raise ValueError("Unsupported format")
+                ids = ['"' + hashlib.sha256(p.encode()).hexdigest()[:32] + '"' for p in chunk]
+            labels = _labels(profiles, len(chunk))
+            if labels is not None:
+                lines = [
+                    (
+                        head + cid + middle + quote(p)
+                        + (counts + str(estimate_tokens(p)) if token_counts else "")
+                        + named + quote(label) + tail
+                    ).encode()
+                    for cid, p, label in zip(ids, chunk, labels)
+                ]
+            elif token_counts:
+                lines = [
+                    (head + cid + middle + quote(p) + counts + str(estimate_tokens(p)) + tail).encode()
+                    for cid, p in zip(ids, chunk)
+                ]
+            else:
+                lines = [(head + cid + middle + quote(p) + tail).encode() for cid, p in zip(ids, chunk)]
+            index += len(chunk)
+            start = 0
+            while start < len(lines):
+                if part is None:
+                    open_part(ids[start])
+                # Take as many lines as fit; a part always takes at least one.
+                end, size = start, part["bytes"]
+                stop = min(len(lines), start + part_lines - part["lines"])
+                while end < stop and (size + len(lines[end]) <= part_bytes or not (part["lines"] or end > start)):
+                    size += len(lines[end])
+                    end += 1
+                if end > start:
+                    stream.write(b"".join(lines[start:end]))
+                    part["lines"] += end - start
+                    part["bytes"] = size
+                    part["last_id"] = json.loads(ids[end - 1])
+                    start = end
+                if start < len(lines):
+                    close_part()
+            yield chunk
+        if part is not None:
+            close_part()
+    finally:
+        if part is not None:  # abandoned by an error: release the file
+            raw.close()
 
-    for p in prompts:
-        save_prompt_hash(p)
-    return filepath
+
+def _open_binary(sink, compress: str | None):
+    if compress == "gzip":
+        return gzip.GzipFile(fileobj=sink, mode="wb")
+    if compress == "lzma":
+        return lzma.LZMAFile(sink, "wb")
+    return sink
+
+
+def _write_json(f, chunks, model, token_counts=False, profiles=None):
+    # Matches json.dump({"prompts": [...], "model": model}, indent=2).
+    # Per-prompt lists are spooled to temporary files while the prompts
+    # stream out, then copied after them, so memory stays bounded.
+    f.write('{\n  "prompts": [')
+    first = True
+    spools = {}
+    if profiles is not None and not isinstance(profiles, str):
+        spools["profiles"] = tempfile.TemporaryFile("w+", encoding="utf-8")
+    if token_counts:
+        spools["tokens"] = tempfile.TemporaryFile("w+", encoding="utf-8")
+    try:
+        for chunk in chunks:
+            sep = "\n    " if first else ",\n    "
+            f.write(sep + ",\n    ".join(json.dumps(p) for p in chunk))
+            if "profiles" in spools:
+                labels = _labels(profiles, len(chunk))
+                spools["profiles"].write(("" if first else ", ") + ", ".join(map(json.dumps, labels)))
+            if token_counts:
+                spools["tokens"].write(("" if first else ", ") + ", ".join(str(estimate_tokens(p)) for p in chunk))
+            first = False
+            yield chunk
+        f.write("]" if first else "\n  ]")
+        if model:
+            f.write(f',\n  "model": {json.dumps(model)}')
+        if isinstance(profiles, str):
+            f.write(f',\n  "profile": {json.dumps(profiles)}')
+        for key, spool in spools.items():
+            f.write(f',\n  "{key}": [')
+            spool.seek(0)
+            shutil.copyfileobj(spool, f)
+            f.write("]")
+        f.write("\n}")
+    finally:
+        for spool in spools.values():
+            spool.close()
+
+
+def _write_txt(f, chunks, model, token_counts=False, profiles=None):
+    if model:
+        f.write(f"# model: {model}\n")
+    for chunk in chunks:
+        f.write("".join(p + "\n" for p in chunk))
+        yield chunk
+
+
+def _write_csv(f, chunks, model, token_counts=False, profiles=None):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(
+        (["model"] if model else []) + (["profile"] if profiles is not None else [])
+        + ["prompt"] + (["tokens"] if token_counts else [])
+    )
+    for chunk in chunks:
+        labels = _labels(profiles, len(chunk))
+        rows = ([p] for p in chunk)
+        if labels is not None:
+            rows = ([label, p] for label, p in zip(labels, chunk))
+        if model:
+            rows = ([model, *row] for row in rows)
+        if token_counts:
+            rows = (row + [estimate_tokens(row[-1])] for row in rows)
+        writer.writerows(rows)
+        f.write(buf.getvalue())
+        buf.seek(0)
+        buf.truncate()
+        yield chunk
+    f.write(buf.getvalue())
+
+
+def _write_gpt(f, chunks, model, token_counts=False, profiles=None):
+    # Matches json.dump([{"model": ..., "messages": [...]}, ...], indent=2).
+    item = {"model": model or "gpt-4o", "messages": [{"role": "user", "content": "\x00"}]}
+    metadata = {}
+    if token_counts:
+        # Chat Completions metadata values must be strings.
+        metadata["estimated_tokens"] = "\x01"
+    if profiles is not None:
+        metadata["profile"] = "\x02"
+    if metadata:
+        item["metadata"] = metadata
+    item = json.dumps(item, indent=2).replace("\n", "\n  ")
+    head, tail = item.split('"\\u0000"')
+    if token_counts:
+        middle, tail = tail.split("\\u0001")
+    if profiles is not None:
+        named, tail = tail.split('"\\u0002"')
+    first = True
+    for chunk in chunks:
+        sep = "[\n  " if first else ",\n  "
+        labels = _labels(profiles, len(chunk))
+        if labels is not None:
+            items = (
+                head + json.dumps(p) + (middle + str(estimate_tokens(p)) if token_counts else "")
+                + named + json.dumps(label) + tail
+                for p, label in zip(chunk, labels)
+            )
+        elif token_counts:
+            items = (head + json.dumps(p) + middle + str(estimate_tokens(p)) + tail for p in chunk)
+        else:
+            items = (head + json.dumps(p) + tail for p in chunk)
+        f.write(sep + ",\n  ".join(items))
+        first = False
+        yield chunk
+    f.write("[]" if first else "\n]")
+
+
+_WRITERS = {
+    "json": _write_json,
+    "txt": _write_txt,
+    "csv": _write_csv,
+    "gpt": _write_gpt,
+}
@@ -0,0 +1,221 @@
+"""Seeded, sharded multi-process batch generation.
+
+A run of ``num`` prompts is cut into fixed-size chunks. Chunk ``j`` is
+generated with its own RNG seeded from ``(seed, j)``. Output therefore
+depends only on the seed and the chunk layout, never on how many worker
+processes ran or which worker took which chunk. Shard ``i`` of ``N``
+owns the ``i``-th of ``N`` contiguous runs of chunks, so concatenating
+the shards in order gives the unsharded run. :func:`generate_profiles` runs
+several profiles this way on one shared pool.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Sequence
+
+from . import instrument
+from .output import CHUNK_SIZE
+from .prompt_profiles import default_pool
+
+
+# Chunk size for one interleaved stream of several profiles: the stream
+# mixes profiles in blocks of at most this many prompts.
+INTERLEAVE_CHUNK = 1_000
+
+
+def chunk_seed(seed: int, chunk: int, profile: str | None = None) -> int:
+    """Derive an independent 64-bit seed for one chunk of a run.
+
+    Chunks of different ``profile`` streams in one run get unrelated seeds.
+    """
+    key = f"{seed}:{chunk}" if profile is None else f"{seed}:{profile}:{chunk}"
+    h = hashlib.sha256(key.encode()).digest()
+    return int.from_bytes(h[:8], "little")
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse ``"i/N"`` into ``(i, N)``."""
+    index, _, total = value.partition("/")
+    shard, shards = int(index), int(total or 1)
+    if shards < 1 or not 0 <= shard < shards:
+        raise ValueError(f"Invalid shard '{value}': expected i/N with 0 <= i < N")
+    return shard, shards
+
+
+def parse_profile_mix(value: str, profiles: Sequence[str], num: int) -> list[tuple[str, int]]:
+    """Parse a ``--profile`` list into ``(name, count)`` pairs.
+
+    Entries are ``NAME``, ``NAME=COUNT`` or ``NAME:WEIGHT``, and ``all``
+    stands for every profile in ``profiles``. An entry with a count gets
+    exactly that many prompts; the others share ``num`` in proportion to
+    their weights (default 1), rounded so the shares add up to ``num``.
+    """
+    entries = []
+    for item in (item.strip() for item in value.split(",")):
+        if not item:
+            continue
+        name, count, weight = item, None, 1.0
+        try:
+            if "=" in item:
+                name, _, text = item.partition("=")
+                count = int(text)
+            elif ":" in item:
+                name, _, text = item.partition(":")
+                weight = float(text)
+        except ValueError:
+            raise ValueError(f"Invalid profile entry '{item}': expected NAME, NAME=COUNT or NAME:WEIGHT") from None
+        if (count is not None and count < 0) or not weight > 0:
+            raise ValueError(f"Invalid profile entry '{item}': counts must be >= 0 and weights > 0")
+        names = list(profiles) if name == "all" else [name]
+        if name not in profiles and name != "all":
+            raise ValueError(f"Profile '{name}' not found (choose from {', '.join(profiles)} or all)")
+        entries.extend([n, count, weight] for n in names)
+    seen = set()
+    for name, _, _ in entries:
+        if name in seen:
+            raise ValueError(f"Profile '{name}' is listed more than once")
+        seen.add(name)
+    if not entries:
+        raise ValueError("No profiles given")
+    shared = [entry for entry in entries if entry[1] is None]
+    total = sum(weight for _, _, weight in shared)
+    exact = [num * weight / total for _, _, weight in shared]
+    for entry, share in zip(shared, exact):
+        entry[1] = math.floor(share)
+    # Largest remainders first, so the shares add up to num.
+    left = num - sum(entry[1] for entry in shared)
+    for i in sorted(range(len(shared)), key=lambda i: exact[i] - shared[i][1], reverse=True)[:left]:
+        shared[i][1] += 1
+    return [(name, count) for name, count, _ in entries]
+
+
+def shard_chunks(num: int, shard: int = 0, shards: int = 1, chunk_size: int = CHUNK_SIZE):
+    """Return ``(chunk_index, count)`` for every chunk owned by a shard.
+
+    Each shard owns a contiguous run of chunks, so the shards' outputs
+    concatenated in shard order are the unsharded output.
+    """
+    total = -(-num // chunk_size)
+    return [
+        (j, min(chunk_size, num - j * chunk_size))
+        for j in range(shard * total // shards, (shard + 1) * total // shards)
+    ]
+
+
+def _generate_chunk(spec):
+    vocab_path, templates_path, seed, count, diff_level, baseline, category, template, max_tokens, ranks = spec
+    engine = default_pool().get(vocab_path, templates_path)
+    rng = random.Random(seed)
+    if not ranks:
+        return engine.generate_batch(count, diff_level, baseline, category, template, rng=rng, max_tokens=max_tokens)
+    plan, columns = engine.generate_ranks(count, diff_level, baseline, category, template, rng=rng, max_tokens=max_tokens)
+    return columns, engine.render_ranks(plan, columns, baseline, template)
+
+
+def _generate_chunk_instrumented(spec):
+    """``_generate_chunk`` in a worker, returning the chunk's stage counters too."""
+    instrument.enable()
+    return _generate_chunk(spec), instrument.snapshot()
+
+
+def generate_parallel(
+    vocab_path: str,
+    num: int,
+    diff_level: int = 5,
+    baseline: str = "",
+    category: str | None = None,
+    template: str = "plain",
+    seed: int | None = None,
+    workers: int | None = None,
+    shard: int = 0,
+    shards: int = 1,
+    chunk_size: int = CHUNK_SIZE,
+    templates_path: str | None = None,
+    max_tokens: int | None = None,
+    ranks: bool = False,
+):
+    """Yield this shard's chunks of prompts in chunk order.
+
+    Chunks are generated on up to ``workers`` processes (all cores by
+    default) with at most two chunks per worker in flight, so memory
+    stays bounded while the consumer writes them out. Without ``seed``
+    a random one is drawn, so output is not reproducible. When
+    :mod:`core.instrument` is enabled, the workers' stage counters are
+    merged into this process.
+
+    With ``ranks`` each chunk is a ``(ranks, prompts)`` pair, ``ranks``
+    being the columns :meth:`PromptEngine.generate_ranks` drew for it.
+    """
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    specs = [
+        (str(vocab_path), templates_path and str(templates_path), chunk_seed(seed, j), count, diff_level, baseline, category, template, max_tokens, ranks)
+        for j, count in shard_chunks(num, shard, shards, chunk_size)
+    ]
+    yield from _run_specs(specs, workers)
+
+
+def generate_profiles(
+    runs: Sequence[tuple[str, str, str | None, int, int]],
+    baseline: str = "",
+    template: str = "plain",
+    seed: int | None = None,
+    workers: int | None = None,
+    shard: int = 0,
+    shards: int = 1,
+    chunk_size: int = CHUNK_SIZE,
+    max_tokens: int | None = None,
+):
+    """Yield ``(name, prompts)`` chunks for several profiles from one worker pool.
+
+    ``runs`` holds ``(name, vocab_path, templates_path, num, diff_level)``
+    per profile. Each profile is chunked as :func:`generate_parallel`
+    would, with chunk seeds derived from ``seed`` and the profile name,
+    so profiles never replay each other's random stream. Chunks are
+    interleaved in proportion to each profile's share of the run, so
+    every stretch of the output is balanced, and all profiles share the
+    ``workers``.
+    """
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    order = []
+    for r, (name, vocab_path, templates_path, num, diff_level) in enumerate(runs):
+        chunks = shard_chunks(num, shard, shards, chunk_size)
+        for pos, (j, count) in enumerate(chunks):
+            spec = (str(vocab_path), templates_path and str(templates_path), chunk_seed(seed, j, name), count, diff_level, baseline, None, template, max_tokens, False)
+            order.append(((pos + 0.5) / len(chunks), r, name, spec))
+    order.sort(key=lambda item: item[:2])
+    names = [name for _, _, name, _ in order]
+    yield from zip(names, _run_specs([spec for _, _, _, spec in order], workers))
+
+
+def _run_specs(specs, workers):
+    """Generate chunk ``specs`` in order, on up to ``workers`` processes."""
+    workers = min(workers or os.cpu_count() or 1, len(specs))
+    if workers <= 1:
+        yield from map(_generate_chunk, specs)
+        return
+    if instrument.enabled():
+        task, result = _generate_chunk_instrumented, _merge_stats
+    else:
+        task, result = _generate_chunk, lambda future: future.result()
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for spec in specs:
+            if len(pending) >= workers * 2:
+                yield result(pending.popleft())
+            pending.append(pool.submit(task, spec))
+        while pending:
+            yield result(pending.popleft())
+
+
+def _merge_stats(future):
+    prompts, stats = future.result()
+    instrument.merge(stats)
+    return prompts
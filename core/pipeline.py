@@ -0,0 +1,213 @@
+"""Write-behind persistence for generated prompts.
+
+Generation pushes chunks of prompts into bounded queues; background
+writer threads drain them and group-commit each chunk with one file
+open. A full queue blocks the producer, so memory stays bounded.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from collections import deque
+from pathlib import Path
+
+from .output import HASH_LOG, save_prompt_hashes, save_prompts
+
+_CLOSE = object()
+
+
+class BackgroundWriter:
+    """Drain a bounded queue of prompt chunks on a daemon thread."""
+
+    def __init__(self, name: str, commit, max_pending: int = 8):
+        self.name = name
+        self._commit = commit
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name=f"writer-{name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _CLOSE:
+                    return
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif self._error is None:
+                    self._commit(item)
+            except BaseException as exc:  # surfaced to the producer
+                self._error = exc
+            finally:
+                self._queue.task_done()
+
+    def submit(self, chunk) -> None:
+        """Queue a chunk, blocking while the writer is ``max_pending`` behind."""
+        self._raise_pending()
+        self._queue.put(chunk)
+
+    def flush(self) -> None:
+        """Block until every chunk submitted so far has been committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        self._raise_pending()
+
+    def close(self) -> None:
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._raise_pending()
+
+    def _raise_pending(self):
+        if self._error is not None:
+            raise RuntimeError(f"{self.name} writer failed") from self._error
+
+
+class _StreamingOutput:
+    """Run ``save_prompts`` on a thread fed by an iterator over a queue.
+
+    With ``profiles=True`` each prompt is recorded with the profile its
+    chunk was submitted under.
+    """
+
+    def __init__(self, max_pending: int, **save_kwargs):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._error: BaseException | None = None
+        self._drained = False
+        self._labels: deque | None = None
+        if save_kwargs.get("profiles") is True:
+            self._labels = deque()
+            save_kwargs["profiles"] = self._profile_labels()
+        self.path: Path | None = None
+        self._thread = threading.Thread(
+            target=self._run, kwargs=save_kwargs, name="writer-output", daemon=True
+        )
+        self._thread.start()
+
+    def _prompts(self):
+        while (item := self._queue.get()) is not _CLOSE:
+            chunk, profile = item
+            if self._labels is not None:
+                self._labels.extend([profile] * len(chunk))
+            yield from chunk
+        self._drained = True
+
+    def _profile_labels(self):
+        # The writer reads a prompt's label after the prompt itself.
+        while True:
+            yield self._labels.popleft()
+
+    def _run(self, **save_kwargs):
+        try:
+            self.path = save_prompts(self._prompts(), **save_kwargs)
+        except BaseException as exc:
+            self._error = exc
+            # Keep draining so the producer never blocks on a dead writer.
+            while not self._drained and self._queue.get() is not _CLOSE:
+                pass
+
+    def submit(self, chunk, profile: str | None = None) -> None:
+        if self._error is not None:
+            raise RuntimeError("output writer failed") from self._error
+        self._queue.put((chunk, profile))
+
+    def close(self) -> None:
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError("output writer failed") from self._error
+
+
+class PersistencePipeline:
+    """Fan generated chunks out to the output file, hash log and vault.
+
+    Each sink runs on its own thread, so generation overlaps disk I/O.
+    ``submit`` applies backpressure once a sink is ``max_pending`` chunks
+    behind; ``flush`` and ``close`` are barriers that wait for every
+    submitted chunk to be committed.
+
+    Chunks may be submitted under a profile name. Their vault entries
+    then take the profile as category, and with ``outputs`` (profile name
+    to ``save_prompts`` options) each profile gets its own output file.
+    """
+
+    def __init__(
+        self,
+        output: dict | None = None,
+        hash_log: Path | None = HASH_LOG,
+        vault=None,
+        vault_category: str = "general",
+        vault_tags=None,
+        max_pending: int = 8,
+        outputs: dict[str, dict] | None = None,
+    ):
+        self.count = 0
+        self._output = None
+        if output is not None:
+            self._output = _StreamingOutput(max_pending, hash_log=None, **output)
+        self._outputs = {
+            profile: _StreamingOutput(max_pending, hash_log=None, **options)
+            for profile, options in (outputs or {}).items()
+        }
+        self._vault_category = vault_category
+        # Writers receive (chunk, vault category) pairs.
+        self._writers = []
+        if hash_log is not None:
+            self._writers.append(
+                BackgroundWriter("hash", lambda item: save_prompt_hashes(item[0], hash_log), max_pending)
+            )
+        if vault is not None:
+            tags = list(vault_tags or [])
+            self._writers.append(
+                BackgroundWriter(
+                    "vault",
+                    lambda item: vault.add_entries(item[0], category=item[1], tags=tags),
+                    max_pending,
+                )
+            )
+
+    @property
+    def path(self) -> Path | None:
+        """Path of the output file once the pipeline is closed."""
+        return self._output.path if self._output else None
+
+    @property
+    def paths(self) -> dict[str, Path | None]:
+        """Per-profile output paths once the pipeline is closed."""
+        return {profile: output.path for profile, output in self._outputs.items()}
+
+    def submit(self, chunk, profile: str | None = None) -> None:
+        """Hand a list of prompts, generated under ``profile`` if given, to every sink."""
+        chunk = list(chunk)
+        self.count += len(chunk)
+        if self._output:
+            self._output.submit(chunk, profile)
+        if profile in self._outputs:
+            self._outputs[profile].submit(chunk, profile)
+        item = (chunk, profile or self._vault_category)
+        for writer in self._writers:
+            writer.submit(item)
+
+    def flush(self) -> None:
+        """Wait until the hash log and vault have caught up."""
+        for writer in self._writers:
+            writer.flush()
+
+    def close(self) -> None:
+        """Finish the output file and stop all writer threads."""
+        errors = []
+        for sink in ([self._output] if self._output else []) + list(self._outputs.values()) + self._writers:
+            try:
+                sink.close()
+            except RuntimeError as exc:
+                errors.append(exc)
+        if errors:
+            raise errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
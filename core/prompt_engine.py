@@ -1,37 +1,83 @@
-import json
+import math
 import random
+from collections import Counter
 from pathlib import Path
 
+from . import instrument
 from .template_engine import TemplateRenderer, available_templates
 from .dictionary import describe
+from .sampler import CompiledVocab
+from .tokens import estimate_tokens
+from .vocab_store import VocabStore, default_store
 
 
 class PromptEngine:
     """Generate prompts from a vocabulary bank."""
 
-    def __init__(self, vocab_path: str, template_renderer: TemplateRenderer | None = None):
+    def __init__(
+        self,
+        vocab_path: str,
+        template_renderer: TemplateRenderer | None = None,
+        templates_path: str | None = None,
+        store: VocabStore | None = None,
+    ):
         self.vocab_path = Path(vocab_path)
+        self.store = store or default_store()
         self.vocab = self._load_vocab(self.vocab_path)
-        self.template_renderer = template_renderer or TemplateRenderer()
+        self.weights = getattr(self.vocab, "weights", {})
+        self.template_renderer = template_renderer or TemplateRenderer(categories=list(self.vocab))
+        if templates_path:
+            self.template_renderer.load(templates_path)
+        self._compiled: CompiledVocab | None = None
+        self._plans: dict[tuple[int, str | None], tuple[tuple[str, int], ...]] = {}
 
     def _load_vocab(self, path: Path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        """Map the compiled form of the vocabulary bank, compiling it if stale."""
+        with instrument.stage("load_vocab"):
+            return self.store.open(path)
+
+    @property
+    def compiled(self) -> CompiledVocab:
+        """Index tables for batch sampling, built on first use."""
+        if self._compiled is None:
+            self._compiled = CompiledVocab(self.vocab)
+        return self._compiled
 
     def categories(self):
         """Return available vocabulary categories."""
         return list(self.vocab.keys())
 
+    def templates(self) -> list[str]:
+        """Return the templates this engine can render, including user templates."""
+        return self.template_renderer.available()
+
     def category_definition(self, category: str) -> str | None:
         """Return human-readable definition for a category if available."""
         return describe(category)
 
+    def combination_space(self, diff_level: int = 5, category: str | None = None) -> int:
+        """Number of distinct contents ``generate_prompt`` can produce.
+
+        Terms are joined in sampled order, so each category contributes
+        its count of ordered k-samples.
+        """
+        return math.prod(
+            math.perm(len(self.compiled.terms[cat]), k) for cat, k in self.compiled.plan(diff_level, category)
+        )
+
+    def space(self, diff_level: int = 5, category: str | None = None, baseline: str = "", templates=None):
+        """Return the indexable :class:`~core.enumerator.PromptSpace` for these settings."""
+        from .enumerator import PromptSpace
+
+        return PromptSpace(self, diff_level, category, baseline, templates)
+
     def generate_prompt(
         self,
         diff_level: int = 5,
         baseline: str = "",
         category: str | None = None,
         template: str = "plain",
+        max_tokens: int | None = None,
     ):
         """Generate a single prompt.
 
@@ -39,19 +85,20 @@ class PromptEngine:
             diff_level: number of terms to sample per category.
             baseline: baseline text to prepend.
             category: restrict sampling to a specific category.
+            max_tokens: estimated token budget; see ``generate_batch``.
+
+        Terms come from the compiled vocabulary, so constraints are
+        enforced as in ``generate_batch``.
         """
-        parts = []
-        if category and category in self.vocab:
-            words = self.vocab[category]
-            sample = random.sample(words, min(diff_level, len(words)))
-            parts.extend(sample)
-        else:
-            # sample diff_level terms from each category
-            for cat, words in self.vocab.items():
-                sample = random.sample(words, min(diff_level, len(words)))
-                parts.extend(sample)
-        content = ", ".join(parts)
-        return self.template_renderer.render(content, baseline=baseline, template=template)
+        if max_tokens is not None:
+            return self.generate_batch(1, diff_level, baseline, category, template, rng=random, max_tokens=max_tokens)[0]
+        compiled = self.compiled
+        plan = self._plans.get((diff_level, category))
+        if plan is None:
+            plan = self._plans[diff_level, category] = tuple(compiled.plan(diff_level, category))
+        terms = {cat: ", ".join(sample) for (cat, _), sample in zip(plan, compiled.sample_row(plan)) if sample}
+        content = ", ".join(terms.values())
+        return self.template_renderer.render(content, baseline=baseline, template=template, terms=terms)
 
     def generate_batch(
         self,
@@ -60,8 +107,116 @@ class PromptEngine:
         baseline: str = "",
         category: str | None = None,
         template: str = "plain",
+        rng: random.Random | None = None,
+        max_tokens: int | None = None,
+    ):
+        """Generate ``n`` prompts in one vectorised pass.
+
+        Produces the same kind of prompts as repeated ``generate_prompt``
+        calls, but samples every category for the whole batch at once.
+        Pass ``rng`` for a reproducible stream independent of ``random``.
+
+        With ``max_tokens``, every prompt's estimated token count (see
+        :mod:`core.tokens`) stays within the budget: terms are only drawn
+        from those that still fit, and categories get fewer than
+        ``diff_level`` terms when even the cheapest terms would not fit.
+        """
+        compiled = self.compiled
+        if max_tokens is None:
+            plan = compiled.plan(diff_level, category)
+            with instrument.stage("sample", n):
+                columns = compiled.sample_columns(n, diff_level, category, rng)
+        else:
+            plan, budget, scale = self._budget(max_tokens, diff_level, baseline, category, template)
+            with instrument.stage("sample", n):
+                columns = compiled.sample_columns_within(n, plan, budget, scale, rng)
+        sampled = {cat: col for (cat, k), col in zip(plan, columns) if k}
+        return self.template_renderer.render_columns(sampled, n, baseline=baseline, template=template)
+
+    def generate_ranks(
+        self,
+        n: int = 100,
+        diff_level: int = 5,
+        baseline: str = "",
+        category: str | None = None,
+        template: str = "plain",
+        rng: random.Random | None = None,
+        max_tokens: int | None = None,
+    ) -> tuple[list[tuple[str, int]], list[list[int]]]:
+        """Draw what ``generate_batch`` would, as ``(plan, ranks)`` instead of strings.
+
+        ``ranks`` holds one column per planned category (see
+        :meth:`CompiledVocab.sample_ranks`); :meth:`render_ranks` turns
+        them into the prompts ``generate_batch`` returns for the same ``rng``.
+        """
+        compiled = self.compiled
+        if max_tokens is None:
+            plan, budget, scale = compiled.plan(diff_level, category), None, None
+        else:
+            plan, budget, scale = self._budget(max_tokens, diff_level, baseline, category, template)
+        with instrument.stage("sample", n):
+            ranks = compiled.sample_ranks(n, plan, rng, budget, scale)
+        return plan, ranks
+
+    def render_ranks(self, plan, ranks, baseline: str = "", template: str = "plain") -> list[str]:
+        """Render the prompts for columns of ranks from :meth:`generate_ranks`."""
+        n = len(ranks[0]) if ranks else 0
+        columns = self.compiled.columns_from_ranks(plan, ranks)
+        sampled = {cat: col for (cat, k), col in zip(plan, columns) if k}
+        return self.template_renderer.render_columns(sampled, n, baseline=baseline, template=template)
+
+    def token_budget(self, max_tokens: int, baseline: str = "", template: str = "plain") -> tuple[int, dict[str, int]]:
+        """Split ``max_tokens`` into the tokens left for terms and each category's repeat count.
+
+        The template and baseline cost what they render to without any
+        terms; a category's terms count once per ``{content}`` and once per
+        placeholder of that category in the template.
+        """
+        compiled = self.template_renderer.compile(template)
+        overhead = estimate_tokens(compiled.render("", baseline))
+        repeats = Counter(field for _, field in compiled.segments if field)
+        scale = {cat: repeats["content"] + repeats[cat] for cat in self.vocab}
+        return max_tokens - overhead, scale
+
+    def budget_plan(
+        self,
+        max_tokens: int,
+        diff_level: int = 5,
+        baseline: str = "",
+        category: str | None = None,
+        template: str = "plain",
+    ) -> list[tuple[str, int]]:
+        """Terms per category that prompts get under ``max_tokens``.
+
+        Raises ``ValueError`` when the budget leaves no room for any term.
+        """
+        return self._budget(max_tokens, diff_level, baseline, category, template)[0]
+
+    def _budget(self, max_tokens, diff_level, baseline, category, template):
+        budget, scale = self.token_budget(max_tokens, baseline, template)
+        try:
+            plan = self.compiled.budget_plan(diff_level, budget, category, scale)
+        except ValueError:
+            raise ValueError(
+                f"max_tokens={max_tokens} leaves no room for any term "
+                f"(the template and baseline take {max_tokens - budget})"
+            ) from None
+        return plan, budget, scale
+
+    def iter_batch(
+        self,
+        n: int = 100,
+        diff_level: int = 5,
+        baseline: str = "",
+        category: str | None = None,
+        template: str = "plain",
+        chunk_size: int = 10_000,
     ):
-        return [self.generate_prompt(diff_level, baseline, category, template) for _ in range(n)]
+        """Yield ``n`` prompts lazily, generating ``chunk_size`` at a time."""
+        for start in range(0, n, chunk_size):
+            yield from self.generate_batch(
+                min(chunk_size, n - start), diff_level, baseline, category, template
+            )
 
 
 def templates() -> list[str]:
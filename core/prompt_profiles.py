@@ -1,16 +1,177 @@
+"""Prompt profiles and a pool of warm engines.
+
+A :class:`ProfileRegistry` parses ``prompt_profiles.json`` once and hands
+out ready :class:`~core.prompt_engine.PromptEngine` instances per
+profile. Engines live in an :class:`EnginePool` keyed by vocabulary path
+and content hash, so profiles sharing a bank share one engine, and
+touching a bank without changing it keeps its engine.
+
+Long-running processes (the GUI, the generation server, job workers)
+see edits without restarting: at most every ``poll_interval`` seconds a
+lookup stats the profile file and the profile's vocabulary and template
+files, and reloads only the ones whose mtime or size changed. Between
+polls a lookup is a dictionary hit.
+"""
+
+from __future__ import annotations
+
 import json
+import threading
+import time
 from pathlib import Path
 
+from .prompt_engine import PromptEngine
+from .vocab_store import VocabStore, default_store
+
+DEFAULT_PROFILES = "prompt_profiles.json"
+# Seconds between mtime polls of the files behind a profile.
+POLL_INTERVAL = 1.0
+
+
+def _stat(path) -> tuple[int, int] | None:
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class EnginePool:
+    """Warm engines keyed by vocabulary path, content hash and templates file.
+
+    :meth:`get` costs one ``stat`` of the bank (through the
+    :class:`~core.vocab_store.VocabStore`) and one of the templates file.
+    When a bank's content changes, the engines built on its earlier
+    content are dropped.
+    """
+
+    def __init__(self, store: VocabStore | None = None):
+        self.store = store or default_store()
+        self._engines: dict[tuple, PromptEngine] = {}
+        self._lock = threading.Lock()
+
+    def get(self, vocab_path, templates_path=None) -> PromptEngine:
+        source = Path(vocab_path).resolve()
+        templates = templates_path and str(templates_path)
+        with self._lock:
+            vocab = self.store.open(source)
+            key = (source, vocab.sha256, templates, templates and _stat(templates))
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = PromptEngine(vocab_path, templates_path=templates, store=self.store)
+                for stale in [k for k in self._engines if k[0] == source and k[2] == templates]:
+                    del self._engines[stale]
+                self._engines[key] = engine
+            return engine
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._engines.clear()
+
+
+class ProfileRegistry:
+    """Profiles parsed once, with a warm engine per profile and hot reload."""
+
+    def __init__(self, profile_path=DEFAULT_PROFILES, pool: EnginePool | None = None, poll_interval: float = POLL_INTERVAL):
+        self.path = Path(profile_path)
+        self.pool = pool or default_pool()
+        self.poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._stat = None
+        self._profiles: dict[str, dict] = {}
+        self._engines: dict[tuple[str, str | None], PromptEngine] = {}
+        self._polled: dict[tuple[str, str | None], float] = {}
+        self._checked = float("-inf")
+        self._refresh_profiles(time.monotonic())
+
+    def _refresh_profiles(self, now: float) -> None:
+        """Re-read the profile file if it changed since the last poll."""
+        if now - self._checked < self.poll_interval:
+            return
+        self._checked = now
+        stat = _stat(self.path)
+        if stat is None:
+            raise FileNotFoundError(f"Profile config not found: {self.path}")
+        if stat == self._stat:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            profiles = json.load(f)
+        if not isinstance(profiles, dict):
+            raise ValueError(f"{self.path}: expected an object mapping profile names to settings")
+        self._profiles, self._stat = profiles, stat
+        # Settings may point at other files now; look every engine up again.
+        self._polled.clear()
+
+    def profiles(self) -> dict[str, dict]:
+        with self._lock:
+            self._refresh_profiles(time.monotonic())
+            return dict(self._profiles)
+
+    def names(self) -> list[str]:
+        return list(self.profiles())
+
+    def profile(self, name: str) -> dict:
+        with self._lock:
+            self._refresh_profiles(time.monotonic())
+            profile = self._profiles.get(name)
+        if not profile:
+            raise ValueError(f"Profile '{name}' not found in {self.path}")
+        return profile
+
+    def engine(self, name: str, templates_path: str | None = None) -> PromptEngine:
+        """The warm engine for profile ``name``, reloaded if its files changed.
+
+        ``templates_path`` overrides the profile's own templates file.
+        """
+        key = (name, templates_path)
+        with self._lock:
+            now = time.monotonic()
+            self._refresh_profiles(now)
+            engine = self._engines.get(key)
+            if engine is not None and now - self._polled.get(key, float("-inf")) < self.poll_interval:
+                return engine
+            profile = self.profile(name)
+            engine = self._engines[key] = self.pool.get(profile["vocab_bank"], templates_path or profile.get("templates"))
+            self._polled[key] = now
+            return engine
+
+    def reload(self) -> None:
+        """Check every file on the next lookup, whatever the poll interval."""
+        with self._lock:
+            self._checked = float("-inf")
+            self._polled.clear()
+
+
+_POOL: EnginePool | None = None
+_REGISTRIES: dict[Path, ProfileRegistry] = {}
+_DEFAULTS_LOCK = threading.Lock()
+
+
+def default_pool() -> EnginePool:
+    """The process-wide engine pool."""
+    global _POOL
+    with _DEFAULTS_LOCK:
+        if _POOL is None:
+            _POOL = EnginePool()
+        return _POOL
+
+
+def default_registry(profile_path=DEFAULT_PROFILES) -> ProfileRegistry:
+    """The process-wide registry for ``profile_path``."""
+    key = Path(profile_path).resolve()
+    registry = _REGISTRIES.get(key)
+    if registry is None:
+        registry = ProfileRegistry(profile_path, default_pool())
+        registry = _REGISTRIES.setdefault(key, registry)
+    return registry
+
 
-def load_profiles(profile_path: str = "prompt_profiles.json"):
-    path = Path(profile_path)
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def load_profiles(profile_path: str = DEFAULT_PROFILES):
+    return default_registry(profile_path).profiles()
 
 
-def load_profile(profile_name: str, profile_path: str = "prompt_profiles.json"):
-    profiles = load_profiles(profile_path)
-    profile = profiles.get(profile_name)
-    if not profile:
-        raise ValueError(f"Profile '{profile_name}' not found in {profile_path}")
-    return profile
+def load_profile(profile_name: str, profile_path: str = DEFAULT_PROFILES):
+    return default_registry(profile_path).profile(profile_name)
@@ -1,30 +1,140 @@
 import json
+import math
+import os
 import random
 import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+from . import instrument
+from .filelock import append_text
 from .prompt_engine import PromptEngine
 
 
+def _hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+def lexical_fitness(prompt: str) -> float:
+    """Score a prompt by vocabulary richness: distinct words, penalising repeats."""
+    words = prompt.lower().replace(",", " ").split()
+    if not words:
+        return 0.0
+    distinct = len(set(words))
+    return distinct / len(words) * math.log1p(distinct)
+
+
+# Remix operators take the prompt parts, an RNG, the vocabulary terms and a
+# second parent's parts, and return new parts. They must stay module-level
+# so worker processes can resolve them by name.
+
+def _op_evolve(parts, rng, terms, other):
+    parts = list(parts)
+    idx = rng.randrange(len(parts))
+    parts[idx] = "evolved " + parts[idx]
+    return parts
+
+
+def _op_swap(parts, rng, terms, other):
+    parts = list(parts)
+    if len(parts) > 1:
+        i, j = rng.sample(range(len(parts)), 2)
+        parts[i], parts[j] = parts[j], parts[i]
+    return parts
+
+
+def _op_substitute(parts, rng, terms, other):
+    parts = list(parts)
+    if terms:
+        parts[rng.randrange(len(parts))] = rng.choice(terms)
+    return parts
+
+
+def _op_drop(parts, rng, terms, other):
+    parts = list(parts)
+    if len(parts) > 2:
+        del parts[rng.randrange(len(parts))]
+    return parts
+
+
+def _op_shuffle(parts, rng, terms, other):
+    parts = list(parts)
+    rng.shuffle(parts)
+    return parts
+
+
+def _op_crossover(parts, rng, terms, other):
+    cut = rng.randint(1, max(1, min(len(parts), len(other)) - 1))
+    return list(parts[:cut]) + list(other[cut:])
+
+
+OPERATORS = {
+    "evolve": _op_evolve,
+    "swap": _op_swap,
+    "substitute": _op_substitute,
+    "drop": _op_drop,
+    "shuffle": _op_shuffle,
+    "crossover": _op_crossover,
+}
+
+_WORKER_TERMS: list[str] = []
+
+
+def _init_worker(terms):
+    global _WORKER_TERMS
+    _WORKER_TERMS = terms
+
+
+def _breed(tasks, fitness=lexical_fitness):
+    """Apply one operator per task and score the child.
+
+    Each task is ``(operator, parent, other_parent, seed)``; returns
+    ``(child, score)`` pairs in task order.
+    """
+    results = []
+    for op_name, parent, other, seed in tasks:
+        rng = random.Random(seed)
+        parts = OPERATORS[op_name](parent.split(", "), rng, _WORKER_TERMS, other.split(", "))
+        child = ", ".join(parts)
+        results.append((child, fitness(child)))
+    return results
+
+
+def _score(prompts, fitness=lexical_fitness):
+    return [fitness(p) for p in prompts]
+
+
 class RecursivePromptDaemon:
-    """Generate prompts and recursively remix them."""
+    """Generate prompts and recursively remix them.
 
-    def __init__(self, vocab_path: str = "data/vocab_text.json", history_path: str = "logs/prompt_history.json"):
-        self.engine = PromptEngine(vocab_path)
+    Lineage is appended to a JSON Lines history, one object per line, so
+    neither start-up nor a run reads or rewrites earlier generations.
+    """
+
+    def __init__(
+        self,
+        vocab_path: str = "data/vocab_text.json",
+        history_path: str = "logs/prompt_history.jsonl",
+        templates_path: str | None = None,
+    ):
+        self.engine = PromptEngine(vocab_path, templates_path=templates_path)
         self.history_path = Path(history_path)
-        self.history = self._load_history()
 
-    def _load_history(self):
-        if self.history_path.exists():
-            with open(self.history_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return []
+    def iter_history(self):
+        """Stream recorded history entries without loading the whole file."""
+        if not self.history_path.exists():
+            return
+        with open(self.history_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
 
-    def _save_history(self):
-        self.history_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.history_path, "w", encoding="utf-8") as f:
-            json.dump(self.history, f, indent=2)
+    def _append_history(self, entries):
+        with instrument.stage("history") as st:
+            lines = [json.dumps(e, ensure_ascii=False) + "\n" for e in entries]
+            written = append_text(self.history_path, "".join(lines))
+            st.add(items=len(lines), bytes=written, opens=1)
 
     def _review_and_remix(self, prompt: str):
         parts = prompt.split(", ")
@@ -35,16 +145,129 @@ class RecursivePromptDaemon:
 
     def run_recursive_loop(self, iterations: int = 5, diff: int = 5, template: str = "plain"):
         batch = []
-        for _ in range(iterations):
-            original = self.engine.generate_prompt(diff, template=template)
-            remixed = self._review_and_remix(original)
-            entry = {
-                "timestamp": datetime.now().isoformat(),
-                "original": original,
-                "remixed": remixed,
-                "hash": hashlib.sha256(remixed.encode()).hexdigest(),
-            }
-            self.history.append(entry)
-            batch.append(remixed)
-        self._save_history()
+        entries = []
+        with instrument.stage("remix", iterations):
+            for _ in range(iterations):
+                original = self.engine.generate_prompt(diff, template=template)
+                remixed = self._review_and_remix(original)
+                entries.append({
+                    "timestamp": datetime.now().isoformat(),
+                    "original": original,
+                    "remixed": remixed,
+                    "parent": _hash(original),
+                    "hash": _hash(remixed),
+                })
+                batch.append(remixed)
+        self._append_history(entries)
         return batch
+
+    def evolve(
+        self,
+        population: int = 32,
+        generations: int = 5,
+        diff: int = 5,
+        template: str = "plain",
+        operators=None,
+        tournament: int = 3,
+        workers: int | None = None,
+        seed: int | None = None,
+    ):
+        """Evolve a population of prompts over several generations.
+
+        Each generation picks parents by tournament selection, breeds one
+        child per slot with a random operator from ``operators`` (default:
+        all of :data:`OPERATORS`) and keeps the fittest ``population``
+        prompts among parents and children. A child that has an empty or
+        repeated term, or breaks the vocabulary bank's constraints, is
+        replaced by a freshly sampled prompt, so the population only
+        holds prompts the engine could have generated itself. Breeding and
+        scoring run on a process pool of ``workers`` processes (all cores
+        by default; 1 runs inline). Every child's lineage is appended to
+        the history file as soon as its generation finishes, so memory
+        does not grow with the number of generations.
+
+        Returns the final population, fittest first.
+        """
+        rng = random.Random(seed)
+        op_names = list(operators or OPERATORS)
+        unknown = set(op_names) - set(OPERATORS)
+        if unknown:
+            raise ValueError(f"Unknown remix operators: {', '.join(sorted(unknown))}")
+        workers = workers or os.cpu_count() or 1
+        terms = [t for words in self.engine.vocab.values() for t in words]
+        positions = {}  # term -> (category, index) of each place it occurs
+        for cat, words in self.engine.compiled.terms.items():
+            for i, term in enumerate(words):
+                positions.setdefault(term, []).append((cat, i))
+
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(terms,))
+        else:
+            _init_worker(terms)
+        try:
+            prompts = self.engine.generate_batch(population, diff, template=template, rng=rng)
+            scores = self._map(pool, _score, prompts, workers)
+            current = list(zip(prompts, scores))
+            for gen in range(1, generations + 1):
+                tasks, parents = [], []
+                for _ in range(population):
+                    parent = self._select(current, tournament, rng)
+                    other = self._select(current, tournament, rng)
+                    tasks.append((rng.choice(op_names), parent[0], other[0], rng.getrandbits(64)))
+                    parents.append((parent[0], other[0]))
+                with instrument.stage("breed", len(tasks)):
+                    children = self._map(pool, _breed, tasks, workers)
+                invalid = [i for i, (child, _) in enumerate(children) if not self._valid(child, positions)]
+                if invalid:
+                    fresh = self.engine.generate_batch(len(invalid), diff, template=template, rng=rng)
+                    for i, child, score in zip(invalid, fresh, self._map(pool, _score, fresh, workers)):
+                        tasks[i] = ("sample", *tasks[i][1:])
+                        children[i] = (child, score)
+                stamp = datetime.now().isoformat()
+                self._append_history(
+                    {
+                        "timestamp": stamp,
+                        "generation": gen,
+                        "operator": task[0],
+                        "parent": _hash(parent) if task[0] != "sample" else None,
+                        "co_parent": _hash(other) if task[0] == "crossover" else None,
+                        "hash": _hash(child),
+                        "remixed": child,
+                        "fitness": score,
+                    }
+                    for task, (parent, other), (child, score) in zip(tasks, parents, children)
+                )
+                merged = {p: s for p, s in current + children}
+                current = sorted(merged.items(), key=lambda item: item[1], reverse=True)[:population]
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return [p for p, _ in current]
+
+    def _valid(self, prompt: str, positions) -> bool:
+        """Whether ``prompt``'s terms are non-empty, distinct and obey the bank's constraints."""
+        parts = prompt.split(", ")
+        if len(set(parts)) < len(parts) or not all(part.strip() for part in parts):
+            return False
+        rules = self.engine.compiled.constraints
+        if rules is None:
+            return True
+        picks = {cat: [] for cat in self.engine.compiled.terms}  # evolved prompts draw on every category
+        for part in parts:
+            for cat, i in positions.get(part, ()):
+                picks[cat].append(i)
+        return rules.allows(picks)
+
+    @staticmethod
+    def _select(scored, size, rng):
+        return max(rng.sample(scored, min(size, len(scored))), key=lambda item: item[1])
+
+    @staticmethod
+    def _map(pool, func, items, workers):
+        """Run ``func`` over contiguous chunks of ``items`` and flatten in order."""
+        if pool is None:
+            return func(items)
+        size = max(1, -(-len(items) // (workers * 4)))
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        return [r for chunk in pool.map(func, chunks) for r in chunk]
@@ -0,0 +1,783 @@
+"""Compiled, batched sampling over vocabulary banks."""
+
+from __future__ import annotations
+
+import bisect
+import itertools
+import math
+import random
+from typing import Mapping, Sequence
+
+from .constraints import ConstraintSet
+from .tokens import SEPARATOR_TOKENS, estimate_tokens
+
+try:  # NumPy is optional; the stdlib path produces the same kind of output.
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+
+# Below this many prompts the NumPy setup cost outweighs the vectorised draw.
+NUMPY_MIN_BATCH = 256
+# Categories with at most this many ordered k-samples are expanded into a
+# table of pre-joined segments, so a draw is a single random index.
+MAX_SEGMENT_TABLE = 4096
+# Memory-mapped categories up to this many terms are decoded once into a
+# tuple; larger ones are sampled straight from the mapping.
+MAX_MATERIALIZED_TERMS = 1 << 16
+# Upper bound on random keys materialised at once when drawing permutations.
+_MAX_KEYS_PER_CHUNK = 1 << 22
+# Alias draws that may hit already-picked terms before a weighted sample
+# falls back to an exact draw over the remaining terms.
+_MAX_REJECTIONS = 32
+# Terms left unpicked in a category below which a constrained draw goes
+# straight to the exact draw over the compatible ones.
+_EXACT_BELOW = 8
+# Fresh starts for one prompt whose forced ``together`` terms could not be
+# placed, before the constraints are reported as unsatisfiable.
+_MAX_ATTEMPTS = 100
+# Plain draws of a single prompt checked against the constraints before
+# sample_row falls back to drawing term by term among compatible ones.
+_MAX_ROW_REJECTIONS = 8
+
+
+class CompiledVocab:
+    """Vocabulary categories compiled into index-addressable term tables.
+
+    The compiled form is built once per engine and reused for every batch,
+    so per-prompt work is reduced to drawing indices and joining strings.
+
+    Categories listed in ``weights`` (by default ``vocab.weights``, as on a
+    :class:`~core.vocab_store.MappedVocab`) are sampled without replacement
+    in proportion to their term weights: each draw picks one of the
+    remaining terms with probability proportional to its weight.
+
+    ``constraints`` (by default ``vocab.constraints``) are compiled into a
+    :class:`~core.constraints.ConstraintSet`. Categories they touch are
+    drawn prompt by prompt, each term among those compatible with the
+    draws so far, so every prompt obeys the rules and nothing is
+    discarded; a category gets fewer terms when too few compatible ones
+    are left. Untouched categories keep the batched samplers.
+    """
+
+    def __init__(
+        self,
+        vocab: Mapping[str, Sequence[str]],
+        weights: Mapping[str, Sequence[float]] | None = None,
+        constraints: Mapping | None = None,
+    ):
+        self.categories = list(vocab.keys())
+        self.terms = {
+            cat: tuple(words) if len(words) <= MAX_MATERIALIZED_TERMS or isinstance(words, list) else words
+            for cat, words in vocab.items()
+        }
+        weights = getattr(vocab, "weights", None) if weights is None else weights
+        self.weights = {cat: list(w) for cat, w in (weights or {}).items() if cat in self.terms}
+        for cat in self.weights:
+            # The alias table is in memory anyway; decode the terms alongside it.
+            self.terms[cat] = tuple(self.terms[cat])
+        self._tokens = getattr(vocab, "tokens", {})
+        rules = getattr(vocab, "constraints", None) if constraints is None else constraints
+        self.constraints = ConstraintSet(rules, self.terms) if rules else None
+        self._tables = {}
+        self._aliases = {}
+        self._budget_tables = {}
+        self._arrays = {}
+        self._rows = {}
+
+    def plan(self, diff_level: int, category: str | None = None) -> list[tuple[str, int]]:
+        """Return ``(category, k)`` pairs matching ``generate_prompt`` semantics."""
+        if category and category in self.terms:
+            cats = [category]
+        else:
+            cats = self.categories
+        return [(cat, min(diff_level, len(self.terms[cat]))) for cat in cats]
+
+    def segment_table(self, cat: str, k: int) -> list[str] | None:
+        """Every ordered k-sample of ``cat`` pre-joined, or ``None`` if too many."""
+        return self._segments(cat, k)[0]
+
+    def _segments(self, cat: str, k: int):
+        """``(table, cum_weights)`` for ``cat``; the weights are ``None`` when uniform."""
+        key = (cat, k)
+        if key not in self._tables:
+            words = self.terms[cat]
+            if math.perm(len(words), k) > MAX_SEGMENT_TABLE:
+                self._tables[key] = None, None
+            elif cat not in self.weights:
+                self._tables[key] = [", ".join(p) for p in itertools.permutations(words, k)], None
+            else:
+                weights = self.weights[cat]
+                total = sum(weights)
+                table, cum, acc = [], [], 0.0
+                for perm in itertools.permutations(range(len(words)), k):
+                    p, left = 1.0, total
+                    for i in perm:
+                        p *= weights[i] / left
+                        left -= weights[i]
+                    acc += p
+                    table.append(", ".join(words[i] for i in perm))
+                    cum.append(acc)
+                self._tables[key] = table, cum
+        return self._tables[key]
+
+    def alias_table(self, cat: str) -> tuple[list[float], list[int]]:
+        """Walker/Vose alias table for a weighted category, built on first use.
+
+        A draw takes one uniform ``r`` in ``[0, n)``: slot ``i = int(r)``
+        is kept when ``r - i < prob[i]`` and replaced by ``alias[i]``
+        otherwise, so each draw is O(1) whatever the category size.
+        """
+        table = self._aliases.get(cat)
+        if table is None:
+            weights = self.weights[cat]
+            n = len(weights)
+            scale = n / sum(weights)
+            prob = [w * scale for w in weights]
+            alias = list(range(n))
+            small = [i for i, p in enumerate(prob) if p < 1.0]
+            large = [i for i, p in enumerate(prob) if p >= 1.0]
+            while small and large:
+                s, l = small.pop(), large[-1]
+                alias[s] = l
+                prob[l] -= 1.0 - prob[s]
+                if prob[l] < 1.0:
+                    small.append(large.pop())
+            for i in small + large:  # leftovers are 1 up to rounding
+                prob[i] = 1.0
+            table = self._aliases[cat] = prob, alias
+        return table
+
+    def sample_terms(self, cat: str, k: int, rng: random.Random | None = None) -> list[str]:
+        """One ordered sample of ``k`` distinct terms of ``cat``, as ``random.sample`` would draw."""
+        rng = rng or random
+        words = self.terms[cat]
+        if cat not in self.weights:
+            return rng.sample(words, k)
+        return [words[i] for i in self._weighted_indices(rng, cat, k)]
+
+    def _weighted_indices(self, rng, cat, k, picked=None) -> list[int]:
+        """Draw term indices until ``picked`` holds ``k`` distinct ones.
+
+        Alias draws that repeat a picked term are rejected, which is exact
+        for sampling without replacement.
+        """
+        prob, alias = self.alias_table(cat)
+        n = len(prob)
+        rand = rng.random
+        picked = picked or []
+        rejections = 0
+        while len(picked) < k:
+            r = rand() * n
+            i = int(r)
+            if r - i >= prob[i]:
+                i = alias[i]
+            if i not in picked:
+                picked.append(i)
+            else:
+                rejections += 1
+                if rejections > _MAX_REJECTIONS:
+                    # The picked terms hold most of the weight: draw the rest exactly.
+                    weights = list(self.weights[cat])
+                    for j in picked:
+                        weights[j] = 0.0
+                    while len(picked) < k:
+                        j = rng.choices(range(n), weights)[0]
+                        weights[j] = 0.0
+                        picked.append(j)
+        return picked
+
+    def token_counts(self, cat: str) -> Sequence[int]:
+        """Estimated tokens of each term of ``cat``, cached with the vocabulary when compiled."""
+        counts = self._tokens.get(cat)
+        if counts is None:
+            counts = self._tokens[cat] = [estimate_tokens(t) for t in self.terms[cat]]
+        return counts
+
+    def _budget_table(self, cat: str, scale: int):
+        """``(order, costs, prefix, cum_weights)`` with the terms of ``cat`` sorted by cost.
+
+        A term costs ``scale`` times its tokens plus a separator, ``scale``
+        being how often the template repeats the category.
+        """
+        key = (cat, scale)
+        table = self._budget_tables.get(key)
+        if table is None:
+            counts = self.token_counts(cat)
+            order = sorted(range(len(counts)), key=counts.__getitem__)
+            costs = [scale * (counts[i] + SEPARATOR_TOKENS) for i in order]
+            prefix = list(itertools.accumulate(costs, initial=0))
+            cum_weights = None
+            if cat in self.weights:
+                weights = self.weights[cat]
+                cum_weights = list(itertools.accumulate(weights[i] for i in order))
+            table = self._budget_tables[key] = order, costs, prefix, cum_weights
+        return table
+
+    def budget_plan(
+        self,
+        diff_level: int,
+        budget: int,
+        category: str | None = None,
+        scale: Mapping[str, int] | None = None,
+    ) -> list[tuple[str, int]]:
+        """:meth:`plan`, with terms dropped until an average choice fits in ``budget`` tokens.
+
+        Planning for the average rather than the cheapest terms leaves the
+        sampler room to vary prompts. Terms are taken from whichever
+        category has the most, costliest first. Raises ``ValueError`` if
+        not even one term fits.
+        """
+        scale = scale or {}
+        plan = self.plan(diff_level, category)
+        prefixes = [self._budget_table(cat, scale.get(cat, 1))[2] for cat, _ in plan]
+        means = [p[-1] / (len(p) - 1) if len(p) > 1 else 0 for p in prefixes]
+
+        def trim(cost):
+            ks = [k for _, k in plan]
+            while any(ks) and sum(map(cost, prefixes, means, ks)) > budget:
+                # Among the categories with the most terms, drop the costliest term.
+                i = max(
+                    (i for i, k in enumerate(ks) if k),
+                    key=lambda i: (ks[i], cost(prefixes[i], means[i], ks[i]) - cost(prefixes[i], means[i], ks[i] - 1), i),
+                )
+                ks[i] -= 1
+            return ks
+
+        # Fall back to the cheapest terms when not even one average term fits.
+        ks = trim(lambda p, mean, k: max(p[k], k * mean))
+        if not any(ks):
+            ks = trim(lambda p, mean, k: p[k])
+        if not any(ks):
+            raise ValueError(f"A budget of {budget} tokens leaves no room for any term")
+        return [(cat, k) for (cat, _), k in zip(plan, ks)]
+
+    def sample_columns_within(
+        self,
+        n: int,
+        plan: Sequence[tuple[str, int]],
+        budget: int,
+        scale: Mapping[str, int] | None = None,
+        rng: random.Random | None = None,
+    ) -> list[list[str]]:
+        """Like :meth:`sample_columns` for a :meth:`budget_plan`, keeping every prompt within ``budget``.
+
+        Each term is drawn, uniformly or by weight, among the terms that
+        still leave room for the cheapest choice of every remaining slot,
+        so prompts fit by construction and nothing is redrawn.
+        """
+        rng = rng or random
+        rows = self._rows_within(n, plan, budget, scale, rng)
+        if rows is None:
+            return self._sample_plan(n, plan, rng)
+        join = ", ".join
+        columns = []
+        for (cat, k), column in zip(plan, rows):
+            words = self.terms[cat]
+            columns.append([join([words[i] for i in row]) for row in column] if k else [""] * n)
+        return columns
+
+    def _rows_within(self, n, plan, budget, scale, rng) -> list[list[list[int]]] | None:
+        """Term indices drawn by :meth:`sample_columns_within`, or ``None`` if the budget cannot bind."""
+        rand = rng.random
+        bisect_right = bisect.bisect_right
+        scale = scale or {}
+        tables = [self._budget_table(cat, scale.get(cat, 1)) for cat, _ in plan]
+        if sum(prefix[-1] - prefix[-1 - k] for (_, _, prefix, _), (_, k) in zip(tables, plan)) <= budget:
+            # Even the costliest terms fit.
+            return None
+        if self._touched(plan):
+            return self._constrained_rows(n, plan, rng, budget, tables, scale)
+        cheapest = [prefix[k] for (_, _, prefix, _), (_, k) in zip(tables, plan)]
+        # tail[i]: the least the categories after i can cost.
+        tail = [sum(cheapest[i + 1:]) for i in range(len(plan))]
+        rows = [[] for _ in plan]
+        for _ in range(n):
+            remaining = budget
+            for (cat, k), (order, costs, prefix, cum), reserve, column in zip(plan, tables, tail, rows):
+                if not k:
+                    continue
+                picked = []
+                for j in range(k):
+                    m = bisect_right(costs, remaining - reserve - (prefix[k] - prefix[j + 1]))
+                    pos = int(rand() * m) if cum is None else bisect_right(cum, rand() * cum[m - 1], 0, m - 1)
+                    if pos in picked:
+                        pos = self._draw_unpicked(rng, cum, m, picked)
+                    picked.append(pos)
+                    remaining -= costs[pos]
+                column.append([order[pos] for pos in picked])
+        return rows
+
+    @staticmethod
+    def _draw_unpicked(rng, cum, m, picked) -> int:
+        """Draw among the first ``m`` budget-table slots that are not yet picked."""
+        for _ in range(_MAX_REJECTIONS):
+            pos = int(rng.random() * m) if cum is None else bisect.bisect_right(cum, rng.random() * cum[m - 1], 0, m - 1)
+            if pos not in picked:
+                return pos
+        free = [pos for pos in range(m) if pos not in picked]
+        if cum is None:
+            return rng.choice(free)
+        return rng.choices(free, [cum[pos] - (cum[pos - 1] if pos else 0.0) for pos in free])[0]
+
+    def sample_columns(
+        self,
+        n: int,
+        diff_level: int,
+        category: str | None = None,
+        rng: random.Random | None = None,
+    ) -> list[list[str]]:
+        """Draw ``n`` prompts worth of terms, one column per planned category.
+
+        Each column entry is the ``", "``-joined sample for that category, so
+        ``", ".join`` over a row of non-empty entries yields the prompt content
+        that ``generate_prompt`` would build.
+        """
+        return self._sample_plan(n, self.plan(diff_level, category), rng or random)
+
+    def _sample_plan(self, n, plan, rng) -> list[list[str]]:
+        rows = self._constrained_rows(n, plan, rng) if self._touched(plan) else [None] * len(plan)
+        if np is not None and n >= NUMPY_MIN_BATCH:
+            gen = np.random.default_rng(rng.getrandbits(64))
+            column = lambda cat, k: self._column_numpy(gen, n, cat, k)
+        else:
+            column = lambda cat, k: self._column_python(rng, n, cat, k)
+        join = ", ".join
+        columns = []
+        for (cat, k), cat_rows in zip(plan, rows):
+            if cat_rows is None:
+                columns.append(column(cat, k))
+            else:
+                words = self.terms[cat]
+                columns.append([join([words[i] for i in row]) for row in cat_rows])
+        return columns
+
+    def _touched(self, plan) -> bool:
+        """Whether the constraints touch any category ``plan`` draws from."""
+        return self.constraints is not None and any(k and cat in self.constraints.local for cat, k in plan)
+
+    def _constrained_rows(self, n, plan, rng, budget=None, tables=None, scale=None) -> list[list[list[int]] | None]:
+        """Term index rows of the ``plan`` categories the constraints touch, ``None`` for the others.
+
+        Under a ``budget`` (with the categories' budget ``tables``) every
+        category is drawn here, since all of them share the budget.
+        """
+        steps = self._steps(plan, every=tables is not None)
+        tail = None
+        if tables is not None:
+            # tail[s]: the least the categories drawn after step s can cost.
+            cheapest = [tables[j][2][plan[j][1]] for j in steps]
+            tail = [sum(cheapest[s + 1:]) for s in range(len(steps))]
+        rows = [[] if j in steps else None for j in range(len(plan))]
+        for _ in range(n):
+            for j, row in zip(steps, self._draw_prompt(rng, plan, steps, budget, tables, tail, scale)):
+                rows[j].append(row)
+        return [row if row is not None else (None if k else [[]] * n) for row, (_, k) in zip(rows, plan)]
+
+    def sample_row(self, plan: Sequence[tuple[str, int]], rng: random.Random | None = None) -> list[list[str]]:
+        """One prompt's terms for each ``plan`` category, in drawn order.
+
+        The single-prompt form of :meth:`sample_columns`, without building
+        batch columns. Constrained categories are first drawn plainly and
+        the draw checked against the rules, which is cheaper than drawing
+        term by term when most draws pass; after
+        ``_MAX_ROW_REJECTIONS`` failures in a row they take the same
+        per-prompt draw as a batch's rows, and keep taking it for that
+        plan. Either way the prompt obeys every rule.
+        """
+        rng = rng or random
+        key = tuple(plan)
+        state = self._rows.get(key)
+        if state is None:
+            state = self._rows[key] = [self._steps(plan) if self._touched(plan) else [], True]
+        steps, rejecting = state
+        if not steps:
+            return [self.sample_terms(cat, k, rng) for cat, k in plan]
+        cats = [plan[j][0] for j in steps]
+        if rejecting:
+            allows = self.constraints.allows
+            for _ in range(_MAX_ROW_REJECTIONS):
+                drawn = [self._sample_indices(rng, *plan[j]) for j in steps]
+                if allows(dict(zip(cats, drawn))):
+                    break
+            else:
+                state[1] = False
+        if not state[1]:
+            drawn = self._draw_prompt(rng, plan, steps, None, None, None, None)
+        row = [None] * len(plan)
+        for j, cat, indices in zip(steps, cats, drawn):
+            words = self.terms[cat]
+            row[j] = [words[i] for i in indices]
+        return [terms if terms is not None else self.sample_terms(cat, k, rng) for terms, (cat, k) in zip(row, plan)]
+
+    def _sample_indices(self, rng, cat: str, k: int) -> list[int]:
+        if cat in self.weights:
+            return self._weighted_indices(rng, cat, k)
+        return rng.sample(range(len(self.terms[cat])), k)
+
+    def _steps(self, plan, every: bool = False) -> list[int]:
+        """Positions in ``plan`` drawn prompt by prompt (``every`` one under a budget), in rule order."""
+        rules = self.constraints
+        steps = [j for j, (cat, k) in enumerate(plan) if k and (every or cat in rules.local)]
+        rank = {cat: r for r, cat in enumerate(rules.order)}
+        steps.sort(key=lambda j: rank[plan[j][0]])
+        return steps
+
+    def _draw_prompt(self, rng, plan, steps, budget, tables, tail, scale) -> list[list[int]]:
+        """:meth:`_draw_constrained`, started over until the forced terms fit."""
+        for _ in range(_MAX_ATTEMPTS):
+            picks = self._draw_constrained(rng, plan, steps, budget, tables, tail, scale)
+            if picks is not None:
+                return picks
+        raise ValueError(
+            f"{self.constraints.source}: 'together' groups cannot be placed in these prompts; "
+            "check them against the exclusions, requirements and number of terms"
+        )
+
+    def _draw_constrained(self, rng, plan, steps, budget, tables, tail, scale):
+        """One prompt's term indices per step, or ``None`` if a forced term does not fit."""
+        rand = rng.random
+        bisect_right = bisect.bisect_right
+        sel = self.constraints.selection(plan[j][0] for j in steps)
+        remaining = budget
+        picks = []
+        for s, j in enumerate(steps):
+            cat, k = plan[j]
+            words = self.terms[cat]
+            size = len(words)
+            weights = self.weights.get(cat)
+            if tables is not None:
+                order, costs, prefix, cum = tables[j]
+                reserve = tail[s]
+                tokens = self.token_counts(cat)
+                repeat = (scale or {}).get(cat, 1)
+            elif weights is not None:
+                prob, alias = self.alias_table(cat)
+            row = []
+            forced = sel.forced(cat)
+            while True:
+                for i in forced:
+                    if i in row:
+                        continue
+                    if len(row) >= k or not sel.place(cat, i):
+                        return None
+                    if tables is not None:
+                        cost = repeat * (tokens[i] + SEPARATOR_TOKENS)
+                        if cost > remaining - reserve - (prefix[k] - prefix[len(row) + 1]):
+                            return None
+                        remaining -= cost
+                    row.append(i)
+                if len(row) >= k:
+                    break
+                if tables is not None:
+                    m = bisect_right(costs, remaining - reserve - (prefix[k] - prefix[len(row) + 1]))
+                # With few terms left unpicked, random draws mostly repeat a picked one.
+                for _ in range(_MAX_REJECTIONS if size - len(row) > _EXACT_BELOW else 0):
+                    if tables is not None:
+                        pos = int(rand() * m) if cum is None else bisect_right(cum, rand() * cum[m - 1], 0, m - 1)
+                        i = order[pos] if m else -1
+                    elif weights is None:
+                        i = int(rand() * size)
+                    else:
+                        r = rand() * size
+                        i = int(r)
+                        if r - i >= prob[i]:
+                            i = alias[i]
+                    if i >= 0 and i not in row and sel.allowed(cat, i):
+                        break
+                else:
+                    # Most candidates are ruled out: draw exactly among the rest.
+                    pool = order[:m] if tables is not None else range(size)
+                    free = [i for i in pool if i not in row and sel.allowed(cat, i)]
+                    if not free:
+                        break
+                    i = rng.choice(free) if weights is None else rng.choices(free, [weights[f] for f in free])[0]
+                if tables is not None:
+                    remaining -= repeat * (tokens[i] + SEPARATOR_TOKENS)
+                row.append(i)
+                sel.add(cat, i)
+                forced = sel.forced(cat)
+            sel.finish(cat)
+            picks.append(row)
+        return None if sel.pending else picks
+
+    def sample_contents(
+        self,
+        n: int,
+        diff_level: int,
+        category: str | None = None,
+        rng: random.Random | None = None,
+    ) -> list[str]:
+        """Draw ``n`` prompt contents (the joined terms before templating)."""
+        columns = self.sample_columns(n, diff_level, category, rng)
+        columns = [col for col, (_, k) in zip(columns, self.plan(diff_level, category)) if k]
+        if not columns:
+            return [""] * n
+        if len(columns) == 1:
+            return columns[0]
+        join = ", ".join
+        return [join(row) for row in zip(*columns)]
+
+    def _column_python(self, rng, n, cat, k) -> list[str]:
+        if k == 0:
+            return [""] * n
+        table, cum_weights = self._segments(cat, k)
+        if table is not None:
+            return rng.choices(table, cum_weights=cum_weights, k=n)
+        if cat in self.weights:
+            return self._weighted_column(rng, n, cat, k)
+        words = self.terms[cat]
+        sample = rng.sample
+        join = ", ".join
+        return [join(sample(words, k)) for _ in range(n)]
+
+    def _weighted_column(self, rng, n, cat, k) -> list[str]:
+        words = self.terms[cat]
+        rows = self._weighted_rows(rng, n, cat, k)
+        if k == 1:
+            return [words[i] for i in rows]
+        join = ", ".join
+        return [join([words[i] for i in row]) for row in rows]
+
+    def _weighted_rows(self, rng, n, cat, k) -> list:
+        """Term indices of ``n`` weighted samples: one int per sample when ``k`` is 1, else lists."""
+        prob, alias = self.alias_table(cat)
+        size = len(prob)
+        rand = rng.random
+        if k == 1:
+            rows = []
+            for _ in range(n):
+                r = rand() * size
+                i = int(r)
+                rows.append(i if r - i < prob[i] else alias[i])
+            return rows
+        # Draw k at once and only top up the rare rows that repeated a term.
+        draws = range(k)
+        rows = []
+        for _ in range(n):
+            row = []
+            for _ in draws:
+                r = rand() * size
+                i = int(r)
+                row.append(i if r - i < prob[i] else alias[i])
+            if len(set(row)) < k:
+                row = self._weighted_indices(rng, cat, k, list(dict.fromkeys(row)))
+            rows.append(row)
+        return rows
+
+    def _column_numpy(self, gen, n, cat, k) -> list[str]:
+        if k == 0:
+            return [""] * n
+        table, cum_weights = self._segments(cat, k)
+        if table is not None:
+            arr = self._array(("table", cat, k), table)
+            if cum_weights is None:
+                return arr[gen.integers(0, len(arr), size=n)].tolist()
+            cum = self._array(("cum", cat, k), cum_weights, float)
+            return arr[np.minimum(np.searchsorted(cum, gen.random(n) * cum[-1], side="right"), len(arr) - 1)].tolist()
+        if cat in self.weights:
+            # Rejection of repeated terms does not vectorise; use the alias sampler.
+            return self._weighted_column(random.Random(int(gen.integers(1 << 63))), n, cat, k)
+        arr = self._array(("terms", cat), self.terms[cat])
+        join = ", ".join
+        return [join(row) for row in arr[sample_index_rows(gen, n, len(arr), k)].tolist()]
+
+    def sample_ranks(
+        self,
+        n: int,
+        plan: Sequence[tuple[str, int]],
+        rng: random.Random | None = None,
+        budget: int | None = None,
+        scale: Mapping[str, int] | None = None,
+    ) -> list[list[int]]:
+        """Draw like :meth:`sample_columns` (or :meth:`sample_columns_within` with ``budget``), as indices.
+
+        Each column entry is the :func:`rank_sample` of the category's
+        ordered sample among its ``math.perm(len(terms), k)`` possible
+        ones. The random stream is consumed exactly as the string samplers
+        consume it, so the same seed yields the same prompts either way;
+        :meth:`columns_from_ranks` turns ranks back into term columns.
+        """
+        rng = rng or random
+        rows = None if budget is None else self._rows_within(n, plan, budget, scale, rng)
+        if rows is None:
+            rows = self._constrained_rows(n, plan, rng) if self._touched(plan) else [None] * len(plan)
+            if np is not None and n >= NUMPY_MIN_BATCH:
+                gen = np.random.default_rng(rng.getrandbits(64))
+                draw = lambda cat, k: self._ranks_numpy(gen, n, cat, k)
+            else:
+                draw = lambda cat, k: self._ranks_python(rng, n, cat, k)
+        return [
+            draw(cat, k) if column is None
+            else [rank_partial(row, len(self.terms[cat]), k) for row in column] if k else [0] * n
+            for (cat, k), column in zip(plan, rows)
+        ]
+
+    def _ranks_python(self, rng, n, cat, k) -> list[int]:
+        if k == 0:
+            return [0] * n
+        size = len(self.terms[cat])
+        table, cum_weights = self._segments(cat, k)
+        if table is not None:
+            # Segment tables list the k-samples in rank order.
+            return rng.choices(range(len(table)), cum_weights=cum_weights, k=n)
+        if cat in self.weights:
+            rows = self._weighted_rows(rng, n, cat, k)
+            return rows if k == 1 else [rank_sample(row, size) for row in rows]
+        sample = rng.sample
+        population = range(size)
+        if k == 1:
+            return [sample(population, 1)[0] for _ in range(n)]
+        return [rank_sample(sample(population, k), size) for _ in range(n)]
+
+    def _ranks_numpy(self, gen, n, cat, k) -> list[int]:
+        if k == 0:
+            return [0] * n
+        size = len(self.terms[cat])
+        table, cum_weights = self._segments(cat, k)
+        if table is not None:
+            if cum_weights is None:
+                return gen.integers(0, len(table), size=n).tolist()
+            cum = self._array(("cum", cat, k), cum_weights, float)
+            return np.minimum(np.searchsorted(cum, gen.random(n) * cum[-1], side="right"), len(table) - 1).tolist()
+        if cat in self.weights:
+            return self._ranks_python(random.Random(int(gen.integers(1 << 63))), n, cat, k)
+        rows = sample_index_rows(gen, n, size, k).tolist()
+        return [rank_sample(row, size) for row in rows]
+
+    def columns_from_ranks(self, plan: Sequence[tuple[str, int]], ranks: Sequence[Sequence[int]]) -> list[list[str]]:
+        """Term columns, as :meth:`sample_columns` returns them, for columns of :meth:`sample_ranks`."""
+        join = ", ".join
+        columns = []
+        for (cat, k), column in zip(plan, ranks):
+            words = self.terms[cat]
+            if k == 0:
+                columns.append([""] * len(column))
+                continue
+            size = len(words)
+            if self.constraints is not None and max(column, default=0) >= math.perm(size, k):
+                # Constraints left some prompts with fewer terms.
+                columns.append([join([words[i] for i in unrank_partial(r, size, k)]) for r in column])
+                continue
+            table = self.segment_table(cat, k)
+            if table is not None:
+                columns.append([table[r] for r in column])
+            elif k == 1:
+                columns.append([words[r] for r in column])
+            else:
+                columns.append([join([words[i] for i in unrank_sample(r, size, k)]) for r in column])
+        return columns
+
+    def rank_space(self, cat: str, k: int) -> int:
+        """Number of distinct ranks :meth:`sample_ranks` may give ``cat`` with ``k`` picks.
+
+        With constraints a category may get fewer than ``k`` terms; see
+        :func:`rank_partial`.
+        """
+        size = len(self.terms[cat])
+        if self.constraints is None:
+            return math.perm(size, k)
+        return sum(math.perm(size, j) for j in range(k + 1))
+
+    def _array(self, key, values, dtype=object):
+        arr = self._arrays.get(key)
+        if arr is None:
+            arr = self._arrays[key] = np.array(values, dtype=dtype)
+        return arr
+
+
+def sample_index_rows(gen, n_rows: int, population: int, k: int):
+    """Return an ``(n_rows, k)`` array of distinct indices per row.
+
+    Rows are ordered random samples without replacement, equivalent to
+    calling ``random.sample(range(population), k)`` once per row.
+    """
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+    if k == 1:
+        return gen.integers(0, population, size=(n_rows, 1))
+    if k * k <= population:
+        return _sample_sparse(gen, n_rows, population, k)
+    step = max(1, _MAX_KEYS_PER_CHUNK // population)
+    out = []
+    for start in range(0, n_rows, step):
+        rows = min(step, n_rows - start)
+        keys = gen.random((rows, population))
+        if k < population:
+            idx = np.argpartition(keys, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(keys, idx, axis=1), axis=1)
+            idx = np.take_along_axis(idx, order, axis=1)
+        else:
+            idx = np.argsort(keys, axis=1)
+        out.append(idx)
+    return np.concatenate(out, axis=0)
+
+
+def _sample_sparse(gen, n_rows, population, k):
+    """Draw with replacement and redraw the few rows that collided."""
+    idx = gen.integers(0, population, size=(n_rows, k))
+    bad = np.arange(n_rows)
+    while bad.size:
+        ordered = np.sort(idx[bad], axis=1)
+        bad = bad[(ordered[:, 1:] == ordered[:, :-1]).any(axis=1)]
+        if bad.size:
+            idx[bad] = gen.integers(0, population, size=(bad.size, k))
+    return idx
+
+
+def rank_sample(indices: Sequence[int], population: int) -> int:
+    """Position of an ordered sample of distinct indices in lexicographic order.
+
+    The samples of ``k`` indices from ``range(population)`` are ranked in
+    the order ``itertools.permutations(range(population), k)`` yields
+    them, from 0 to ``math.perm(population, k) - 1``.
+    """
+    rank = 0
+    for j, i in enumerate(indices):
+        digit = i - sum(1 for p in indices[:j] if p < i)
+        rank = rank * (population - j) + digit
+    return rank
+
+
+def unrank_sample(rank: int, population: int, k: int) -> list[int]:
+    """Inverse of :func:`rank_sample`."""
+    digits = []
+    for j in range(k - 1, -1, -1):
+        rank, digit = divmod(rank, population - j)
+        digits.append(digit)
+    picked = []
+    for digit in reversed(digits):
+        i = digit
+        for p in sorted(picked):
+            if p <= i:
+                i += 1
+            else:
+                break
+        picked.append(i)
+    return picked
+
+
+def rank_partial(indices: Sequence[int], population: int, k: int) -> int:
+    """:func:`rank_sample` extended to samples of fewer than ``k`` indices.
+
+    Full samples keep their :func:`rank_sample`; shorter ones rank after
+    all of them, shortest first.
+    """
+    j = len(indices)
+    if j == k:
+        return rank_sample(indices, population)
+    return sum(math.perm(population, m) for m in range(j)) + math.perm(population, k) + rank_sample(indices, population)
+
+
+def unrank_partial(rank: int, population: int, k: int) -> list[int]:
+    """Inverse of :func:`rank_partial`."""
+    full = math.perm(population, k)
+    if rank < full:
+        return unrank_sample(rank, population, k)
+    rank -= full
+    for j in range(k):
+        count = math.perm(population, j)
+        if rank < count:
+            return unrank_sample(rank, population, j)
+        rank -= count
+    raise ValueError(f"Rank out of range for {k} picks from {population} terms")
@@ -0,0 +1,213 @@
+"""Long-running generation server.
+
+Keeps profiles, warm engines and the memory vault open, and answers
+requests over a Unix domain socket or a localhost TCP port. The server
+has no authentication, so it only listens on a loopback host unless
+started with ``allow_remote``. The protocol
+is JSON lines: each request is one object on one line, and each gets a
+one-line response of ``{"ok": true, ...}`` or ``{"ok": false, "error": ...}``.
+
+Requests carry an ``op``:
+
+- ``generate``: the CLI's generation options (``profile``, ``num``,
+  ``diff``, ``category``, ``baseline``, ``template``, ``seed``,
+  ``max_tokens``). Returns
+  ``prompts``; with ``"save": true`` the prompts are persisted like a CLI
+  run (output file, hash log, vault) and the file ``path`` is returned.
+  Files always go to the server's own output directory.
+- ``query``: :meth:`PromptMemoryVault.query` filters; returns ``entries``.
+- ``profiles``: returns the profile names.
+
+A connection may send any number of requests. Connections are served
+concurrently, and the blocking work runs on a thread pool.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import json
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .client import DEFAULT_ADDRESS, parse_address
+from .memory_vault import PromptMemoryVault
+from .parallel import chunk_seed, shard_chunks
+from .pipeline import PersistencePipeline
+from .prompt_engine import PromptEngine
+from .prompt_profiles import default_registry
+
+
+class GenerationService:
+    """Request handlers sharing one profile registry and one vault.
+
+    Engines come warm from the registry, which picks up edits to the
+    profile, vocabulary and template files while the server runs.
+    Saved runs are written under ``out_dir``, whatever the client asks.
+    """
+
+    def __init__(
+        self,
+        profile_path: str = "prompt_profiles.json",
+        vault: PromptMemoryVault | None = None,
+        out_dir: str = "outputs",
+    ):
+        self.registry = default_registry(profile_path)
+        self.vault = vault or PromptMemoryVault()
+        self.out_dir = out_dir
+
+    def profile(self, name: str) -> dict:
+        return self.registry.profile(name)
+
+    def engine(self, name: str) -> PromptEngine:
+        return self.registry.engine(name)
+
+    def handle(self, request: dict) -> dict:
+        op = request.pop("op", "generate")
+        handler = {"generate": self.generate, "query": self.query, "profiles": self.list_profiles}.get(op)
+        if handler is None:
+            raise ValueError(f"Unknown op '{op}'")
+        return {"ok": True, **handler(**request)}
+
+    def list_profiles(self) -> dict:
+        return {"profiles": self.registry.names()}
+
+    def query(self, **filters) -> dict:
+        return {"entries": self.vault.query(**filters)}
+
+    def generate(
+        self,
+        profile: str,
+        num: int = 1,
+        diff: int | None = None,
+        category: str | None = None,
+        baseline: str = "",
+        template: str = "plain",
+        seed: int | None = None,
+        save: bool = False,
+        format: str | None = None,
+        tag: str = "server",
+        model: str | None = None,
+        compress: str | None = None,
+        max_tokens: int | None = None,
+    ) -> dict:
+        settings = self.profile(profile)
+        engine = self.engine(profile)
+        if template not in engine.templates():
+            raise ValueError(f"Unknown template '{template}'")
+        diff = diff or settings["default_diff"]
+        if max_tokens is not None:
+            engine.budget_plan(max_tokens, diff, baseline, category, template)
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        # Same chunk seeding as core.parallel, so a seed gives the CLI's output.
+        chunks = (
+            engine.generate_batch(
+                count, diff, baseline, category, template, rng=random.Random(chunk_seed(seed, j)), max_tokens=max_tokens
+            )
+            for j, count in shard_chunks(num)
+        )
+        if not save:
+            return {"count": num, "prompts": [p for chunk in chunks for p in chunk]}
+        if any(sep in tag for sep in (os.sep, os.altsep) if sep):
+            raise ValueError(f"Invalid tag '{tag}': it names the output file and cannot hold a path separator")
+        output = dict(
+            format=format or settings["format"],
+            tag=tag,
+            model=model or settings.get("default_model"),
+            out_dir=self.out_dir,
+            compress=compress,
+            token_counts=max_tokens is not None,
+        )
+        with PersistencePipeline(
+            output=output, vault=self.vault, vault_category=category or profile, vault_tags=[tag]
+        ) as pipeline:
+            for chunk in chunks:
+                pipeline.submit(chunk)
+        return {"count": pipeline.count, "path": str(pipeline.path)}
+
+    def close(self):
+        self.vault.close()
+
+
+def bind_target(address: str, allow_remote: bool = False):
+    """:func:`parse_address` for a server; a non-loopback host needs ``allow_remote``.
+
+    Raises ``ValueError`` for other hosts, since anyone who can reach the
+    port could generate and save prompts.
+    """
+    target = parse_address(address)
+    if isinstance(target, tuple) and not allow_remote:
+        host = target[0]
+        try:
+            loopback = host == "localhost" or ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback:
+            raise ValueError(
+                f"Refusing to serve on '{host}': the server has no authentication, so it only "
+                "listens on loopback hosts unless remote access is allowed explicitly"
+            )
+    return target
+
+
+async def serve(
+    service: GenerationService, address: str = DEFAULT_ADDRESS, workers: int | None = None, allow_remote: bool = False
+):
+    """Serve ``service`` on ``address`` (a socket path or ``host:port``) until cancelled."""
+    target = bind_target(address, allow_remote)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(workers or min(32, (os.cpu_count() or 1) + 4))
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                    response = await loop.run_in_executor(executor, service.handle, request)
+                except Exception as exc:  # reported to the client, the server keeps running
+                    response = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    if isinstance(target, tuple):
+        server = await asyncio.start_server(handle_connection, *target, limit=1 << 20)
+    else:
+        path = Path(target)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.is_socket():
+            path.unlink()
+        server = await asyncio.start_unix_server(handle_connection, str(path), limit=1 << 20)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=True)
+        if not isinstance(target, tuple):
+            Path(target).unlink(missing_ok=True)
+
+
+def run_server(
+    address: str = DEFAULT_ADDRESS,
+    profile_path: str = "prompt_profiles.json",
+    workers: int | None = None,
+    out_dir: str = "outputs",
+    allow_remote: bool = False,
+):
+    """Blocking entry point used by ``promptcli.py --serve``."""
+    bind_target(address, allow_remote)
+    service = GenerationService(profile_path, out_dir=out_dir)
+    try:
+        asyncio.run(serve(service, address, workers, allow_remote))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,213 @@
+"""Near-duplicate detection over the terms that make up prompts.
+
+A prompt's features are its comma-separated terms (see :func:`term_set`),
+so prompts that share most of their terms are similar however the terms
+are ordered. Similarity is the Jaccard index of two term sets.
+
+:class:`MinHasher` turns a term set into a signature whose positions
+agree between two sets with probability equal to their Jaccard index.
+:class:`LSHIndex` cuts signatures into bands and buckets entries by
+band, so a query only compares against entries that share a bucket.
+With the default 8 bands of 3 rows, pairs at Jaccard 0.5 share a
+bucket about 66% of the time, pairs at 0.7 about 96% of the time, and
+pairs at 0.2 about 6% of the time.
+
+Term hashes come from SHAKE-128 and :meth:`LSHIndex.band_keys` from
+fixed multipliers, not from ``hash()``, so both are stable across
+processes and can be stored.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import random
+import struct
+from collections import defaultdict
+from operator import mul
+from typing import Hashable, Iterable, Sequence
+
+from . import instrument
+
+NUM_PERM = 24
+BANDS = 8
+# Minimum Jaccard index for a near-duplicate by default.
+THRESHOLD = 0.5
+
+_MASK = (1 << 63) - 1
+# Distinct term vectors kept per hasher; vocabularies are far smaller.
+_MAX_CACHED_TERMS = 1 << 18
+_BLANK = frozenset([""])
+# Picks remembered per bucket by select_diverse. A band value shared by
+# many prompts (e.g. a category with only a few terms) marks a common
+# core rather than near-duplicates; capping its bucket bounds the work.
+MAX_BUCKET = 32
+
+
+def term_set(prompt: str) -> frozenset[str]:
+    """The lowercased comma-separated terms of ``prompt``."""
+    terms = frozenset(map(str.strip, prompt.lower().split(",")))
+    return terms - _BLANK if "" in terms else terms
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+class MinHasher:
+    """MinHash signatures of ``num_perm`` independent 32-bit term hashes.
+
+    A term's hashes are one SHAKE-128 digest of the term, computed once
+    and cached, so a signature costs one element-wise minimum over its
+    terms' hash vectors.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        self.num_perm = num_perm
+        self.seed = seed
+        self._salt = seed.to_bytes(8, "little")
+        self._unpack = struct.Struct(f"<{num_perm}I").unpack
+        self._empty = (1 << 32,) * num_perm
+        self._vectors: dict[str, tuple[int, ...]] = {}
+
+    def _vector(self, term: str) -> tuple[int, ...]:
+        vector = self._vectors.get(term)
+        if vector is None:
+            if len(self._vectors) >= _MAX_CACHED_TERMS:
+                self._vectors.clear()
+            digest = hashlib.shake_128(self._salt + term.encode("utf-8")).digest(4 * self.num_perm)
+            vector = self._vectors[term] = self._unpack(digest)
+        return vector
+
+    def signature(self, terms: Iterable[str]) -> tuple[int, ...]:
+        vectors = [self._vector(t) for t in terms]
+        if not vectors:
+            return self._empty
+        if len(vectors) == 1:
+            return vectors[0]
+        return tuple(map(min, zip(*vectors)))
+
+
+class LSHIndex:
+    """Banded locality-sensitive hashing over MinHash signatures.
+
+    Entries are added under any hashable key with their term sets;
+    :meth:`query` returns the keys whose exact Jaccard index with the
+    query reaches a threshold, checking only entries that share a band.
+    """
+
+    def __init__(self, hasher: MinHasher | None = None, bands: int = BANDS):
+        self.hasher = hasher or MinHasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError(f"{bands} bands do not divide {self.hasher.num_perm} permutations")
+        self.bands = bands
+        self.rows = self.hasher.num_perm // bands
+        rng = random.Random(self.hasher.seed + 1)
+        self._mix = [rng.randrange(1, _MASK) | 1 for _ in range(self.rows + 1)]
+        self._buckets: list[dict[tuple, list]] = [defaultdict(list) for _ in range(bands)]
+        self._terms: dict[Hashable, frozenset] = {}
+
+    def band_slices(self, terms: Iterable[str]) -> list[tuple[int, ...]]:
+        """The signature of ``terms`` cut into one tuple per band."""
+        signature, rows = self.hasher.signature(terms), self.rows
+        return [signature[i:i + rows] for i in range(0, len(signature), rows)]
+
+    def band_keys(self, terms: Iterable[str]) -> list[int]:
+        """One stable 63-bit bucket key per band, for storing outside this process."""
+        first, mix = self._mix[0], self._mix[1:]
+        return [
+            (sum(map(mul, band, mix)) + i * first) & _MASK
+            for i, band in enumerate(self.band_slices(terms))
+        ]
+
+    def add(self, key: Hashable, terms: Iterable[str]) -> None:
+        terms = frozenset(terms)
+        self._terms[key] = terms
+        for buckets, band in zip(self._buckets, self.band_slices(terms)):
+            buckets[band].append(key)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def candidates(self, terms: Iterable[str]) -> set:
+        """Keys sharing at least one band with ``terms``."""
+        found = set()
+        for buckets, band in zip(self._buckets, self.band_slices(terms)):
+            found.update(buckets.get(band, ()))
+        return found
+
+    def query(self, terms: Iterable[str], threshold: float = THRESHOLD) -> list[tuple[Hashable, float]]:
+        """``(key, similarity)`` for candidates at or above ``threshold``, most similar first."""
+        terms = frozenset(terms)
+        scored = [(key, jaccard(terms, self._terms[key])) for key in self.candidates(terms)]
+        return sorted([hit for hit in scored if hit[1] >= threshold], key=lambda hit: -hit[1])
+
+
+def select_diverse(prompts: Sequence[str], k: int, bands: int = BANDS, hasher: MinHasher | None = None) -> list[str]:
+    """Greedily pick ``k`` prompts that are as dissimilar from each other as possible.
+
+    Each step takes the term set whose highest similarity to the sets
+    already picked is lowest, preferring earlier prompts on ties, so
+    every prefix of the result is itself a diverse selection. Only
+    picked sets sharing an LSH band are compared; pairs that share none
+    count as dissimilar. Scores only grow as picks are added, so stale
+    scores stay valid lower bounds and are recomputed lazily, and each
+    candidate resumes its bucket scan where it left off. Prompts that
+    repeat an already picked term set come last.
+    """
+    if k >= len(prompts):
+        return list(prompts)
+    with instrument.stage("diverse", len(prompts)):
+        return [prompts[i] for i in _greedy_dissimilar(prompts, k, LSHIndex(hasher, bands))]
+
+
+def _greedy_dissimilar(prompts, k, index) -> list[int]:
+    groups: dict[frozenset, list[int]] = {}
+    for i, prompt in enumerate(prompts):
+        groups.setdefault(term_set(prompt), []).append(i)
+    terms = list(groups)
+    members = list(groups.values())
+    slices: list = [None] * len(terms)  # hashed on first visit
+    buckets = [defaultdict(list) for _ in range(index.bands)]
+    scanned: dict[int, list[int]] = {}
+    heap = [(0.0, g) for g in range(len(terms))]
+    picked = []
+    while heap and len(picked) < k:
+        score, g = heapq.heappop(heap)
+        nxt = heap[0] if heap else (1.0, len(terms))
+        bound = nxt[0]
+        positions = scanned.get(g)
+        if positions is None:
+            positions = scanned[g] = [0] * index.bands
+            slices[g] = index.band_slices(terms[g])
+        mine = terms[g]
+        for b, (band_buckets, band) in enumerate(zip(buckets, slices[g])):
+            bucket = band_buckets.get(band)
+            if not bucket:
+                continue
+            pos = positions[b]
+            while pos < len(bucket) and score <= bound:
+                other = terms[bucket[pos]]
+                common = len(mine & other)
+                score = max(score, common / (len(mine) + len(other) - common))
+                pos += 1
+            positions[b] = pos
+        if (score, g) > nxt:
+            heapq.heappush(heap, (score, g))
+            continue
+        picked.append(g)
+        del scanned[g]
+        for band_buckets, band in zip(buckets, slices[g]):
+            bucket = band_buckets[band]
+            if len(bucket) < MAX_BUCKET:
+                bucket.append(g)
+    chosen = [members[g][0] for g in picked]
+    # Fewer distinct term sets than k: repeat picked sets in pick order.
+    depth = 1
+    while len(chosen) < k:
+        chosen.extend(members[g][depth] for g in picked if len(members[g]) > depth)
+        depth += 1
+    return chosen[:k]
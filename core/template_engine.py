@@ -2,8 +2,13 @@ from __future__ import annotations
 
 """Utilities for applying high level prompt templates."""
 
-from dataclasses import dataclass
-from typing import Dict
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from string import Formatter
+from typing import Dict, Iterable, Mapping, Sequence
+
+from . import instrument
 
 
 TEMPLATES: Dict[str, str] = {
@@ -12,17 +17,191 @@ TEMPLATES: Dict[str, str] = {
     "cot": "{baseline} Let's think step by step. {content}",
 }
 
+# Placeholders every template may use; any other must name a vocabulary category.
+BUILTIN_FIELDS = ("baseline", "sep", "content")
+
 
 def available_templates() -> list[str]:
     """Return the available template keys."""
     return list(TEMPLATES.keys())
 
 
+class CompiledTemplate:
+    """A template pattern parsed once into literal text and placeholders.
+
+    Besides ``{baseline}``, ``{sep}`` and ``{content}`` (all sampled terms),
+    a pattern may use ``{<category>}`` for the terms sampled from one
+    vocabulary category. When ``categories`` is given, any other
+    placeholder raises ``ValueError`` here rather than at render time.
+    """
+
+    def __init__(self, name: str, pattern: str, categories: Iterable[str] | None = None):
+        if not isinstance(pattern, str):
+            raise ValueError(f"Template '{name}' must be a string")
+        try:
+            parsed = list(Formatter().parse(pattern))
+        except ValueError as exc:
+            raise ValueError(f"Template '{name}': {exc}") from None
+        allowed = None if categories is None else set(BUILTIN_FIELDS) | set(categories)
+        self.name = name
+        self.pattern = pattern
+        self.segments: list[tuple[str, str | None]] = []
+        for literal, name_, spec, conversion in parsed:
+            if name_ is not None:
+                if not name_.isidentifier() or spec or conversion:
+                    raise ValueError(f"Template '{name}': unsupported placeholder '{{{name_}}}'")
+                if allowed is not None and name_ not in allowed:
+                    raise ValueError(f"Template '{name}' uses unknown category '{{{name_}}}'")
+            self.segments.append((literal, name_))
+        self.fields = {f for _, f in self.segments if f}
+
+    def render(self, content: str, baseline: str = "", terms: Mapping[str, str] | None = None) -> str:
+        """Render one prompt; ``terms`` maps categories to their joined terms."""
+        values = dict(terms or {})
+        values.update(baseline=baseline, content=content, sep=", " if baseline and content else "")
+        return "".join(literal + values.get(f, "") if f else literal for literal, f in self.segments).strip()
+
+    def render_columns(self, columns: Mapping[str, Sequence[str]], n: int, baseline: str = "") -> list[str]:
+        """Render ``n`` prompts from per-category columns of joined terms.
+
+        ``columns`` holds the non-empty categories in sampling order;
+        ``{content}`` is their join and absent categories render empty.
+        A prompt may have no terms in some categories (when a bank's
+        constraints leave none); those are left out of its ``{content}``.
+        """
+        values = dict(columns)
+        content = None
+        if columns and "content" in self.fields:
+            cols = list(columns.values())
+            if len(cols) == 1:
+                content = cols[0]
+            elif any("" in col for col in cols):
+                join = ", ".join
+                content = [join(filter(None, row)) for row in zip(*cols)]
+            else:
+                content = list(map(", ".join, zip(*cols)))
+            values["content"] = content
+        rendered = self.render_rows(values, n, baseline, ", " if baseline and columns else "")
+        if content is not None and baseline and "" in content:
+            # No separator after the baseline when a prompt has no terms at all.
+            rendered = [
+                r if c else self.render(c, baseline, {cat: col[i] for cat, col in columns.items()})
+                for i, (r, c) in enumerate(zip(rendered, content))
+            ]
+        return rendered
+
+    def render_rows(self, values: Mapping[str, Sequence[str]], n: int, baseline: str = "", sep: str = "") -> list[str]:
+        """Render ``n`` prompts, taking each per-prompt field from a column.
+
+        The baseline and separator are substituted once, so a prompt costs
+        a concatenation (one field) or a single ``str.format`` call.
+        """
+        parts, names = self._split(baseline, sep)
+        merged, columns = [parts[0]], []
+        for name, literal in zip(names, parts[1:]):
+            column = values.get(name)
+            if column is None:
+                merged[-1] += literal
+            else:
+                columns.append(column)
+                merged.append(literal)
+        if not columns:
+            return [merged[0].strip()] * n
+        if len(columns) == 1:
+            prefix, suffix = merged
+            return [(prefix + v + suffix).strip() for v in columns[0]]
+        fmt = "{}".join(p.replace("{", "{{").replace("}", "}}") for p in merged)
+        return [fmt.format(*row).strip() for row in zip(*columns)]
+
+    def frame(self, baseline: str = "") -> tuple[str, str] | None:
+        """Return the text around ``{content}``, or ``None`` if other fields vary per prompt."""
+        parts, names = self._split(baseline, ", " if baseline else "")
+        if names != ["content"]:
+            return None
+        return parts[0], parts[1]
+
+    def _split(self, baseline: str, sep: str) -> tuple[list[str], list[str]]:
+        """Fill in the per-batch fields; return the literal runs and per-prompt fields between them."""
+        parts, names, text = [], [], ""
+        for literal, name in self.segments:
+            text += literal
+            if name == "baseline":
+                text += baseline
+            elif name == "sep":
+                text += sep
+            elif name is not None:
+                parts.append(text)
+                names.append(name)
+                text = ""
+        parts.append(text)
+        return parts, names
+
+
 @dataclass
 class TemplateRenderer:
-    """Render prompts using predefined templates."""
+    """Render prompts using predefined and user-defined templates.
+
+    Patterns are compiled on first use and cached by name. User templates
+    are checked against ``categories`` when they are added.
+    """
+
+    templates: Dict[str, str] = field(default_factory=lambda: dict(TEMPLATES))
+    categories: list[str] | None = None
+    _compiled: Dict[str, CompiledTemplate] = field(default_factory=dict, init=False, repr=False)
+
+    def available(self) -> list[str]:
+        """Return the names of every template this renderer knows."""
+        return list(self.templates)
+
+    def add(self, name: str, pattern: str) -> CompiledTemplate:
+        compiled = CompiledTemplate(name, pattern, self.categories)
+        self.templates[name] = pattern
+        self._compiled[name] = compiled
+        return compiled
+
+    def load(self, path) -> list[str]:
+        """Add the templates from a JSON file mapping names to patterns.
+
+        The file is validated as a whole; nothing is added if any pattern
+        is invalid.
+        """
+        with open(Path(path), "r", encoding="utf-8") as f:
+            patterns = json.load(f)
+        if not isinstance(patterns, dict):
+            raise ValueError(f"{path}: expected an object mapping template names to patterns")
+        compiled = {name: CompiledTemplate(name, p, self.categories) for name, p in patterns.items()}
+        self.templates.update(patterns)
+        self._compiled.update(compiled)
+        return list(patterns)
+
+    def compile(self, template: str) -> CompiledTemplate:
+        """Return the compiled template, falling back to ``plain`` for unknown names."""
+        compiled = self._compiled.get(template)
+        if compiled is None:
+            name = template if template in self.templates else "plain"
+            compiled = self._compiled.get(name) or CompiledTemplate(name, self.templates[name], self.categories)
+            self._compiled[name] = self._compiled[template] = compiled
+        return compiled
+
+    def render(self, content: str, baseline: str = "", template: str = "plain", terms: Mapping[str, str] | None = None) -> str:
+        return self.compile(template).render(content, baseline, terms)
+
+    def frame(self, baseline: str = "", template: str = "plain") -> tuple[str, str] | None:
+        """Return the rendered text before and after a non-empty content."""
+        return self.compile(template).frame(baseline)
+
+    def render_columns(self, columns: Mapping[str, Sequence[str]], n: int, baseline: str = "", template: str = "plain") -> list[str]:
+        """Render ``n`` prompts from per-category term columns; see :meth:`CompiledTemplate.render_columns`."""
+        with instrument.stage("render", n):
+            return self.compile(template).render_columns(columns, n, baseline)
 
-    def render(self, content: str, baseline: str = "", template: str = "plain") -> str:
-        pattern = TEMPLATES.get(template, TEMPLATES["plain"])
-        sep = ", " if baseline and content else ""
-        return pattern.format(baseline=baseline, content=content, sep=sep).strip()
+    def render_many(self, contents, baseline: str = "", template: str = "plain") -> list[str]:
+        """Render many contents with the same baseline and template."""
+        compiled = self.compile(template)
+        contents = list(contents)
+        with instrument.stage("render", len(contents)):
+            rendered = compiled.render_rows({"content": contents}, len(contents), baseline, ", " if baseline else "")
+            if not all(contents):
+                empty = compiled.render("", baseline)
+                rendered = [r if c else empty for r, c in zip(rendered, contents)]
+        return rendered
@@ -0,0 +1,544 @@
+"""Storage backends for :class:`core.memory_vault.PromptMemoryVault`."""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .filelock import BUSY_TIMEOUT, GroupCommit, atomic_write, locked
+from .similarity import THRESHOLD, LSHIndex, jaccard, term_set
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> set[str]:
+    """Lowercased word tokens used by the full-text index."""
+    return set(_TOKEN_RE.findall(text.lower()))
+
+
+class VaultBackend:
+    """Interface every vault storage engine implements."""
+
+    def append(self, entries: list[dict]) -> None:
+        raise NotImplementedError
+
+    def iter_entries(self) -> Iterator[dict]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        return sum(1 for _ in self.iter_entries())
+
+    def by_tag(self, tag: str) -> list[dict]:
+        return [e for e in self.iter_entries() if tag in e.get("tags", [])]
+
+    def by_category(self, category: str) -> list[dict]:
+        return [e for e in self.iter_entries() if e.get("category") == category]
+
+    def query(
+        self,
+        tags=None,
+        match_all_tags: bool = False,
+        categories=None,
+        since: str | None = None,
+        until: str | None = None,
+        text: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[dict]:
+        """Linear-scan implementation of :meth:`SQLiteVaultBackend.query`."""
+        tags, categories = set(tags or ()), set(categories or ())
+        terms = tokenize(text) if text else set()
+        matches = []
+        for entry in self.iter_entries():
+            entry_tags = set(entry.get("tags", []))
+            if tags and not (tags <= entry_tags if match_all_tags else tags & entry_tags):
+                continue
+            if categories and entry.get("category") not in categories:
+                continue
+            if since and entry["timestamp"] < since or until and entry["timestamp"] >= until:
+                continue
+            if terms and not terms <= tokenize(entry["prompt"]):
+                continue
+            matches.append(entry)
+        matches.reverse()
+        end = None if limit is None else offset + limit
+        return matches[offset:end]
+
+    def near_duplicates(self, prompt: str, threshold: float = THRESHOLD, limit: int | None = None) -> list[dict]:
+        """Linear-scan implementation of :meth:`SQLiteVaultBackend.near_duplicates`."""
+        terms = term_set(prompt)
+        scored = []
+        for n, entry in enumerate(self.iter_entries()):
+            similarity = jaccard(terms, term_set(entry["prompt"]))
+            if similarity >= threshold:
+                scored.append((similarity, n, entry))
+        scored.sort(key=lambda hit: (-hit[0], -hit[1]))
+        return [{**entry, "similarity": round(similarity, 4)} for similarity, _, entry in scored[:limit]]
+
+    def close(self) -> None:
+        pass
+
+
+class JSONVaultBackend(VaultBackend):
+    """The original single JSON array file, rewritten on every append.
+
+    Kept for existing ``.json`` vaults and as the migration source; it
+    costs O(N) per write, so prefer :class:`SQLiteVaultBackend`.
+
+    Appends from concurrent processes go through a
+    :class:`~core.filelock.GroupCommit`: the file is re-read under a
+    lock, every staged batch is added and the file is replaced
+    atomically, so no writer's entries are lost and a burst of writers
+    shares a few rewrites.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._entries: list[dict] | None = None
+        self._stat = None
+        self._group = GroupCommit(self.path, self._commit)
+
+    def _load(self) -> list[dict]:
+        """The entries on disk, re-read only when the file has been replaced."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._entries, self._stat = [], None
+            return self._entries
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._entries is None or key != self._stat:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+            self._stat = key
+        return self._entries
+
+    def _commit(self, batches: list[list[dict]]) -> None:
+        data = list(self._load())
+        for batch in batches:
+            data.extend(batch)
+        atomic_write(self.path, json.dumps(data, indent=2).encode("utf-8"))
+        stat = self.path.stat()  # still under the lock: nobody else has replaced it
+        self._entries, self._stat = data, (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def append(self, entries: list[dict]) -> None:
+        self._group.submit(entries)
+
+    def iter_entries(self) -> Iterator[dict]:
+        return iter(list(self._load()))
+
+    def count(self) -> int:
+        return len(self._load())
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    category TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entry_tags (
+    entry_id INTEGER NOT NULL REFERENCES entries(id),
+    tag TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS token_blocks (
+    token TEXT NOT NULL,
+    first_id INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    ids BLOB NOT NULL,
+    PRIMARY KEY (token, first_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS minhash_bands (
+    band INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL,
+    PRIMARY KEY (band, entry_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS minhash_params (
+    params TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_category ON entries(category);
+CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries(timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_entry_tags_tag ON entry_tags(tag, entry_id);
+CREATE INDEX IF NOT EXISTS idx_entry_tags_entry ON entry_tags(entry_id);
+"""
+# Bumped whenever an index is added; older vaults are backfilled on open.
+_SCHEMA_VERSION = 4
+
+
+class SQLiteVaultBackend(VaultBackend):
+    """Append-only vault stored in SQLite with write-ahead logging.
+
+    Opening the vault reads no history; appends cost one transaction per
+    batch regardless of how many entries are already stored.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lsh = LSHIndex()
+        self.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        lsh = self._lsh
+        self._band_params = f"minhash:{lsh.hasher.num_perm}:{lsh.bands}:{lsh.hasher.seed}"
+        if self._version() < _SCHEMA_VERSION or not self._bands_current():
+            self._migrate()
+
+    def _version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def _bands_current(self) -> bool:
+        row = self.conn.execute("SELECT params FROM minhash_params").fetchone()
+        return row is not None and row[0] == self._band_params
+
+    def _migrate(self) -> None:
+        """Bring an older vault's indexes up to date in one write transaction.
+
+        Other processes may open the same vault at the same time: the
+        version is read again under the write lock, so only the first
+        opener rebuilds and the others find the work done.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            if self._version() < 3:
+                self.conn.execute("DROP TABLE IF EXISTS entry_tokens")
+                self._backfill_tokens()
+            if not self._bands_current():
+                # First open since bands were indexed on append, or other LSH settings.
+                self.conn.execute("DROP TABLE IF EXISTS minhash_state")
+                self._backfill_bands()
+            self.conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+
+    def _backfill_tokens(self, batch_size: int = 10_000) -> None:
+        """Rebuild the token index; runs inside :meth:`_migrate`'s transaction."""
+        self.conn.execute("DELETE FROM token_blocks")
+        last_id = 0
+        while rows := self.conn.execute(
+            "SELECT id, prompt FROM entries WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+        ).fetchall():
+            self._index_tokens(rows)
+            last_id = rows[-1][0]
+
+    def _backfill_bands(self, batch_size: int = 10_000) -> None:
+        """Rebuild the LSH band index; runs inside :meth:`_migrate`'s transaction."""
+        self.conn.execute("DELETE FROM minhash_bands")
+        self.conn.execute("DELETE FROM minhash_params")
+        self.conn.execute("INSERT INTO minhash_params (params) VALUES (?)", (self._band_params,))
+        last_id = 0
+        while rows := self.conn.execute(
+            "SELECT id, prompt FROM entries WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+        ).fetchall():
+            self._index_bands(rows)
+            last_id = rows[-1][0]
+
+    def _index_bands(self, rows) -> None:
+        """Add the LSH bands of ``(id, prompt)`` rows."""
+        band_keys = self._lsh.band_keys
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO minhash_bands (band, entry_id) VALUES (?, ?)",
+            [(band, entry_id) for entry_id, text in rows for band in band_keys(term_set(text))],
+        )
+
+    def _index_tokens(self, rows) -> None:
+        """Add one posting block per distinct token in ``(id, prompt)`` rows.
+
+        A block stores the batch's ids for a token as uint32 offsets from
+        its first id, so a batch costs one index row per distinct token
+        rather than one per (token, entry) pair.
+        """
+        postings = defaultdict(list)
+        for entry_id, prompt in rows:
+            for token in tokenize(prompt):
+                postings[token].append(entry_id)
+        self.conn.executemany(
+            "INSERT INTO token_blocks (token, first_id, n, ids) VALUES (?, ?, ?, ?)",
+            [
+                (token, ids[0], len(ids), array("I", [i - ids[0] for i in ids]).tobytes())
+                for token, ids in postings.items()
+            ],
+        )
+
+    def append(self, entries: list[dict]) -> None:
+        with self._lock, self.conn:
+            # Take the write lock before reading MAX(id): other processes may append too.
+            self.conn.execute("BEGIN IMMEDIATE")
+            first = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM entries").fetchone()[0]
+            ids = range(first, first + len(entries))
+            self.conn.executemany(
+                "INSERT INTO entries (id, prompt, timestamp, category) VALUES (?, ?, ?, ?)",
+                [
+                    (entry_id, e["prompt"], e["timestamp"], e.get("category", "general"))
+                    for entry_id, e in zip(ids, entries)
+                ],
+            )
+            self.conn.executemany(
+                "INSERT INTO entry_tags (entry_id, tag) VALUES (?, ?)",
+                [(entry_id, tag) for entry_id, e in zip(ids, entries) for tag in e.get("tags", [])],
+            )
+            rows = [(entry_id, e["prompt"]) for entry_id, e in zip(ids, entries)]
+            self._index_tokens(rows)
+            self._index_bands(rows)
+
+    def _select(self, where: str = "", params: Iterable = ()) -> list[tuple]:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT e.id, e.prompt, e.timestamp, e.category, "
+                "(SELECT json_group_array(tag) FROM entry_tags WHERE entry_id = e.id) "
+                f"FROM entries e {where}",
+                tuple(params),
+            ).fetchall()
+
+    def iter_entries(self, batch_size: int = 10_000) -> Iterator[dict]:
+        last_id = 0
+        while rows := self._select("WHERE e.id > ? ORDER BY e.id LIMIT ?", (last_id, batch_size)):
+            last_id = rows[-1][0]
+            yield from map(_row_to_entry, rows)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def by_tag(self, tag: str) -> list[dict]:
+        rows = self._select(
+            "WHERE e.id IN (SELECT entry_id FROM entry_tags WHERE tag = ?) ORDER BY e.id", (tag,)
+        )
+        return list(map(_row_to_entry, rows))
+
+    def query(
+        self,
+        tags=None,
+        match_all_tags: bool = False,
+        categories=None,
+        since: str | None = None,
+        until: str | None = None,
+        text: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[dict]:
+        """Return entries matching every given filter, newest first.
+
+        Each tag, category and text term is an index posting walked from
+        the newest entry down; the postings are intersected with a
+        leapfrog join that stops once the page is full, so cost follows
+        the size of the answer rather than the size of the vault.
+
+        Args:
+            tags: entries carrying any of these tags (all of them when
+                ``match_all_tags`` is set).
+            categories: entries in any of these categories.
+            since: ISO timestamp lower bound (inclusive).
+            until: ISO timestamp upper bound (exclusive).
+            text: every word of ``text`` must appear in the prompt.
+            limit: maximum number of entries to return.
+            offset: number of matching entries to skip, for pagination.
+        """
+        postings = []
+        tags = list(dict.fromkeys(tags or ()))
+        groups = [[tag] for tag in tags] if match_all_tags else [tags] if tags else []
+        for group in groups:
+            postings.append(_union(
+                _IndexPosting(self, "SELECT MAX(entry_id) FROM entry_tags WHERE tag = ? AND entry_id <= ?", tag)
+                for tag in group
+            ))
+        if categories:
+            postings.append(_union(
+                _IndexPosting(self, "SELECT MAX(id) FROM entries WHERE category = ? AND id <= ?", category)
+                for category in dict.fromkeys(categories)
+            ))
+        postings.extend(_TokenPosting(self, token) for token in tokenize(text or ""))
+
+        end = None if limit is None else offset + limit
+        if not postings:
+            where, params = [], []
+            if since:
+                where.append("e.timestamp >= ?")
+                params.append(since)
+            if until:
+                where.append("e.timestamp < ?")
+                params.append(until)
+            clause = f"WHERE {' AND '.join(where)} " if where else ""
+            rows = self._select(f"{clause}ORDER BY e.id DESC LIMIT ? OFFSET ?", [*params, -1 if limit is None else limit, offset])
+            return list(map(_row_to_entry, rows))
+
+        page = []
+        with self._lock:
+            # The id span of the time window bounds the walk; the timestamp
+            # index makes this a range scan over the window only.
+            window = " AND ".join(
+                cond for cond, value in (("timestamp >= ?", since), ("timestamp < ?", until)) if value
+            )
+            lowest, top = self.conn.execute(
+                f"SELECT MIN(id), MAX(id) FROM entries {'WHERE ' + window if window else ''}",
+                [value for value in (since, until) if value],
+            ).fetchone()
+            for entry_id in _intersect(postings, top or 0):
+                if entry_id < lowest:
+                    break
+                if since or until:
+                    stamp = self.conn.execute("SELECT timestamp FROM entries WHERE id = ?", (entry_id,)).fetchone()[0]
+                    if since and stamp < since or until and stamp >= until:
+                        continue
+                page.append(entry_id)
+                if end is not None and len(page) >= end:
+                    break
+        rows = self._select(
+            "WHERE e.id IN (SELECT value FROM json_each(?)) ORDER BY e.id DESC", [json.dumps(page[offset:end])]
+        )
+        return list(map(_row_to_entry, rows))
+
+    def near_duplicates(self, prompt: str, threshold: float = THRESHOLD, limit: int | None = None) -> list[dict]:
+        """Entries whose term sets have a Jaccard index of at least ``threshold`` with ``prompt``'s.
+
+        Results carry a ``similarity`` field and come most similar first,
+        newest first among equals. Only entries sharing an LSH band with
+        the prompt are compared (see :mod:`core.similarity`), so the cost
+        follows the number of similar entries, not the size of the
+        vault. Entries are indexed as they are appended.
+        """
+        terms = term_set(prompt)
+        keys = self._lsh.band_keys(terms)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, prompt FROM entries WHERE id IN "
+                "(SELECT entry_id FROM minhash_bands WHERE band IN (SELECT value FROM json_each(?)))",
+                [json.dumps(keys)],
+            ).fetchall()
+        scored = sorted(
+            (hit for hit in ((jaccard(terms, term_set(text)), entry_id) for entry_id, text in rows) if hit[0] >= threshold),
+            reverse=True,
+        )[:limit]
+        if not scored:
+            return []
+        entries = {
+            row[0]: _row_to_entry(row)
+            for row in self._select("WHERE e.id IN (SELECT value FROM json_each(?))", [json.dumps([i for _, i in scored])])
+        }
+        return [{**entries[entry_id], "similarity": round(similarity, 4)} for similarity, entry_id in scored]
+
+    def by_category(self, category: str) -> list[dict]:
+        return list(map(_row_to_entry, self._select("WHERE e.category = ? ORDER BY e.id", (category,))))
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+class _IndexPosting:
+    """Entry ids matching one indexed key, walked from the newest down.
+
+    ``seek(upper)`` returns the largest matching id not above ``upper``,
+    or ``None``; each call is a single index lookup.
+    """
+
+    def __init__(self, backend, sql: str, key):
+        self.conn = backend.conn
+        self.sql = sql
+        self.key = key
+
+    def seek(self, upper: int) -> int | None:
+        return self.conn.execute(self.sql, (self.key, upper)).fetchone()[0]
+
+
+class _UnionPosting:
+    """Ids matching any of several postings."""
+
+    def __init__(self, children):
+        self.children = children
+
+    def seek(self, upper: int) -> int | None:
+        found = [hit for child in self.children if (hit := child.seek(upper)) is not None]
+        return max(found) if found else None
+
+
+def _union(postings):
+    postings = list(postings)
+    return postings[0] if len(postings) == 1 else _UnionPosting(postings)
+
+
+class _TokenPosting:
+    """Ids containing a token, read from its posting blocks one at a time."""
+
+    def __init__(self, backend, token: str):
+        self.conn = backend.conn
+        self.token = token
+        self._first = None
+        self._offsets = None
+
+    def seek(self, upper: int) -> int | None:
+        row = self.conn.execute(
+            "SELECT first_id, ids FROM token_blocks WHERE token = ? AND first_id <= ? "
+            "ORDER BY first_id DESC LIMIT 1",
+            (self.token, upper),
+        ).fetchone()
+        if row is None:
+            return None
+        first, blob = row
+        if first != self._first:
+            self._first, self._offsets = first, array("I")
+            self._offsets.frombytes(blob)
+        # Blocks never overlap, so the answer lies inside this block.
+        return first + self._offsets[bisect_right(self._offsets, upper - first) - 1]
+
+
+def _intersect(postings, upper: int):
+    """Yield ids present in every posting, newest first (leapfrog join)."""
+    candidate = upper
+    while candidate > 0:
+        agreed, i = 0, 0
+        while agreed < len(postings):
+            hit = postings[i].seek(candidate)
+            if hit is None:
+                return
+            if hit == candidate:
+                agreed += 1
+            else:
+                candidate, agreed = hit, 1
+            i = (i + 1) % len(postings)
+        yield candidate
+        candidate -= 1
+
+
+def _row_to_entry(row) -> dict:
+    _, prompt, timestamp, category, tags = row
+    return {
+        "prompt": prompt,
+        "timestamp": timestamp,
+        "category": category,
+        "tags": json.loads(tags) if tags else [],
+    }
+
+
+def open_backend(path: Path) -> VaultBackend:
+    """Pick a backend from the file suffix: ``.json`` is the legacy format."""
+    path = Path(path)
+    if path.suffix == ".json":
+        return JSONVaultBackend(path)
+    return SQLiteVaultBackend(path)
+
+
+def migrate_json_vault(json_path: Path, backend: VaultBackend, batch_size: int = 10_000) -> int:
+    """Copy every entry of a legacy JSON vault into ``backend``.
+
+    The source file is renamed to ``*.json.migrated`` afterwards so the
+    import runs only once, even when several processes open the vault at
+    the same time. Returns the number of entries copied.
+    """
+    json_path = Path(json_path)
+    with locked(json_path):
+        if not json_path.exists():
+            return 0  # another process migrated it first
+        with open(json_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for start in range(0, len(entries), batch_size):
+            backend.append(entries[start:start + batch_size])
+        json_path.rename(json_path.with_name(json_path.name + ".migrated"))
+    return len(entries)
@@ -0,0 +1,293 @@
+"""Compiled, memory-mapped vocabulary banks.
+
+Each ``vocab_*.json`` is compiled once into a binary file under
+``.cache/vocab`` in the repository, or under ``$PROMPTCRAFTER_CACHE/vocab``
+when that variable is set, so every working directory shares one cache.
+The file holds an interned string table plus one run
+of string ids per category. Opening a compiled bank maps the file and
+reads only its header, so load time does not depend on the number of
+terms. The pages are shared by every process that maps the same file.
+
+A category is either a list of terms, all equally likely, or an object
+mapping each term to a positive weight::
+
+    {"genre": ["fantasy", "noir"], "tone": {"dark": 3, "hopeful": 1}}
+
+Weights are stored as a float64 run parallel to the term ids, and each
+term's estimated token count (see :mod:`core.tokens`) as a uint16 run.
+An optional ``_constraints`` object (see :mod:`core.constraints`) is
+checked against the terms at compile time and stored as JSON at the end.
+
+A compiled file records the source's mtime, size and SHA-256. A changed
+mtime alone (a checkout or ``touch``) only triggers a rehash; the bank
+is rebuilt when the content differs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from array import array
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+from .constraints import CONSTRAINTS_KEY, ConstraintSet
+from .filelock import atomic_write
+from .tokens import estimate_tokens
+
+CACHE_ENV = "PROMPTCRAFTER_CACHE"
+_REPO_CACHE = Path(__file__).resolve().parent.parent / ".cache"
+
+_MAGIC = b"PCXV"
+_VERSION = 4
+# magic, version, source mtime_ns, source size, source sha256, categories, strings, category ids, weights,
+# constraints JSON bytes (category ids are followed by an equally long run of token counts)
+_HEADER = struct.Struct("<4sIqQ32sIIIII")
+_CATEGORY = struct.Struct("<IIII")  # name string id, first slot in the id run, term count, weighted flag
+
+
+def default_cache_dir() -> Path:
+    """Where compiled banks go unless a :class:`VocabStore` is given a directory."""
+    return Path(os.environ.get(CACHE_ENV) or _REPO_CACHE) / "vocab"
+
+
+def _digest(path: Path) -> bytes:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.digest()
+
+
+def _category_terms(source: Path, cat: str, words) -> tuple[list[str], list[float] | None]:
+    """Validate one category; return its terms and their weights (``None`` if uniform)."""
+    if isinstance(words, list) and all(isinstance(w, str) for w in words):
+        return words, None
+    if isinstance(words, dict):
+        weights = list(words.values())
+        if all(isinstance(w, (int, float)) and not isinstance(w, bool) and 0 < w < math.inf for w in weights):
+            return list(words), [float(w) for w in weights]
+        raise ValueError(f"{source}: weights in category '{cat}' must be positive numbers")
+    raise ValueError(f"{source}: category '{cat}' must be a list of strings or an object of term weights")
+
+
+def compile_vocab(source: Path, target: Path) -> None:
+    """Compile the JSON vocabulary bank ``source`` into ``target``."""
+    source = Path(source)
+    stat = source.stat()
+    with open(source, "rb") as f:
+        raw = f.read()
+    vocab = json.loads(raw)
+    if not isinstance(vocab, dict):
+        raise ValueError(f"{source}: expected an object mapping categories to term lists")
+    rules = vocab.pop(CONSTRAINTS_KEY, None)
+
+    ids: dict[str, int] = {}
+    strings: list[bytes] = []
+
+    def intern(text: str) -> int:
+        sid = ids.get(text)
+        if sid is None:
+            sid = ids[text] = len(strings)
+            strings.append(text.encode("utf-8"))
+        return sid
+
+    categories = array("I")
+    runs = array("I")
+    weights = array("d")
+    weighted = False
+    for cat, words in vocab.items():
+        words, cat_weights = _category_terms(source, cat, words)
+        categories.extend((intern(cat), len(runs), len(words), cat_weights is not None))
+        runs.extend(intern(w) for w in words)
+        weights.extend(cat_weights or [1.0] * len(words))
+        weighted = weighted or cat_weights is not None
+    if not weighted:
+        weights = array("d")
+    token_counts = [min(estimate_tokens(text), 0xFFFF) for text in ids]  # in string id order
+    constraints = b""
+    if rules is not None:
+        ConstraintSet(rules, {cat: _category_terms(source, cat, words)[0] for cat, words in vocab.items()}, str(source))
+        constraints = json.dumps(rules, ensure_ascii=False).encode("utf-8")
+    tokens = array("H", (token_counts[sid] for sid in runs))
+
+    offsets = array("Q", [0])
+    total = 0
+    for s in strings:
+        total += len(s)
+        offsets.append(total)
+
+    header = _HEADER.pack(
+        _MAGIC, _VERSION, stat.st_mtime_ns, stat.st_size, hashlib.sha256(raw).digest(),
+        len(vocab), len(strings), len(runs), len(weights), len(constraints),
+    )
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=target.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(categories.tobytes())
+            f.write(runs.tobytes())
+            f.write(tokens.tobytes())
+            f.write(offsets.tobytes())
+            f.write(weights.tobytes())
+            f.write(b"".join(strings))
+            f.write(constraints)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class MappedTerms(Sequence):
+    """Read-only view of one category's terms; each term is decoded on access."""
+
+    __slots__ = ("_vocab", "_start", "_count")
+
+    def __init__(self, vocab: MappedVocab, start: int, count: int):
+        self._vocab = vocab
+        self._start = start
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._vocab.string(self._vocab._runs[self._start + index])
+
+    def __iter__(self):
+        string, runs = self._vocab.string, self._vocab._runs
+        for i in range(self._start, self._start + self._count):
+            yield string(runs[i])
+
+    def __repr__(self) -> str:
+        return f"MappedTerms({list(self)!r})"
+
+
+class MappedVocab(Mapping):
+    """A compiled vocabulary bank, mapping categories to :class:`MappedTerms`.
+
+    ``weights`` maps each weighted category to its per-term weights;
+    uniform categories are absent from it. ``tokens`` maps every category
+    to its terms' estimated token counts. ``constraints`` holds the bank's
+    ``_constraints`` rules, or ``None``.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _HEADER.unpack_from(self._mm)
+        magic, version, self.mtime_ns, self.size, self.sha256, n_cats, n_strings, n_ids, n_weights, n_rules = header
+        if magic != _MAGIC or version != _VERSION:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a compiled vocabulary (version {_VERSION})")
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+        cats = view[pos:pos + n_cats * _CATEGORY.size].cast("I")
+        pos += n_cats * _CATEGORY.size
+        self._runs = view[pos:pos + n_ids * 4].cast("I")
+        pos += n_ids * 4
+        tokens = view[pos:pos + n_ids * 2].cast("H")
+        pos += n_ids * 2
+        self._offsets = view[pos:pos + (n_strings + 1) * 8].cast("Q")
+        pos += (n_strings + 1) * 8
+        weights = view[pos:pos + n_weights * 8].cast("d")
+        self._blob = pos + n_weights * 8
+        end = self._blob + self._offsets[n_strings]
+        self.constraints = json.loads(self._mm[end:end + n_rules].decode("utf-8")) if n_rules else None
+        self._categories = {}
+        self.weights: dict[str, Sequence[float]] = {}
+        self.tokens: dict[str, Sequence[int]] = {}
+        for i in range(0, len(cats), 4):
+            name, start, count, is_weighted = cats[i:i + 4]
+            self._categories[self.string(name)] = MappedTerms(self, start, count)
+            self.tokens[self.string(name)] = tokens[start:start + count]
+            if is_weighted:
+                self.weights[self.string(name)] = weights[start:start + count]
+
+    def string(self, sid: int) -> str:
+        start = self._blob + self._offsets[sid]
+        return self._mm[start:self._blob + self._offsets[sid + 1]].decode("utf-8")
+
+    def __getitem__(self, category: str) -> MappedTerms:
+        return self._categories[category]
+
+    def __iter__(self):
+        return iter(self._categories)
+
+    def __len__(self) -> int:
+        return len(self._categories)
+
+    def matches(self, source: Path) -> bool:
+        """Whether this compiled bank still reflects ``source`` (stat only)."""
+        stat = source.stat()
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size
+
+
+class VocabStore:
+    """Open compiled vocabulary banks, sharing one mapping per source file."""
+
+    def __init__(self, cache_dir: Path | None = None):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+        self._open: dict[Path, MappedVocab] = {}
+        self._lock = threading.Lock()
+
+    def cache_path(self, source: Path) -> Path:
+        source = Path(source).resolve()
+        key = hashlib.sha1(str(source).encode()).hexdigest()[:12]
+        return self.cache_dir / f"{source.stem}-{key}.bin"
+
+    def open(self, source) -> MappedVocab:
+        """Return the compiled bank for ``source``, rebuilding it if the source changed."""
+        source = Path(source).resolve()
+        with self._lock:
+            vocab = self._open.get(source)
+            if vocab is not None and vocab.matches(source):
+                return vocab
+            target = self.cache_path(source)
+            vocab = self._load(source, target)
+            self._open[source] = vocab
+            return vocab
+
+    def _load(self, source: Path, target: Path) -> MappedVocab:
+        if target.exists():
+            try:
+                vocab = MappedVocab(target)
+            except (ValueError, struct.error):
+                vocab = None
+            if vocab is not None:
+                if vocab.matches(source):
+                    return vocab
+                if vocab.size == source.stat().st_size and vocab.sha256 == _digest(source):
+                    # Same content under a new mtime: record it instead of recompiling.
+                    # The file is replaced, not patched, since other processes may map it.
+                    data = bytearray(target.read_bytes())
+                    struct.pack_into("<q", data, 8, source.stat().st_mtime_ns)
+                    atomic_write(target, data, fsync=False)
+                    return MappedVocab(target)
+        compile_vocab(source, target)
+        return MappedVocab(target)
+
+
+_DEFAULT_STORE: VocabStore | None = None
+
+
+def default_store() -> VocabStore:
+    """The process-wide store shared by every engine that does not pass its own."""
+    global _DEFAULT_STORE
+    if _DEFAULT_STORE is None:
+        _DEFAULT_STORE = VocabStore()
+    return _DEFAULT_STORE
@@ -1,17 +1,74 @@
+import argparse
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from pathlib import Path
 
-from core.prompt_engine import PromptEngine, templates
-from core.output import save_prompts
-from core.prompt_profiles import load_profiles, load_profile
+from core import instrument
+from core.output import CHUNK_SIZE, save_prompts
+from core.prompt_profiles import default_registry
+
+# Prompts shown in the preview pane; the rest of a batch only goes to disk.
+PREVIEW_LIMIT = 20
+POLL_MS = 100
+# How often the profile, vocabulary and template files are checked for edits.
+RELOAD_MS = 2000
+
+
+class BatchWorker(threading.Thread):
+    """Generate a batch in chunks on a background thread and stream it to disk.
+
+    Progress, the preview and the final result are posted to ``events``
+    for the Tk thread to poll; Tk widgets are never touched from here.
+    ``cancel()`` stops generation after the current chunk, and the
+    prompts produced so far are still saved.
+    """
+
+    def __init__(self, engine, num, diff, baseline, category, template, save_kwargs):
+        super().__init__(name="gui-batch", daemon=True)
+        self.engine = engine
+        self.num = num
+        self.generate_args = (diff, baseline, category, template)
+        self.save_kwargs = save_kwargs
+        self.events: queue.Queue = queue.Queue()
+        self.produced = 0
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _prompts(self):
+        for start in range(0, self.num, CHUNK_SIZE):
+            if self._cancel.is_set():
+                return
+            chunk = self.engine.generate_batch(min(CHUNK_SIZE, self.num - start), *self.generate_args)
+            if start == 0:
+                self.events.put(("preview", chunk[:PREVIEW_LIMIT]))
+            yield from chunk
+            self.produced += len(chunk)
+            self.events.put(("progress", self.produced))
+
+    def run(self):
+        try:
+            path = save_prompts(self._prompts(), **self.save_kwargs)
+        except Exception as exc:
+            self.events.put(("error", exc))
+        else:
+            self.events.put(("done", path))
 
 
 class PromptGUI:
-    def __init__(self, root):
+    def __init__(self, root, stats: bool = False):
         self.root = root
+        self.stats = stats
         self.root.title("PromptCrafter-X :: Neural Forge")
-        self.root.geometry("800x600")
+        self.root.geometry("800x780")
 
         style = ttk.Style()
         style.theme_use("clam")
@@ -23,8 +80,8 @@ class PromptGUI:
         style.configure("TMenubutton", background="black", foreground="white")
         self.root.configure(bg="black")
 
-        self.profiles = load_profiles()
-        profile_names = list(self.profiles.keys())
+        self.registry = default_registry()
+        profile_names = self.registry.names()
         self.profile_var = tk.StringVar(value=profile_names[0])
         ttk.Label(root, text="Profile").pack(pady=5)
         self.profile_menu = ttk.OptionMenu(root, self.profile_var, profile_names[0], *profile_names, command=self.on_profile_change)
@@ -32,7 +89,8 @@ class PromptGUI:
 
         self.engine = None
         self.current_profile = None
-        self.on_profile_change(profile_names[0])
+        self.worker = None
+        self.load_profile(profile_names[0])
 
         # Mode selection
         self.mode_var = tk.StringVar(value="single")
@@ -85,6 +143,7 @@ class PromptGUI:
             "txt",
             "csv",
             "gpt",
+            "gpt-jsonl",
             command=self.on_format_change,
         )
         self.output_menu.pack()
@@ -103,18 +162,47 @@ class PromptGUI:
         # Template selection
         ttk.Label(root, text="Template").pack(pady=5)
         self.template_var = tk.StringVar(value="plain")
-        self.template_menu = ttk.OptionMenu(root, self.template_var, "plain", *templates())
+        self.template_menu = ttk.OptionMenu(root, self.template_var, "plain", *self.engine.templates())
         self.template_menu.pack()
 
-        ttk.Button(root, text="Generate", command=self.generate).pack(pady=20)
+        button_frame = ttk.Frame(root)
+        button_frame.pack(pady=10)
+        self.generate_button = ttk.Button(button_frame, text="Generate", command=self.generate)
+        self.generate_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel, state="disabled")
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        self.progress = ttk.Progressbar(root, orient="horizontal", length=400, mode="determinate")
+        self.progress.pack(pady=5)
         self.status = ttk.Label(root, text="Ready.")
         self.status.pack()
+        self.preview = tk.Text(root, height=8, width=90, bg="black", fg="white", wrap="none", state="disabled")
+        self.preview.pack(pady=5, fill=tk.BOTH, expand=True)
+        self.root.after(RELOAD_MS, self.poll_reload)
+
+    def load_profile(self, selection):
+        self.current_profile = self.registry.profile(selection)
+        self.engine = self.registry.engine(selection)
+
+    def poll_reload(self):
+        """Pick up edits to the current profile's files; menus follow a reloaded engine."""
+        if self.worker is None:
+            try:
+                engine = self.registry.engine(self.profile_var.get())
+            except (OSError, ValueError) as exc:
+                self.status.config(text=f"Profile not reloaded: {exc}")
+            else:
+                if engine is not self.engine:
+                    self.current_profile = self.registry.profile(self.profile_var.get())
+                    self.engine = engine
+                    self.update_categories()
+                    self.update_templates()
+                    self.status.config(text="Profile files changed; reloaded.")
+        self.root.after(RELOAD_MS, self.poll_reload)
 
     def on_profile_change(self, selection):
-        self.current_profile = load_profile(selection)
-        vocab_path = self.current_profile["vocab_bank"]
-        self.engine = PromptEngine(vocab_path)
+        self.load_profile(selection)
         self.update_categories()
+        self.update_templates()
         self.diff_slider.set(self.current_profile["default_diff"])
         self.output_format.set(self.current_profile["format"])
         self.update_model_menu()
@@ -135,6 +223,14 @@ class PromptGUI:
             menu.add_command(label=label, command=lambda v=c: self.category_var.set(v))
         self.category_var.set("All")
 
+    def update_templates(self):
+        menu = self.template_menu["menu"]
+        menu.delete(0, "end")
+        for name in self.engine.templates():
+            menu.add_command(label=name, command=lambda v=name: self.template_var.set(v))
+        if self.template_var.get() not in self.engine.templates():
+            self.template_var.set("plain")
+
     def on_mode_change(self):
         if self.mode_var.get() == "single":
             self.num_entry.configure(state="disabled")
@@ -153,7 +249,7 @@ class PromptGUI:
     
     def update_model_menu(self):
         models = self.current_profile.get("models", []) if self.current_profile else []
-        if self.output_format.get() == "gpt" and models:
+        if self.output_format.get() in ("gpt", "gpt-jsonl") and models:
             default = self.current_profile.get("default_model", models[0])
             self.model_var.set(default)
             menu = self.model_menu["menu"]
@@ -167,40 +263,98 @@ class PromptGUI:
             self.model_menu.pack_forget()
 
     def generate(self):
+        if self.worker is not None:
+            return
         try:
             num = 1 if self.mode_var.get() == "single" else int(self.num_entry.get())
-            diff = int(self.diff_slider.get())
-            tag = self.tag_entry.get().strip().replace(" ", "_")
-            baseline = self.baseline_entry.get().strip()
-            category = self.category_var.get()
-            if category == "All":
-                category = None
-            template = self.template_var.get()
-            prompts = self.engine.generate_batch(
-                num, diff, baseline=baseline, category=category, template=template
-            )
-            fmt = self.output_format.get()
-            model = self.model_var.get() or None
-            path = save_prompts(
-                prompts,
-                format=fmt,
-                out_dir=self.out_dir.get(),
-                tag=tag,
-                model=model,
-            )
-            self.status.config(text=f"Saved: {path} 😺")
-            messagebox.showinfo("Success", f"Purrr! Saved {len(prompts)} prompts to {path}")
-        except Exception as e:
+            if num < 1:
+                raise ValueError("Number of prompts must be at least 1")
+        except ValueError as e:
             messagebox.showerror("Error", str(e))
+            return
+        diff = int(self.diff_slider.get())
+        tag = self.tag_entry.get().strip().replace(" ", "_")
+        baseline = self.baseline_entry.get().strip()
+        category = self.category_var.get()
+        if category == "All":
+            category = None
+        template = self.template_var.get()
+        save_kwargs = dict(
+            format=self.output_format.get(),
+            out_dir=self.out_dir.get(),
+            tag=tag,
+            model=self.model_var.get() or None,
+        )
+        if self.stats:
+            instrument.enable()
+        self.worker = BatchWorker(self.engine, num, diff, baseline, category, template, save_kwargs)
+        self.started = time.perf_counter()
+        self.progress.configure(maximum=num, value=0)
+        self.set_preview([])
+        self.generate_button.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+        self.status.config(text=f"Generating {num} prompts...")
+        self.worker.start()
+        self.root.after(POLL_MS, self.poll_worker)
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_button.configure(state="disabled")
+            self.status.config(text="Cancelling, saving prompts generated so far...")
+
+    def poll_worker(self):
+        """Apply the worker's queued events on the Tk thread, then reschedule."""
+        worker = self.worker
+        while True:
+            try:
+                kind, value = worker.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "preview":
+                self.set_preview(value)
+            elif kind == "progress":
+                rate = value / max(time.perf_counter() - self.started, 1e-9)
+                self.progress.configure(value=value)
+                self.status.config(text=f"Generated {value}/{worker.num} prompts ({rate:,.0f}/s)")
+            else:
+                self.finish(kind, value)
+                return
+        self.root.after(POLL_MS, self.poll_worker)
+
+    def finish(self, kind, value):
+        worker, self.worker = self.worker, None
+        self.generate_button.configure(state="normal")
+        self.cancel_button.configure(state="disabled")
+        if kind == "error":
+            messagebox.showerror("Error", str(value))
             self.status.config(text="Error.")
+        elif worker.cancelled:
+            self.status.config(text=f"Cancelled: saved {worker.produced} of {worker.num} prompts to {value}{self.stage_times()}")
+        else:
+            self.status.config(text=f"Saved: {value} 😺{self.stage_times()}")
+            messagebox.showinfo("Success", f"Purrr! Saved {worker.produced} prompts to {value}")
+
+    def stage_times(self) -> str:
+        """The last batch's stage times on a second status line, with --stats."""
+        return f"\n{instrument.short_summary()}" if self.stats else ""
+
+    def set_preview(self, prompts):
+        self.preview.configure(state="normal")
+        self.preview.delete("1.0", tk.END)
+        self.preview.insert(tk.END, "\n".join(p.replace("\n", " ") for p in prompts))
+        self.preview.configure(state="disabled")
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PromptCrafter-X GUI")
+    parser.add_argument("--stats", action="store_true", help="Show per-stage timings in the status bar after each batch")
+    args = parser.parse_args(argv)
     Path("data").mkdir(exist_ok=True)
     Path("logs").mkdir(exist_ok=True)
     Path("outputs").mkdir(exist_ok=True)
     root = tk.Tk()
-    app = PromptGUI(root)
+    app = PromptGUI(root, stats=args.stats)
     root.mainloop()
 
 
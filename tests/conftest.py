@@ -0,0 +1,43 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in a fresh directory, so logs/, outputs/ and the vocabulary cache stay out of the repo."""
+    from core import vocab_store
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(vocab_store.CACHE_ENV, str(tmp_path / ".cache"))
+    monkeypatch.setattr(vocab_store, "_DEFAULT_STORE", None)
+    return tmp_path
+
+
+@pytest.fixture
+def write_vocab(workdir):
+    def write(vocab, name="vocab.json"):
+        path = workdir / name
+        path.write_text(json.dumps(vocab), encoding="utf-8")
+        return path
+
+    return write
+
+
+@pytest.fixture
+def run_cli(workdir, write_vocab, monkeypatch):
+    """Run promptcli with ``args`` against a ``test`` profile built from ``vocab``."""
+    from cli.promptcli import main
+
+    def run(vocab, *args, fmt="json"):
+        profiles = {"test": {"vocab_bank": str(write_vocab(vocab)), "default_diff": 2, "format": fmt}}
+        (workdir / "prompt_profiles.json").write_text(json.dumps(profiles), encoding="utf-8")
+        monkeypatch.setattr(sys, "argv", ["promptcli.py", "--profile", "test", *map(str, args)])
+        main()
+
+    return run
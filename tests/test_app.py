@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("tkinter")
+
+from core.prompt_engine import PromptEngine  # noqa: E402
+from gui import app  # noqa: E402
+
+VOCAB = {"a": [f"a{i}" for i in range(6)], "b": [f"b{i}" for i in range(6)]}
+
+
+def _events(worker):
+    worker.join(10)
+    assert not worker.is_alive()
+    events = []
+    while not worker.events.empty():
+        events.append(worker.events.get())
+    return events
+
+
+@pytest.fixture
+def engine(write_vocab, monkeypatch):
+    monkeypatch.setattr(app, "CHUNK_SIZE", 10)
+    return PromptEngine(write_vocab(VOCAB))
+
+
+def _worker(engine, workdir, num, fmt="txt"):
+    save_kwargs = {"format": fmt, "out_dir": str(workdir / "out"), "tag": "gui", "hash_log": None}
+    return app.BatchWorker(engine, num, 2, "", None, "plain", save_kwargs)
+
+
+def test_batches_stream_progress_then_the_saved_file(engine, workdir):
+    worker = _worker(engine, workdir, 35)
+    worker.start()
+    events = _events(worker)
+    assert events[0][0] == "preview" and len(events[0][1]) == 10
+    assert [value for kind, value in events if kind == "progress"] == [10, 20, 30, 35]
+    kind, path = events[-1]
+    assert kind == "done" and len(path.read_text(encoding="utf-8").splitlines()) == 35
+
+
+def test_cancel_keeps_the_chunks_already_made(engine, workdir, monkeypatch):
+    worker = _worker(engine, workdir, 1000)
+    generate = engine.generate_batch
+
+    def generate_then_cancel(*args, **kwargs):
+        if worker.produced >= 20:
+            worker.cancel()
+        return generate(*args, **kwargs)
+
+    monkeypatch.setattr(engine, "generate_batch", generate_then_cancel)
+    worker.start()
+    kind, path = _events(worker)[-1]
+    assert worker.cancelled and kind == "done"
+    assert len(path.read_text(encoding="utf-8").splitlines()) == worker.produced == 30
+
+
+def test_failures_are_posted_as_events(engine, workdir):
+    worker = _worker(engine, workdir, 5, fmt="bogus")
+    worker.start()
+    kind, exc = _events(worker)[-1]
+    assert kind == "error" and isinstance(exc, ValueError)
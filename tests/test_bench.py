@@ -0,0 +1,33 @@
+import json
+
+from benchmarks import bench
+
+
+def _report(**us_per_item):
+    return {"results": {name: {"items": 10, "seconds": us * 1e-5, "us_per_item": us} for name, us in us_per_item.items()}}
+
+
+def test_only_slowdowns_past_the_threshold_regress():
+    baseline = _report(fast=10.0, slow=10.0, new=1.0)
+    baseline["results"]["strict"] = {"us_per_item": 10.0, "threshold": 0.1}
+    report = _report(fast=14.0, slow=16.0, strict=12.0, unknown=99.0)
+    regressions = bench.compare(report, baseline, 0.5)
+    assert [line.split(":")[0] for line in regressions] == ["slow", "strict"]
+    assert report["results"]["fast"]["ratio"] == 1.4
+    assert "ratio" not in report["results"]["unknown"]
+
+
+def test_a_run_is_compared_against_its_saved_baseline(workdir, monkeypatch):
+    # Skip setting up the other benchmarks' banks.
+    monkeypatch.setattr(bench, "BENCHMARKS", [bench.output_benchmarks])
+    args = ["--only", "save_prompt_hash", "--quick", "--repeat", "1", "--baseline", str(workdir / "base.json")]
+    args += ["--report", str(workdir / "report.json")]
+    assert bench.main([*args, "--save-baseline"]) == 0
+    baseline = json.loads((workdir / "base.json").read_text(encoding="utf-8"))
+    assert list(baseline["results"]) == ["save_prompt_hash"] and baseline["meta"]["quick"]
+    assert bench.main([*args, "--threshold", "100"]) == 0
+    baseline["results"]["save_prompt_hash"]["us_per_item"] = 1e-6
+    (workdir / "base.json").write_text(json.dumps(baseline), encoding="utf-8")
+    assert bench.main(args) == 1
+    report = json.loads((workdir / "report.json").read_text(encoding="utf-8"))
+    assert report["regressions"][0].startswith("save_prompt_hash:")
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from core.prompt_engine import PromptEngine
+
+VOCAB = {"a": ["a0", "a1", "a2"], "b": ["b0", "b1", "b2"]}
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--diverse"],
+        ["--diverse", 2],
+        ["--recursive", "--generations", 3],
+        ["--generations", 3],
+        ["--templates", "extra.json"],
+        ["--part-lines", 10],
+        ["--part-bytes", "1MB"],
+        ["--custom-id", "hash"],
+        ["--out-dir", "/tmp"],
+    ],
+)
+def test_connect_rejects_options_the_server_cannot_honour(run_cli, args, capsys):
+    with pytest.raises(SystemExit) as exc:
+        run_cli(VOCAB, "--connect", "/nonexistent.sock", *args)
+    assert exc.value.code == 2
+    assert "not supported with --connect" in capsys.readouterr().err
+
+
+def test_connect_rejects_similarity_queries(run_cli, capsys):
+    with pytest.raises(SystemExit) as exc:
+        run_cli(VOCAB, "--connect", "/nonexistent.sock", "--query", "--similar", "a0, b0")
+    assert exc.value.code == 2
+    assert "--similar is not supported with --connect" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("value", ["10", "a:5", "5:2", "-1:4", "1:2:3"])
+def test_malformed_ranges_are_usage_errors(run_cli, value, capsys):
+    with pytest.raises(SystemExit) as exc:
+        run_cli(VOCAB, f"--range={value}")
+    assert exc.value.code == 2
+    assert f"invalid range '{value}'" in capsys.readouterr().err
+
+
+def test_range_writes_the_slice(run_cli, workdir):
+    run_cli(VOCAB, "--range", "2:5", fmt="json")
+    prompts = json.loads(next((workdir / "outputs").glob("*.json")).read_text(encoding="utf-8"))["prompts"]
+    engine = PromptEngine(workdir / "vocab.json")
+    assert prompts == list(engine.space(2, None, "", ["plain"]).iter_range(2, 5))
+
+
+@pytest.mark.parametrize("args", [["--range", "0:5", "--shard", "1/2"], ["--unique", "--shard", "0/2"], ["--unique", "--workers", 2]])
+def test_options_that_would_be_ignored_are_refused(run_cli, args, capsys):
+    with pytest.raises(SystemExit) as exc:
+        run_cli(VOCAB, *args)
+    assert exc.value.code == 2
+    assert "not supported with" in capsys.readouterr().err
@@ -0,0 +1,77 @@
+import json
+import random
+
+import pytest
+
+from core.compact import SUFFIX, CompactBatch, CompactWriter, convert
+from core.prompt_engine import PromptEngine
+
+VOCAB = {"subject": [f"s{i}" for i in range(40)], "style": ["ink", "oil", "pastel"], "mood": ["calm"]}
+
+
+def _write(engine, n, block=16, baseline="", template="plain"):
+    plan, ranks = engine.generate_ranks(n, 2, template=template, rng=random.Random(1))
+    with CompactWriter(engine, plan, baseline, template, tag="c", block=block) as writer:
+        # Chunks that do not line up with the blocks.
+        for start in range(0, n, 7):
+            writer.write([column[start:start + 7] for column in ranks])
+    assert writer.count == n
+    return writer.path
+
+
+def test_batches_decode_to_what_was_generated(write_vocab):
+    engine = PromptEngine(write_vocab(VOCAB))
+    expected = engine.generate_batch(100, 2, baseline="Draw", template="instruction", rng=random.Random(1))
+    path = _write(engine, 100, baseline="Draw", template="instruction")
+    assert path.suffix == SUFFIX
+    with CompactBatch(path) as batch:
+        assert (batch.baseline, batch.template) == ("Draw", "instruction")
+        assert len(batch) == 100 and list(batch) == expected
+        assert batch.ranks(0, 100) == engine.generate_ranks(100, 2, rng=random.Random(1))[1]
+
+
+def test_prompts_decode_on_their_own(write_vocab):
+    engine = PromptEngine(write_vocab(VOCAB))
+    with CompactBatch(_write(engine, 50)) as batch:
+        prompts = list(batch)
+        assert [batch[i] for i in range(50)] == prompts
+        assert batch[-1] == prompts[-1] and batch[13:40] == prompts[13:40] and batch[::9] == prompts[::9]
+        assert [len(chunk) for chunk in batch.iter_chunks()] == [16, 16, 16, 2]
+        with pytest.raises(IndexError):
+            batch[50]
+
+
+def test_a_changed_or_damaged_bank_is_refused(write_vocab):
+    engine = PromptEngine(write_vocab(VOCAB))
+    path = _write(engine, 10)
+    with path.open("ab") as f:
+        f.write(b"\0")
+    with pytest.raises(ValueError, match="truncated"):
+        CompactBatch(path)
+    path = _write(engine, 10)
+    write_vocab({**VOCAB, "mood": ["calm", "tense"]})
+    with pytest.raises(ValueError, match="different version"):
+        CompactBatch(path)
+
+
+def test_convert_writes_any_output_format(write_vocab, workdir):
+    engine = PromptEngine(write_vocab(VOCAB))
+    path = _write(engine, 30)
+    with CompactBatch(path) as batch:
+        prompts = list(batch)
+    out = convert(path, "json", out_dir=str(workdir / "out"))
+    assert out.name.endswith("_c.json") and json.loads(out.read_text(encoding="utf-8"))["prompts"] == prompts
+    manifest = convert(path, "gpt-jsonl", out_dir=str(workdir / "out"), part_lines=20)
+    assert [part["lines"] for part in json.loads(manifest.read_text(encoding="utf-8"))["parts"]] == [20, 10]
+
+
+def test_cli_round_trip(run_cli, workdir, capsys):
+    run_cli(VOCAB, "--num", 25, "--seed", 3, fmt="compact")
+    (path,) = (workdir / "outputs").glob(f"*{SUFFIX}")
+    run_cli(VOCAB, "--convert", path, "--format", "txt", "--out-dir", workdir / "txt")
+    assert "Wrote" in capsys.readouterr().out
+    (txt,) = (workdir / "txt").glob("*.txt")
+    with CompactBatch(path) as batch:
+        assert txt.read_text(encoding="utf-8").splitlines() == list(batch)
+    with pytest.raises(SystemExit):
+        run_cli(VOCAB, "--convert", path, "--format", "compact")
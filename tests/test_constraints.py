@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from core.constraints import ConstraintSet
+from core.prompt_engine import PromptEngine
+from core.sampler import CompiledVocab
+
+# Every "tone" term excludes "cheerful", so drawing it empties "tone".
+EMPTYING = {
+    "genre": ["cheerful", "noir"],
+    "tone": ["dark", "bleak"],
+    "theme": ["loss", "hope"],
+    "_constraints": {"exclude": [["cheerful", "dark"], ["cheerful", "bleak"]]},
+}
+
+
+def _no_dangling_separators(prompt):
+    return not prompt.endswith(",") and ", ," not in prompt and not prompt.startswith(",")
+
+
+def test_emptied_category_leaves_no_dangling_separator(write_vocab):
+    engine = PromptEngine(write_vocab(EMPTYING))
+    prompts = engine.generate_batch(400, 1, rng=random.Random(1))
+    assert any("cheerful" in p for p in prompts)
+    for prompt in prompts:
+        assert _no_dangling_separators(prompt), prompt
+        if "cheerful" in prompt:
+            assert "dark" not in prompt and "bleak" not in prompt
+    random.seed(2)
+    for _ in range(50):
+        assert _no_dangling_separators(engine.generate_prompt(1, baseline="base"))
+
+
+def test_last_category_emptied_with_baseline(write_vocab):
+    vocab = {"genre": ["cheerful"], "tone": ["dark"], "_constraints": {"exclude": [["cheerful", "dark"]]}}
+    engine = PromptEngine(write_vocab(vocab))
+    assert engine.generate_batch(3, 1, baseline="Write", rng=random.Random(0)) == ["Write, cheerful"] * 3
+
+
+def test_compiled_rows_obey_rules():
+    terms = {"a": [f"a{i}" for i in range(40)], "b": [f"b{i}" for i in range(40)], "c": [f"c{i}" for i in range(8)]}
+    rules = {"exclude": [["a1", "b1"]], "require": {"c0": ["a5", "b5"]}, "together": [["a7", "b7", "c7"]]}
+    vocab = CompiledVocab(terms, constraints=rules)
+    plan = vocab.plan(3)
+    columns = vocab.sample_columns(3000, 3, None, random.Random(3))
+    for r in range(3000):
+        picks = {cat: [terms[cat].index(t) for t in col[r].split(", ") if t] for (cat, _), col in zip(plan, columns)}
+        assert vocab.constraints.allows(picks), picks
+
+
+def test_unknown_term_is_rejected():
+    with pytest.raises(ValueError, match="unknown term"):
+        ConstraintSet({"exclude": [["x", "y"]]}, {"a": ["x"]})
+
+
+def test_category_restriction_ignores_rules_on_other_categories(write_vocab):
+    vocab = {
+        "language": ["Python", "Rust"],
+        "library": ["NumPy", "Tokio", "plain"],
+        "extra": ["x", "y"],
+        "_constraints": {"require": {"NumPy": ["Python"], "Tokio": ["Rust"]}, "together": [["Rust", "y"]]},
+    }
+    engine = PromptEngine(write_vocab(vocab))
+    prompts = engine.generate_batch(300, 1, category="library", rng=random.Random(4))
+    assert set(prompts) == {"NumPy", "Tokio", "plain"}
+    random.seed(5)
+    assert {engine.generate_prompt(1, category="library") for _ in range(100)} == {"NumPy", "Tokio", "plain"}
+    # "y" follows "Rust", which is not drawn with --category extra.
+    assert set(engine.generate_batch(100, 1, category="extra", rng=random.Random(6))) == {"x", "y"}
+    assert engine.space(1, "library", "", ["plain"]).valid_size == 3
+    # Drawing every category still enforces the rules.
+    for prompt in engine.generate_batch(300, 1, rng=random.Random(7)):
+        terms = prompt.split(", ")
+        assert ("NumPy" not in terms or "Python" in terms) and ("Tokio" not in terms or "Rust" in terms)
+        assert ("Rust" in terms) == ("y" in terms)
+
+
+def test_single_prompts_obey_rules_without_a_batch(write_vocab, monkeypatch):
+    vocab = {
+        "language": ["Python", "Rust", "Go"],
+        "library": ["NumPy", "Tokio", "plain"],
+        "tone": ["humorous", "melancholic", "dry"],
+        "_constraints": {"require": {"NumPy": ["Python"], "Tokio": ["Rust"]}, "exclude": [["humorous", "melancholic"]]},
+    }
+    engine = PromptEngine(write_vocab(vocab))
+    monkeypatch.setattr(engine, "generate_batch", lambda *a, **k: pytest.fail("built a batch"))
+    random.seed(8)
+    # With two of three terms most plain draws pass; with all three "tone" never can.
+    for diff in (2, 3):
+        for _ in range(300):
+            terms = engine.generate_prompt(diff).split(", ")
+            assert "NumPy" not in terms or "Python" in terms
+            assert "Tokio" not in terms or "Rust" in terms
+            assert not {"humorous", "melancholic"} <= set(terms)
+    assert engine.compiled._rows[tuple(engine.compiled.plan(3))][1] is False
@@ -0,0 +1,47 @@
+import json
+
+from core.dedup import PromptDeduplicator
+
+
+def _no_rebuild(self, capacity):
+    raise AssertionError("the Bloom filter was rebuilt from the index")
+
+
+def test_bloom_filter_is_loaded_from_disk(workdir, monkeypatch):
+    with PromptDeduplicator(workdir / "index.db", capacity=1000) as dedup:
+        assert dedup.filter_new(["a", "b", "a"]) == ["a", "b"]
+    assert (workdir / "index.bloom").exists()
+    monkeypatch.setattr(PromptDeduplicator, "_rebuild", _no_rebuild)
+    with PromptDeduplicator(workdir / "index.db", capacity=1000) as dedup:
+        assert len(dedup) == 2
+        assert dedup.filter_new(["a", "b", "c"]) == ["c"]
+    with PromptDeduplicator(workdir / "index.db", capacity=1000) as dedup:
+        assert dedup.seen("c")
+
+
+def test_stale_bloom_filter_is_rebuilt(workdir):
+    first = PromptDeduplicator(workdir / "index.db")
+    second = PromptDeduplicator(workdir / "index.db")
+    first.add("from first")
+    first.close()
+    # The second writer's filter lacks "from first", so it must not be saved.
+    second.add("from second")
+    second.close()
+    with PromptDeduplicator(workdir / "index.db") as dedup:
+        assert dedup.seen("from first") and dedup.seen("from second")
+    (workdir / "index.bloom").write_bytes(b"torn")
+    with PromptDeduplicator(workdir / "index.db") as dedup:
+        assert dedup.seen("from first") and dedup.seen("from second")
+
+
+def test_cli_unique_runs_never_repeat(run_cli, workdir):
+    vocab = {"a": [f"a{i}" for i in range(6)], "b": [f"b{i}" for i in range(6)]}
+    for tag in ("one", "two"):
+        run_cli(vocab, "--unique", "--num", 100, "--seed", 1, "--tag", tag)
+    one, two = (
+        json.loads(next((workdir / "outputs").glob(f"*_{tag}.json")).read_text(encoding="utf-8"))["prompts"]
+        for tag in ("one", "two")
+    )
+    assert len(one) == len(two) == 100
+    assert not set(one) & set(two)
+    assert (workdir / "logs" / "prompt_index.bloom").exists()
@@ -0,0 +1,73 @@
+import json
+import math
+
+import pytest
+
+from core.enumerator import rank_subset, unrank_subset
+from core.prompt_engine import PromptEngine
+
+ROOT_CODE = {
+    "language": ["Python", "JavaScript", "Rust", "Go"],
+    "library": ["NumPy", "React", "Tokio", "Flask"],
+    "feature": ["async", "types"],
+    "_constraints": {"require": {"NumPy": ["Python"], "React": ["JavaScript"]}, "exclude": [["Rust", "async"]]},
+}
+
+
+@pytest.fixture
+def space(write_vocab):
+    engine = PromptEngine(write_vocab(ROOT_CODE))
+    return engine.space(2, templates=["plain"])
+
+
+def test_valid_size_matches_a_full_scan(space):
+    valid = [i for i in range(len(space)) if space.allows(i)]
+    assert 0 < len(valid) < len(space)
+    assert space.valid_size == len(valid)
+    assert len(list(space.iter_range())) == len(valid)
+
+
+def test_prompt_at_and_index_of_refuse_broken_prompts(space):
+    invalid = next(i for i in range(len(space)) if not space.allows(i))
+    with pytest.raises(ValueError):
+        space.prompt_at(invalid)
+    valid = next(i for i in range(len(space)) if space.allows(i))
+    prompt = space.prompt_at(valid)
+    assert space.index_of(prompt) == valid
+    broken = "Rust, Go, NumPy, Tokio, async, types"
+    with pytest.raises(ValueError):
+        space.index_of(broken)
+
+
+def test_unconstrained_space_is_unchanged(write_vocab):
+    vocab = {k: v for k, v in ROOT_CODE.items() if not k.startswith("_")}
+    space = PromptEngine(write_vocab(vocab)).space(2, templates=["plain"])
+    assert space.valid_size == len(space) == 6 * 6 * 1
+    assert all(space.index_of(space.prompt_at(i)) == i for i in range(len(space)))
+
+
+def test_subset_ranks_round_trip():
+    for n, k in [(5, 0), (5, 2), (7, 7), (30, 4)]:
+        subsets = [unrank_subset(r, n, k) for r in range(math.comb(n, k))]
+        assert subsets == sorted(subsets, key=lambda s: s[::-1])
+        assert len({tuple(s) for s in subsets}) == len(subsets)
+        assert [rank_subset(s) for s in subsets] == list(range(len(subsets)))
+
+
+def test_every_index_is_a_distinct_prompt(write_vocab):
+    vocab = {"a": ["a0", "a1", "a2", "a3"], "b": ["b0", "b1", "b2"]}
+    space = PromptEngine(write_vocab(vocab)).space(2, templates=["plain", "instruction"])
+    assert len(space) == math.comb(4, 2) * math.comb(3, 2) * 2
+    prompts = [space.prompt_at(i) for i in range(len(space))]
+    assert len(set(prompts)) == len(space)
+    assert [space.index_of(p) for p in prompts] == list(range(len(space)))
+    assert list(space.iter_range(3, 9)) == prompts[3:9]
+
+
+def test_seeded_ranges_partition_the_space(write_vocab):
+    vocab = {"a": [f"a{i}" for i in range(8)], "b": [f"b{i}" for i in range(6)]}
+    space = PromptEngine(write_vocab(vocab)).space(3, templates=["plain"])
+    slices = [list(space.iter_range(start, start + 250, seed=9)) for start in range(0, len(space), 250)]
+    shuffled = [p for part in slices for p in part]
+    assert sorted(shuffled) == sorted(space.iter_range())
+    assert shuffled != list(space.iter_range())
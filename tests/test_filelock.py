@@ -0,0 +1,102 @@
+import json
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from core.filelock import GroupCommit, LockedAppender, append_text, atomic_write
+from core.vault_store import JSONVaultBackend
+
+WRITERS, BLOCKS = 3, 50
+
+
+def _append_blocks(path, writer, start):
+    start.wait()
+    with LockedAppender(path) as log:
+        for block in range(BLOCKS):
+            # Blocks well past a pipe buffer, so a torn write would show.
+            log.write("".join(f"{writer}:{block}:{line}:{'x' * 200}\n" for line in range(100)))
+    append_text(path, f"{writer}:end\n")
+
+
+def _append_entries(path, writer, start):
+    start.wait()
+    vault = JSONVaultBackend(path)
+    for i in range(10):
+        vault.append([{"prompt": f"{writer}-{i}", "timestamp": "", "category": "text", "tags": []}])
+
+
+def _run(target, path):
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    procs = [ctx.Process(target=target, args=(str(path), w, start)) for w in range(WRITERS)]
+    for p in procs:
+        p.start()
+    start.set()
+    for p in procs:
+        p.join()
+    assert [p.exitcode for p in procs] == [0] * WRITERS
+
+
+def test_concurrent_appends_keep_blocks_whole(workdir):
+    path = workdir / "logs" / "hashes.txt"
+    _run(_append_blocks, path)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == WRITERS * (BLOCKS * 100 + 1)
+    blocks = [lines[i:i + 100] for i, line in enumerate(lines) if line.endswith(":0:" + "x" * 200)]
+    assert len(blocks) == WRITERS * BLOCKS
+    for block in blocks:
+        writer, number = block[0].split(":")[:2]
+        assert [line.split(":")[:3] for line in block] == [[writer, number, str(i)] for i in range(100)]
+
+
+def test_concurrent_vault_appends_are_all_kept(workdir):
+    path = workdir / "vault.json"
+    _run(_append_entries, path)
+    prompts = [entry["prompt"] for entry in json.loads(path.read_text(encoding="utf-8"))]
+    assert sorted(prompts) == sorted(f"{w}-{i}" for w in range(WRITERS) for i in range(10))
+    for w in range(WRITERS):
+        assert [p for p in prompts if p.startswith(f"{w}-")] == [f"{w}-{i}" for i in range(10)]
+    assert not list((workdir / "vault.json.pending").iterdir())
+
+
+def test_staged_batches_are_committed_together(workdir):
+    commits = []
+    gate = threading.Event()
+
+    def commit(batches):
+        gate.wait(5)
+        commits.append(batches)
+
+    group = GroupCommit(workdir / "data.json", commit)
+    threads = [threading.Thread(target=group.submit, args=([i],)) for i in range(8)]
+    for t in threads:
+        t.start()
+    # Wait until every batch is staged while the first commit is held up.
+    while len(list(group.pending_dir.iterdir())) < 8:
+        time.sleep(0.01)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert sorted(item for batches in commits for [item] in batches) == list(range(8))
+    assert len(commits) <= 2
+
+
+def test_batches_left_by_a_crashed_writer_are_committed_next(workdir):
+    commits = []
+    group = GroupCommit(workdir / "data.json", commits.append)
+    group.pending_dir.mkdir()
+    (group.pending_dir / "00000000000000000001-1-1-0.json").write_text("[0]", encoding="utf-8")
+    group.submit([1])
+    assert commits == [[[0], [1]]]
+
+
+def test_failed_atomic_writes_keep_the_old_file(workdir):
+    path = workdir / "data.bin"
+    atomic_write(path, b"old")
+    with pytest.raises(TypeError):
+        atomic_write(path, "not bytes")
+    assert path.read_bytes() == b"old" and list(workdir.iterdir()) == [path]
+    atomic_write(path, b"new", fsync=False)
+    assert path.read_bytes() == b"new"
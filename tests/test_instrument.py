@@ -0,0 +1,66 @@
+import json
+import random
+import time
+
+import pytest
+
+from core import instrument
+from core.output import save_prompts
+from core.prompt_engine import PromptEngine
+
+
+@pytest.fixture
+def stats():
+    instrument.enable()
+    yield instrument.snapshot
+    instrument.enable()  # clears the counters
+    instrument.disable()
+
+
+def test_disabled_hooks_record_nothing():
+    instrument.enable()
+    instrument.disable()
+    with instrument.stage("idle", 5) as st:
+        st.add(bytes=1)
+    instrument.count("idle", items=1)
+    assert instrument.snapshot() == {}
+
+
+def test_nested_stages_charge_their_time_once(stats):
+    with instrument.stage("outer", 3):
+        time.sleep(0.02)
+        with instrument.stage("inner", 2):
+            time.sleep(0.05)
+    outer, inner = stats()["outer"], stats()["inner"]
+    assert (outer["calls"], outer["items"], inner["items"]) == (1, 3, 2)
+    assert 0.05 <= inner["seconds"] and 0.02 <= outer["seconds"] < 0.05
+
+
+def test_excluded_producers_are_not_charged(stats):
+    def slow():
+        for i in range(3):
+            time.sleep(0.02)
+            yield i
+
+    with instrument.stage("consume") as st:
+        assert list(st.exclude(slow())) == [0, 1, 2]
+    assert stats()["consume"]["seconds"] < 0.02
+
+
+def test_pipeline_stages_are_counted(stats, write_vocab, workdir):
+    engine = PromptEngine(write_vocab({"a": ["a0", "a1", "a2"], "b": ["b0", "b1"]}))
+    prompts = engine.generate_batch(100, 1, rng=random.Random(1))
+    save_prompts(prompts, "txt", hash_log=workdir / "hashes.txt", chunk_size=30)
+    snapshot = stats()
+    assert {"load_vocab", "sample", "render", "write", "hash_log"} <= set(snapshot)
+    assert snapshot["sample"]["items"] == snapshot["render"]["items"] == 100
+    assert snapshot["hash_log"]["items"] == 100
+    assert snapshot["write"]["bytes"] > 0
+    assert json.loads(instrument.to_json(snapshot))["stages"] == snapshot
+    assert instrument.summary(snapshot).count("\n") == len(snapshot) - 1
+
+
+def test_worker_counters_merge_into_this_process(stats):
+    instrument.count("sample", items=5)
+    instrument.merge({"sample": {"calls": 2, "seconds": 1.5, "items": 10, "bytes": 0, "opens": 0}})
+    assert stats()["sample"] == {"calls": 2, "seconds": 1.5, "items": 15, "bytes": 0, "opens": 0}
@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from core.jobs import completed_jobs, read_jobs, run_jobs
+
+VOCAB = {"a": ["a0", "a1", "a2"], "b": ["b0", "b1", "b2"]}
+
+
+@pytest.fixture
+def jobs_file(write_vocab, workdir):
+    profiles = {name: {"vocab_bank": str(write_vocab(VOCAB)), "default_diff": 2, "format": "txt"} for name in ("one", "two")}
+    (workdir / "prompt_profiles.json").write_text(json.dumps(profiles), encoding="utf-8")
+    jobs = [
+        {"id": "first", "profile": "two", "num": 3, "seed": 1},
+        {"id": "second", "profile": "one", "num": 5, "tag": "t"},
+        {"id": "broken", "profile": "missing", "num": 1},
+    ]
+    path = workdir / "jobs.jsonl"
+    path.write_text("".join(json.dumps(job) + "\n" for job in jobs), encoding="utf-8")
+    return path
+
+
+def _run(jobs_file, workdir, concurrency=1):
+    return list(run_jobs(jobs_file, concurrency=concurrency, out_dir=str(workdir / "out"), profile_path=str(workdir / "prompt_profiles.json")))
+
+
+@pytest.mark.parametrize("concurrency", [1, 2])
+def test_jobs_run_and_record_their_status(jobs_file, workdir, concurrency):
+    records = {r["id"]: r for r in _run(jobs_file, workdir, concurrency)}
+    assert {r["status"] for r in records.values()} == {"done", "failed"}
+    assert records["broken"]["status"] == "failed" and "Profile 'missing' not found" in records["broken"]["error"]
+    for job_id, count in (("first", 3), ("second", 5)):
+        path = Path(records[job_id]["path"])
+        assert path.parent == workdir / "out" and records[job_id]["count"] == count
+        assert len(path.read_text(encoding="utf-8").splitlines()) == count
+    status = [json.loads(line) for line in (workdir / "jobs.status.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert sorted(r["id"] for r in status) == ["broken", "first", "second"]
+
+
+def test_rerun_skips_finished_jobs_and_retries_failures(jobs_file, workdir):
+    _run(jobs_file, workdir)
+    assert completed_jobs(workdir / "jobs.status.jsonl") == {"first", "second"}
+    again = _run(jobs_file, workdir)
+    assert sorted((r["id"], r["status"]) for r in again) == [("broken", "failed"), ("first", "skipped"), ("second", "skipped")]
+    assert len(list((workdir / "out").iterdir())) == 2
+
+
+def test_torn_status_lines_are_ignored(workdir):
+    (workdir / "status.jsonl").write_text('{"id": "a", "status": "done"}\n{"id": "b", "sta', encoding="utf-8")
+    assert completed_jobs(workdir / "status.jsonl") == {"a"}
+
+
+def test_bad_job_lines_are_named(workdir):
+    (workdir / "jobs.jsonl").write_text('{"profile": "x"}\n{"profile": "x", "colour": 1}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match=r"jobs.jsonl:2: unknown job fields colour"):
+        read_jobs(workdir / "jobs.jsonl")
+    (workdir / "jobs.jsonl").write_text('{"profile": "x"}\n{"profile": "x"}\n', encoding="utf-8")
+    first, second = read_jobs(workdir / "jobs.jsonl")
+    assert second["id"] == first["id"] + "-2"
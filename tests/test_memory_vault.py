@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from core.memory_vault import PromptMemoryVault
+from core.vault_store import JSONVaultBackend, SQLiteVaultBackend
+
+
+@pytest.mark.parametrize("name", ["vault.db", "vault.json"])
+def test_entries_survive_a_reopen_in_insertion_order(workdir, name):
+    vault = PromptMemoryVault(str(workdir / name))
+    assert isinstance(vault.backend, JSONVaultBackend if name.endswith(".json") else SQLiteVaultBackend)
+    vault.add_entries(["a", "b"], category="text", tags=["x"])
+    vault.add_entry("c", category="image", tags=["y"])
+    vault.close()
+    vault = PromptMemoryVault(str(workdir / name))
+    assert len(vault) == 3
+    assert [(e["prompt"], e["category"], e["tags"]) for e in vault.entries()] == [
+        ("a", "text", ["x"]),
+        ("b", "text", ["x"]),
+        ("c", "image", ["y"]),
+    ]
+    vault.close()
+
+
+def test_tag_and_category_lookups_follow_appends(workdir):
+    vault = PromptMemoryVault(str(workdir / "vault.db"))
+    for batch in range(10):
+        vault.add_entries([f"p{batch}-{i}" for i in range(100)], category=f"c{batch % 2}", tags=[f"t{batch}"])
+    assert len(vault) == 1000
+    assert [e["prompt"] for e in vault.search_by_tag("t3")] == [f"p3-{i}" for i in range(100)]
+    assert len(vault.filter_by_category("c1")) == 500
+    vault.add_entry("late", category="c1", tags=["t3"])
+    assert vault.search_by_tag("t3")[-1]["prompt"] == "late"
+    assert len(vault.filter_by_category("c1")) == 501
+    vault.close()
+
+
+def test_legacy_json_vault_is_imported_once(workdir):
+    legacy = workdir / "old.json"
+    old = [{"prompt": f"old {i}", "timestamp": "2024-01-01T00:00:00", "category": "text", "tags": []} for i in range(5)]
+    legacy.write_text(json.dumps(old), encoding="utf-8")
+    vault = PromptMemoryVault(str(workdir / "vault.db"), legacy_path=str(legacy))
+    assert [e["prompt"] for e in vault.entries()] == [f"old {i}" for i in range(5)]
+    vault.close()
+    assert not legacy.exists() and (workdir / "old.json.migrated").exists()
+    vault = PromptMemoryVault(str(workdir / "vault.db"), legacy_path=str(legacy))
+    assert len(vault) == 5
+    vault.close()
@@ -0,0 +1,107 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import lzma
+
+import pytest
+
+from core.output import save_prompts
+from core.tokens import estimate_tokens
+
+
+def test_json_per_prompt_lists_follow_the_prompts(workdir):
+    prompts = [f"term {i}, other {i}" for i in range(2500)]
+    labels = ["text", "image"] * 1250
+    path = save_prompts(iter(prompts), "json", chunk_size=100, hash_log=None, token_counts=True, profiles=iter(labels))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["prompts"] == prompts
+    assert data["profiles"] == labels
+    assert data["tokens"] == [estimate_tokens(p) for p in prompts]
+
+
+def test_json_single_profile_is_written_once(workdir):
+    path = save_prompts(["a", "b"], "json", hash_log=None, profiles="text_generation")
+    assert json.loads(path.read_text(encoding="utf-8")) == {"prompts": ["a", "b"], "profile": "text_generation"}
+
+
+@pytest.mark.parametrize("compress", [None, "gzip", "lzma"])
+def test_streamed_files_match_a_whole_dump(workdir, compress):
+    prompts = [f'term {i}, "quoted" {i}' for i in range(250)]
+    opener = {None: open, "gzip": gzip.open, "lzma": lzma.open}[compress]
+
+    def read(fmt, model=None):
+        path = save_prompts((p for p in prompts), fmt, model=model, compress=compress, chunk_size=40, hash_log=None)
+        with opener(path, "rt", encoding="utf-8", newline="") as f:
+            return f.read()
+
+    assert read("json", "m") == json.dumps({"prompts": prompts, "model": "m"}, indent=2)
+    assert read("json") == json.dumps({"prompts": prompts}, indent=2)
+    gpt = [{"model": "m", "messages": [{"role": "user", "content": p}]} for p in prompts]
+    assert read("gpt", "m") == json.dumps(gpt, indent=2)
+    assert read("txt") == "".join(p + "\n" for p in prompts)
+    assert list(csv.reader(io.StringIO(read("csv", "m")))) == [["model", "prompt"], *(["m", p] for p in prompts)]
+
+
+def test_empty_runs_are_valid_files(workdir):
+    assert json.loads(save_prompts(iter(()), "json", hash_log=None).read_text(encoding="utf-8")) == {"prompts": []}
+    assert json.loads(save_prompts(iter(()), "gpt", hash_log=None).read_text(encoding="utf-8")) == []
+
+
+def test_hash_log_gets_one_line_per_prompt(workdir):
+    save_prompts(["a", "b", "c"], "txt", chunk_size=2, hash_log=workdir / "hashes.txt")
+    lines = (workdir / "hashes.txt").read_text(encoding="utf-8").splitlines()
+    assert [line.rsplit(" | ", 1)[1] for line in lines] == ["a", "b", "c"]
+
+
+def _read_parts(manifest_path, opener=open):
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    parts = []
+    for part in manifest["parts"]:
+        path = manifest_path.parent / part["file"]
+        raw = path.read_bytes()
+        assert part["size"] == len(raw) and part["sha256"] == hashlib.sha256(raw).hexdigest()
+        with opener(path, "rt", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        assert part["lines"] == len(lines)
+        assert (part["first_id"], part["last_id"]) == (lines[0]["custom_id"], lines[-1]["custom_id"])
+        parts.append(lines)
+    return manifest, parts
+
+
+@pytest.mark.parametrize("compress", [None, "gzip", "lzma"])
+def test_batch_requests_roll_over_at_the_line_cap(workdir, compress):
+    prompts = [f"term {i}" for i in range(250)]
+    opener = {None: open, "gzip": gzip.open, "lzma": lzma.open}[compress]
+    path = save_prompts(iter(prompts), "gpt-jsonl", tag="t", model="m", compress=compress, chunk_size=40, hash_log=None, part_lines=100)
+    assert path.name == "manifest.json"
+    manifest, parts = _read_parts(path, opener)
+    assert [len(lines) for lines in parts] == [100, 100, 50]
+    assert [p["file"] for p in manifest["parts"]] == [f"part-0000{i}.jsonl" + {None: "", "gzip": ".gz", "lzma": ".xz"}[compress] for i in (1, 2, 3)]
+    assert (manifest["count"], manifest["model"], manifest["compress"]) == (250, "m", compress)
+    lines = [line for part in parts for line in part]
+    assert [line["custom_id"] for line in lines] == [f"t-{i}" for i in range(250)]
+    assert [line["body"]["messages"][0]["content"] for line in lines] == prompts
+    assert all(line["method"] == "POST" and line["url"] == manifest["endpoint"] for line in lines)
+
+
+def test_batch_requests_roll_over_at_the_byte_cap(workdir):
+    prompts = [f"term {i:03d}" for i in range(100)]
+    path = save_prompts(prompts, "gpt-jsonl", hash_log=None, part_bytes=1000, token_counts=True, profiles="image")
+    manifest, parts = _read_parts(path)
+    assert sum(len(lines) for lines in parts) == 100 and len(parts) > 1
+    assert all(part["bytes"] <= 1000 for part in manifest["parts"])
+    assert parts[0][0]["body"]["metadata"] == {"estimated_tokens": str(estimate_tokens(prompts[0])), "profile": "image"}
+    # A line over the cap still gets a part of its own.
+    path = save_prompts(["x" * 2000, "y"], "gpt-jsonl", hash_log=None, part_bytes=1000)
+    assert [p["lines"] for p in json.loads(path.read_text(encoding="utf-8"))["parts"]] == [1, 1]
+
+
+def test_hash_ids_are_shared_by_duplicate_prompts(workdir):
+    path = save_prompts(["a", "b", "a"], "gpt-jsonl", hash_log=None, custom_id="hash")
+    _, (lines,) = _read_parts(path)
+    ids = [line["custom_id"] for line in lines]
+    assert ids[0] == ids[2] == hashlib.sha256(b"a").hexdigest()[:32] != ids[1]
+    with pytest.raises(ValueError, match="custom_id"):
+        save_prompts(["a"], "gpt-jsonl", custom_id="uuid")
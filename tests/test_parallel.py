@@ -0,0 +1,58 @@
+import pytest
+
+from core.parallel import chunk_seed, generate_parallel, generate_profiles, parse_profile_mix
+
+VOCAB = {cat: [f"{cat}{i}" for i in range(30)] for cat in ("a", "b", "c")}
+
+
+def test_profiles_sharing_a_seed_draw_different_streams(write_vocab):
+    path = write_vocab(VOCAB)
+    runs = [("first", path, None, 200, 3), ("second", path, None, 200, 3)]
+    chunks = list(generate_profiles(runs, seed=7, workers=1, chunk_size=50))
+    streams = {"first": [], "second": []}
+    for name, prompts in chunks:
+        streams[name].extend(prompts)
+    assert len(streams["first"]) == len(streams["second"]) == 200
+    same = sum(p == q for p, q in zip(streams["first"], streams["second"]))
+    assert same < 5
+
+
+def test_generate_profiles_is_reproducible(write_vocab):
+    path = write_vocab(VOCAB)
+    runs = [("first", path, None, 120, 2), ("second", path, None, 80, 2)]
+    once = list(generate_profiles(runs, seed=3, workers=1, chunk_size=40))
+    again = list(generate_profiles(runs, seed=3, workers=1, chunk_size=40))
+    assert once == again
+    assert [name for name, _ in once] == ["first", "second", "first", "second", "first"]
+
+
+def test_chunk_seed_mixes_in_the_profile():
+    assert chunk_seed(1, 0) != chunk_seed(1, 0, "text_generation")
+    assert chunk_seed(1, 0, "text_generation") != chunk_seed(1, 0, "image_generation")
+
+
+def test_parse_profile_mix_counts_and_weights():
+    names = ["a", "b", "c"]
+    mix = dict(parse_profile_mix("a=5,b:3,c", names, 10))
+    assert mix["a"] == 5 and mix["b"] + mix["c"] == 10 and mix["b"] > mix["c"]
+    assert [n for n, _ in parse_profile_mix("all", names, 3)] == names
+
+
+@pytest.mark.parametrize("shards", [2, 3, 8])
+def test_shards_in_order_make_up_the_whole_run(write_vocab, shards):
+    path = write_vocab(VOCAB)
+    whole = [p for chunk in generate_parallel(path, 50, 2, seed=5, workers=1, chunk_size=7) for p in chunk]
+    parts = [
+        [p for chunk in generate_parallel(path, 50, 2, seed=5, workers=1, shard=i, shards=shards, chunk_size=7) for p in chunk]
+        for i in range(shards)
+    ]
+    assert sum(parts, []) == whole
+
+
+def test_concatenated_shard_files_equal_the_unsharded_file(run_cli, workdir):
+    def output(tag, *args):
+        run_cli(VOCAB, "--num", 20001, "--seed", 11, "--tag", tag, *args, fmt="txt")
+        return next((workdir / "outputs").glob(f"*_{tag}.txt")).read_text(encoding="utf-8")
+
+    whole = output("whole", "--workers", 2)
+    assert output("shard0", "--shard", "0/2") + output("shard1", "--shard", "1/2") == whole
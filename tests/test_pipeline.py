@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from core.memory_vault import PromptMemoryVault
+from core.pipeline import BackgroundWriter, PersistencePipeline
+
+
+def test_every_sink_gets_every_chunk(workdir):
+    vault = PromptMemoryVault(str(workdir / "vault.db"))
+    chunks = [[f"p{c}-{i}" for i in range(50)] for c in range(20)]
+    with PersistencePipeline(
+        output={"format": "json", "out_dir": str(workdir / "out"), "tag": "t"},
+        hash_log=workdir / "hashes.txt",
+        vault=vault,
+        vault_category="cat",
+        vault_tags=["t"],
+        max_pending=2,
+    ) as pipeline:
+        for chunk in chunks:
+            pipeline.submit(chunk)
+    prompts = [p for chunk in chunks for p in chunk]
+    assert pipeline.count == 1000
+    assert json.loads(pipeline.path.read_text(encoding="utf-8"))["prompts"] == prompts
+    assert len((workdir / "hashes.txt").read_text(encoding="utf-8").splitlines()) == 1000
+    entries = vault.query(categories=["cat"], tags=["t"], limit=None)
+    assert sorted(e["prompt"] for e in entries) == sorted(prompts)
+    vault.close()
+
+
+def test_profiles_get_their_own_files(workdir):
+    outputs = {name: {"format": "txt", "out_dir": str(workdir / "out"), "tag": name} for name in ("a", "b")}
+    with PersistencePipeline(hash_log=None, outputs=outputs) as pipeline:
+        pipeline.submit(["a1", "a2"], "a")
+        pipeline.submit(["b1"], "b")
+        pipeline.submit(["a3"], "a")
+    assert {name: path.read_text(encoding="utf-8") for name, path in pipeline.paths.items()} == {
+        "a": "a1\na2\na3\n",
+        "b": "b1\n",
+    }
+
+
+def test_writer_failures_reach_the_producer():
+    def commit(chunk):
+        raise OSError("disk full")
+
+    writer = BackgroundWriter("broken", commit)
+    writer.submit(["a"])
+    with pytest.raises(RuntimeError, match="broken writer failed") as exc:
+        writer.flush()
+    assert isinstance(exc.value.__cause__, OSError)
+    with pytest.raises(RuntimeError):
+        writer.close()
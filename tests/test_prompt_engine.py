@@ -0,0 +1,18 @@
+import random
+
+import pytest
+
+from core.prompt_engine import PromptEngine
+
+
+def test_single_prompts_come_from_the_compiled_terms(write_vocab, monkeypatch):
+    engine = PromptEngine(str(write_vocab({"a": ["a0", "a1", "a2"], "b": ["b0", "b1"]})))
+    engine.compiled
+    # Single prompts must not decode terms from the mapped bank on every call.
+    monkeypatch.setattr(type(engine.vocab), "__getitem__", lambda self, cat: pytest.fail(f"decoded {cat!r}"))
+    random.seed(1)
+    for _ in range(20):
+        terms = engine.generate_prompt(2).split(", ")
+        assert len(set(terms)) == 4
+        assert sorted(t[0] for t in terms) == ["a", "a", "b", "b"]
+    assert engine.generate_prompt(5, category="b") in ("b0, b1", "b1, b0")
@@ -0,0 +1,38 @@
+import json
+
+from core.prompt_profiles import EnginePool, ProfileRegistry
+from core.vocab_store import VocabStore
+
+
+def _write_profiles(path, vocab):
+    path.write_text(json.dumps({"story": {"vocab_bank": str(vocab), "default_diff": 1, "format": "txt"}}), encoding="utf-8")
+
+
+def _terms(engine, n=20):
+    return {term for prompt in engine.generate_batch(n, 1) for term in prompt.split(", ")}
+
+
+def test_changed_files_are_picked_up_while_leased_engines_stay_valid(write_vocab, workdir):
+    first = write_vocab({"tone": ["dark", "grim"]}, "first.json")
+    second = write_vocab({"tone": ["bright", "sunny", "warm"]}, "second.json")
+    profiles = workdir / "profiles.json"
+    _write_profiles(profiles, first)
+    registry = ProfileRegistry(profiles, EnginePool(VocabStore(workdir / "cache")), poll_interval=0)
+
+    leased = registry.engine("story")
+    assert _terms(leased) == {"dark", "grim"}
+    assert registry.engine("story") is leased
+
+    # The profile now points at another bank.
+    _write_profiles(profiles, second)
+    assert registry.profile("story")["vocab_bank"] == str(second)
+    assert _terms(registry.engine("story")) == {"bright", "sunny", "warm"}
+    assert _terms(leased) == {"dark", "grim"}
+
+    # The first bank's content changes under the engine still leased on it.
+    _write_profiles(profiles, first)
+    write_vocab({"tone": ["stormy", "bleak", "cold"]}, "first.json")
+    reloaded = registry.engine("story")
+    assert reloaded is not leased
+    assert _terms(reloaded) == {"stormy", "bleak", "cold"}
+    assert _terms(leased) == {"dark", "grim"}
@@ -0,0 +1,31 @@
+import json
+
+from core.recursive_loop import RecursivePromptDaemon
+
+VOCAB = {
+    "tone": ["dark", "hopeful", "humorous", "melancholic"],
+    "genre": ["noir", "fantasy", "comedy", "western"],
+    "_constraints": {"exclude": [["humorous", "melancholic"], ["dark", "comedy"]]},
+}
+BANNED = [{"humorous", "melancholic"}, {"dark", "comedy"}]
+
+
+def _valid(prompt):
+    parts = prompt.split(", ")
+    return (
+        all(parts)
+        and len(set(parts)) == len(parts)
+        and not any(pair <= set(parts) for pair in BANNED)
+    )
+
+
+def test_evolved_prompts_are_validated_like_fresh_ones(write_vocab, workdir):
+    daemon = RecursivePromptDaemon(write_vocab(VOCAB), history_path=workdir / "history.jsonl")
+    final = daemon.evolve(24, 6, diff=2, operators=["substitute", "crossover"], workers=1, seed=5)
+    assert len(final) == 24
+    assert all(map(_valid, final))
+    history = [json.loads(line) for line in (workdir / "history.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert all(_valid(entry["remixed"]) for entry in history)
+    # Substitution and crossover over 8 terms keep producing repeats; those were resampled.
+    resampled = [entry for entry in history if entry["operator"] == "sample"]
+    assert resampled and all(entry["parent"] is None for entry in resampled)
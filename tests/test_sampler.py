@@ -0,0 +1,69 @@
+import random
+from collections import Counter
+
+import pytest
+
+from core.prompt_engine import PromptEngine
+from core.sampler import CompiledVocab
+
+# "small" fits a segment table; "large" has too many ordered samples for one.
+VOCAB = {"small": ["s0", "s1", "s2", "s3"], "large": [f"l{i}" for i in range(200)]}
+
+
+@pytest.mark.parametrize("n", [50, 1000])
+def test_batches_hold_distinct_terms_per_category(write_vocab, n):
+    engine = PromptEngine(write_vocab(VOCAB))
+    assert engine.compiled.segment_table("small", 2) is not None
+    assert engine.compiled.segment_table("large", 2) is None
+    prompts = engine.generate_batch(n, 2, rng=random.Random(1))
+    assert len(prompts) == n
+    for prompt in prompts:
+        terms = prompt.split(", ")
+        assert len(set(terms)) == 4
+        assert [t[0] for t in terms] == ["s", "s", "l", "l"]
+
+
+def test_batches_are_reproducible_and_restricted_by_category(write_vocab):
+    engine = PromptEngine(write_vocab(VOCAB))
+    assert engine.generate_batch(300, 3, rng=random.Random(2)) == engine.generate_batch(300, 3, rng=random.Random(2))
+    assert engine.generate_batch(300, 3, rng=random.Random(2)) != engine.generate_batch(300, 3, rng=random.Random(3))
+    assert all(p.startswith("l") and p.count(", ") == 2 for p in engine.generate_batch(300, 3, category="large"))
+
+
+def test_batched_draws_are_uniform():
+    vocab = CompiledVocab({"small": VOCAB["small"]})
+    counts = Counter(vocab.sample_contents(8000, 2, rng=random.Random(4)))
+    # 12 ordered pairs, about 667 draws each.
+    assert len(counts) == 12
+    assert all(550 < c < 790 for c in counts.values()), counts
+
+
+WEIGHTED = {"w": {"rare": 1, "mid": 3, "common": 6}, "u": ["u0", "u1", "u2", "u3"]}
+
+
+def test_alias_table_reproduces_the_weights():
+    vocab = CompiledVocab({"w": ["a", "b", "c", "d"]}, weights={"w": [1, 2, 3, 4]})
+    prob, alias = vocab.alias_table("w")
+    share = [p / 4 for p in prob]
+    for i, p in enumerate(prob):
+        share[alias[i]] += (1 - p) / 4
+    assert share == pytest.approx([0.1, 0.2, 0.3, 0.4])
+
+
+def test_single_terms_follow_their_weights(write_vocab):
+    engine = PromptEngine(write_vocab(WEIGHTED))
+    assert set(engine.compiled.weights) == {"w"}
+    rng = random.Random(5)
+    counts = Counter(engine.compiled.sample_terms("w", 1, rng)[0] for _ in range(10000))
+    assert 850 < counts["rare"] < 1150 and 2750 < counts["mid"] < 3250 and 5700 < counts["common"] < 6300
+    batch = Counter(p.split(", ")[0] for p in engine.generate_batch(10000, 1, rng=rng))
+    assert 850 < batch["rare"] < 1150 and 5700 < batch["common"] < 6300
+
+
+def test_weighted_samples_hold_distinct_terms(write_vocab):
+    engine = PromptEngine(write_vocab(WEIGHTED))
+    rng = random.Random(6)
+    assert all(sorted(engine.compiled.sample_terms("w", 3, rng)) == ["common", "mid", "rare"] for _ in range(200))
+    for prompt in engine.generate_batch(500, 2, rng=rng):
+        terms = prompt.split(", ")
+        assert len(set(terms)) == 4 and set(terms[:2]) <= set(WEIGHTED["w"])
@@ -0,0 +1,114 @@
+import asyncio
+import contextlib
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from core.client import request
+from core.parallel import generate_parallel
+from core.server import GenerationService, bind_target, serve
+
+VOCAB = {"a": ["a0", "a1", "a2"], "b": ["b0", "b1", "b2"]}
+
+
+@pytest.fixture
+def service(write_vocab, workdir):
+    profiles = {"test": {"vocab_bank": str(write_vocab(VOCAB)), "default_diff": 2, "format": "txt"}}
+    (workdir / "prompt_profiles.json").write_text(json.dumps(profiles), encoding="utf-8")
+    service = GenerationService(str(workdir / "prompt_profiles.json"), out_dir=str(workdir / "served"))
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def address(service, workdir):
+    """A Unix socket served by ``service`` on a background event loop."""
+    path = workdir / "server.sock"
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(serve(service, str(path)))
+
+    def run():
+        with contextlib.suppress(asyncio.CancelledError):
+            loop.run_until_complete(task)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield str(path)
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join()
+    loop.close()
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1:8765", ":8765", "localhost:8765", "::1:8765", "logs/server.sock"])
+def test_loopback_and_socket_addresses_are_served(address):
+    assert bind_target(address) is not None
+
+
+@pytest.mark.parametrize("address", ["0.0.0.0:8765", "192.168.1.5:8765", "example.com:8765"])
+def test_other_hosts_need_allow_remote(address):
+    with pytest.raises(ValueError, match="no authentication"):
+        bind_target(address)
+    assert bind_target(address, allow_remote=True)[1] == 8765
+
+
+def test_serve_on_a_public_host_is_a_usage_error(run_cli, capsys):
+    with pytest.raises(SystemExit) as exc:
+        run_cli(VOCAB, "--serve", "0.0.0.0:8765")
+    assert exc.value.code == 2
+    assert "--allow-remote" in capsys.readouterr().err
+
+
+def test_saved_runs_stay_in_the_server_output_dir(service, workdir):
+    response = service.handle({"op": "generate", "profile": "test", "num": 3, "save": True, "tag": "mine"})
+    assert response["count"] == 3
+    assert (workdir / "served") in Path(response["path"]).parents
+    with pytest.raises(TypeError, match="out_dir"):
+        service.handle({"op": "generate", "profile": "test", "save": True, "out_dir": str(workdir / "elsewhere")})
+    with pytest.raises(ValueError, match="path separator"):
+        service.handle({"op": "generate", "profile": "test", "save": True, "tag": "../escape"})
+    assert not (workdir / "elsewhere").exists()
+
+
+def test_seeded_requests_match_the_cli_stream(address, workdir):
+    assert request({"op": "profiles"}, address)["profiles"] == ["test"]
+    response = request({"op": "generate", "profile": "test", "num": 25, "seed": 4}, address)
+    expected = [p for chunk in generate_parallel(workdir / "vocab.json", 25, 2, seed=4, workers=1) for p in chunk]
+    assert response["prompts"] == expected
+
+
+def test_connections_are_served_concurrently(address):
+    def generate(seed):
+        return request({"op": "generate", "profile": "test", "num": 5, "seed": seed}, address)["prompts"]
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(generate, range(16)))
+    assert results == [generate(seed) for seed in range(16)]
+
+
+def test_errors_are_reported_and_the_connection_stays_open(address):
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(address)
+        stream = sock.makefile("rwb")
+        for line in (b"not json\n", b"[1]\n", b'{"op": "nope"}\n', b'{"op": "profiles"}\n'):
+            stream.write(line)
+            stream.flush()
+        replies = [json.loads(stream.readline()) for _ in range(4)]
+    assert [r["ok"] for r in replies] == [False, False, False, True]
+    assert "Unknown op 'nope'" in replies[2]["error"]
+    with pytest.raises(RuntimeError, match="Profile 'missing' not found"):
+        request({"op": "generate", "profile": "missing"}, address)
+
+
+def test_saved_runs_reach_the_vault(address, service):
+    response = request({"op": "generate", "profile": "test", "num": 4, "save": True, "tag": "served"}, address)
+    assert Path(response["path"]).read_text(encoding="utf-8").count("\n") == 4
+    entries = request({"op": "query", "tags": ["served"]}, address)["entries"]
+    assert sorted(e["prompt"] for e in entries) == sorted(Path(response["path"]).read_text(encoding="utf-8").splitlines())
@@ -0,0 +1,78 @@
+import itertools
+import json
+import sqlite3
+
+from core.similarity import jaccard, select_diverse, term_set
+from core.vault_store import SQLiteVaultBackend
+
+TERMS = [f"term{i}" for i in range(40)]
+
+
+def _entry(prompt):
+    return {"prompt": prompt, "timestamp": "2025-01-01T00:00:00", "category": "text", "tags": []}
+
+
+def _near_pairs(prompts, threshold=0.5):
+    sets = [term_set(p) for p in prompts]
+    return sum(jaccard(a, b) >= threshold for a, b in itertools.combinations(sets, 2))
+
+
+def test_near_duplicates_are_indexed_on_append(workdir):
+    backend = SQLiteVaultBackend(workdir / "vault.db")
+    backend.append([_entry(", ".join(TERMS[i:i + 8])) for i in range(0, 40, 8)])
+    backend.append([_entry("term1, term0, term3, term2, term5, term4, term7, other")])
+    indexed = backend.conn.execute("SELECT COUNT(DISTINCT entry_id) FROM minhash_bands").fetchone()[0]
+    assert indexed == 6
+    hits = backend.near_duplicates("term0, term1, term2, term3, term4, term5, term6, term7")
+    backend.close()
+    assert [hit["prompt"] for hit in hits] == [
+        "term0, term1, term2, term3, term4, term5, term6, term7",
+        "term1, term0, term3, term2, term5, term4, term7, other",
+    ]
+    assert [hit["similarity"] for hit in hits] == [1.0, round(7 / 9, 4)]
+
+
+def test_dissimilar_prompts_are_not_near_duplicates(workdir):
+    backend = SQLiteVaultBackend(workdir / "vault.db")
+    backend.append([_entry(", ".join(TERMS[i:i + 8])) for i in range(0, 40, 8)])
+    assert backend.near_duplicates("term0, term1, term8, term9, term16, term17, term24, term25") == []
+    assert backend.near_duplicates("unrelated, words, only") == []
+    backend.close()
+
+
+def test_older_vault_gets_its_bands_on_open(workdir):
+    path = workdir / "vault.db"
+    backend = SQLiteVaultBackend(path)
+    backend.append([_entry(", ".join(TERMS[:8]))])
+    backend.close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("DELETE FROM minhash_bands")
+        conn.execute("DROP TABLE minhash_params")
+        conn.execute("PRAGMA user_version=3")
+    conn.close()
+    backend = SQLiteVaultBackend(path)
+    assert len(backend.near_duplicates(", ".join(TERMS[:8]))) == 1
+    backend.close()
+
+
+def test_select_diverse_keeps_one_prompt_per_cluster():
+    # Ten clusters of four near-duplicates each, listed cluster by cluster.
+    clusters = [[", ".join([*(f"c{c}{t}" for t in "abcdefghij"), f"extra{c}{v}"]) for v in range(4)] for c in range(10)]
+    candidates = [prompt for cluster in clusters for prompt in cluster]
+    picked = select_diverse(candidates, 10)
+    assert _near_pairs(candidates[:10]) > 0
+    assert _near_pairs(picked) == 0
+    assert sorted(p.split(",")[0] for p in picked) == sorted(f"c{c}a" for c in range(10))
+
+
+def test_diverse_flag_filters_near_duplicates(run_cli, workdir):
+    vocab = {"a": [f"a{i}" for i in range(5)], "b": [f"b{i}" for i in range(5)]}
+    run_cli(vocab, "--num", 8, "--seed", 3, "--workers", 1, "--tag", "plain")
+    run_cli(vocab, "--num", 8, "--seed", 3, "--workers", 1, "--tag", "diverse", "--diverse", 8)
+    plain, diverse = (
+        json.loads(next((workdir / "outputs").glob(f"*_{tag}.json")).read_text(encoding="utf-8"))["prompts"]
+        for tag in ("plain", "diverse")
+    )
+    assert len(diverse) == 8
+    assert _near_pairs(diverse) < _near_pairs(plain)
@@ -0,0 +1,50 @@
+import json
+import random
+
+import pytest
+
+from core.prompt_engine import PromptEngine
+from core.template_engine import CompiledTemplate, TemplateRenderer
+
+VOCAB = {"subject": ["cat", "dog", "owl"], "style": ["ink", "oil", "pastel"]}
+
+
+@pytest.mark.parametrize("template", ["plain", "instruction", "cot"])
+@pytest.mark.parametrize("baseline", ["", "Draw"])
+def test_columns_render_like_single_prompts(template, baseline):
+    renderer = TemplateRenderer(categories=list(VOCAB))
+    columns = {"subject": ["cat", "dog, owl"], "style": ["ink", "oil"]}
+    rendered = renderer.render_columns(columns, 2, baseline=baseline, template=template)
+    assert rendered == [
+        renderer.render(f"{subject}, {style}", baseline, template, {"subject": subject, "style": style})
+        for subject, style in zip(columns["subject"], columns["style"])
+    ]
+
+
+def test_category_placeholders_take_that_categorys_terms(write_vocab, workdir):
+    (workdir / "templates.json").write_text(json.dumps({"scene": "A {subject} in {style}. {baseline}"}), encoding="utf-8")
+    engine = PromptEngine(write_vocab(VOCAB), templates_path=str(workdir / "templates.json"))
+    assert "scene" in engine.templates()
+    for prompt in engine.generate_batch(50, 1, baseline="Go.", template="scene", rng=random.Random(1)):
+        subject, style = prompt[len("A "):-len(". Go.")].split(" in ")
+        assert subject in VOCAB["subject"] and style in VOCAB["style"]
+    random.seed(2)
+    assert engine.generate_prompt(1, template="scene").startswith("A ")
+
+
+@pytest.mark.parametrize(
+    "pattern, message",
+    [("{nope}", "unknown category"), ("{subject!r}", "unsupported placeholder"), ("{subject", "Template 'bad'")],
+)
+def test_bad_templates_are_rejected_when_loaded(workdir, pattern, message):
+    renderer = TemplateRenderer(categories=list(VOCAB))
+    (workdir / "templates.json").write_text(json.dumps({"good": "{content}", "bad": pattern}), encoding="utf-8")
+    with pytest.raises(ValueError, match=message):
+        renderer.load(workdir / "templates.json")
+    assert "good" not in renderer.available()
+
+
+def test_unknown_template_names_fall_back_to_plain():
+    renderer = TemplateRenderer()
+    assert renderer.render("a, b", "Base", template="missing") == "Base, a, b"
+    assert CompiledTemplate("t", "{baseline}{sep}{content}").render("", "Base") == "Base"
@@ -0,0 +1,45 @@
+import multiprocessing
+import sqlite3
+
+from core.vault_store import SQLiteVaultBackend
+
+
+def _entries(n, start=0):
+    return [
+        {"prompt": f"dark, hopeful, quest {i}", "timestamp": f"2025-01-01T00:00:{i % 60:02d}", "category": "text", "tags": ["t"]}
+        for i in range(start, start + n)
+    ]
+
+
+def _open_vault(path, start):
+    start.wait()
+    SQLiteVaultBackend(path).close()
+
+
+def _make_old_vault(path, n=3000):
+    backend = SQLiteVaultBackend(path)
+    backend.append(_entries(n))
+    backend.close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("DELETE FROM token_blocks")
+        conn.execute("PRAGMA user_version=2")
+    conn.close()
+
+
+def test_concurrent_openers_migrate_an_old_vault_once(workdir):
+    path = workdir / "vault.db"
+    _make_old_vault(path)
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    procs = [ctx.Process(target=_open_vault, args=(str(path), start)) for _ in range(2)]
+    for p in procs:
+        p.start()
+    start.set()
+    for p in procs:
+        p.join()
+    assert [p.exitcode for p in procs] == [0, 0]
+    backend = SQLiteVaultBackend(path)
+    assert len(backend.query(text="quest", limit=None)) == 3000
+    assert len(backend.query(text="quest 42", limit=None)) == 1
+    backend.close()
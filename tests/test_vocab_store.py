@@ -0,0 +1,30 @@
+import os
+
+from core.vocab_store import _HEADER, VocabStore, default_cache_dir
+
+
+def test_cache_dir_does_not_follow_the_working_directory(workdir, monkeypatch):
+    monkeypatch.delenv("PROMPTCRAFTER_CACHE")
+    here = default_cache_dir()
+    (workdir / "elsewhere").mkdir()
+    monkeypatch.chdir(workdir / "elsewhere")
+    assert default_cache_dir() == here
+    assert here.is_absolute()
+    monkeypatch.setenv("PROMPTCRAFTER_CACHE", str(workdir / "cache"))
+    assert default_cache_dir() == workdir / "cache" / "vocab"
+
+
+def test_touched_bank_is_replaced_not_patched(write_vocab, workdir):
+    source = write_vocab({"tone": ["dark", "hopeful"]})
+    store = VocabStore(workdir / "cache")
+    target = store.cache_path(source)
+    first = store.open(source)
+    inode = target.stat().st_ino
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = store.open(source)
+    assert second is not first and second.matches(source)
+    assert list(first["tone"]) == list(second["tone"]) == ["dark", "hopeful"]
+    assert target.stat().st_ino != inode
+    # A process still mapping the old file sees it unchanged.
+    assert _HEADER.unpack_from(first._mm)[2] == stat.st_mtime_ns